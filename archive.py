@@ -0,0 +1,108 @@
+# coding=utf-8
+#
+# Archive Geneva report files as report caches (see report_cache.py),
+# so that reprocessing a historical date reads typed positions instead
+# of decoding UTF-16 text again.
+#
+# Each report is checked (dates agree with the file name) then read
+# once with the same reader the worker uses, the positions go into the
+# cache file next to the report. With --remove, the report file is
+# deleted after its cache is written, the cache is then used alone.
+#
+from factset.geneva_position import _readMultipartReport, _readTaxlotReportFromLines \
+								, _readDividendReceivableReportFromLines \
+								, _readCashLedgerReportFromLines \
+								, _readNavReportFromLines \
+								, _readPurchaseSalesReportFromLines
+from factset.data import _getGenevaReportFile, _GENEVA_REPORT_PREFIXES, getReportDates
+from factset.report_cache import getReportCacheFile, isReportCacheFile, writeReportCache
+from factset.validation import scanSections, _getDateErrors
+from itertools import chain
+from os import remove
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+	[String] report type => [Function] mapping function of the reader
+"""
+_MAPPING_FUNCTIONS = \
+{ 'tax lot': _readTaxlotReportFromLines
+, 'dividend receivable': _readDividendReceivableReportFromLines
+, 'nav': _readNavReportFromLines
+, 'cash ledger': _readCashLedgerReportFromLines
+, 'purchase sales': _readPurchaseSalesReportFromLines
+}
+
+
+
+def archiveReport(reportType, file, removeSource=False):
+	"""
+	[String] report type,
+	[String] report file (plain or compressed),
+	[Bool] delete the report file afterwards
+		=> [String] cache file
+
+	Raise ValueError if the dates in the file do not agree with its
+	name.
+	"""
+	logger.debug('archiveReport(): %s', file)
+	sections = scanSections('utf-16', '\t', file)
+	errors = _getDateErrors(file, sections)
+	if len(errors) > 0:
+		for e in errors:
+			logger.error('archiveReport(): %s', e)
+		raise ValueError
+
+	mappingFunc = _MAPPING_FUNCTIONS[reportType]
+	cacheFile = writeReportCache( getReportCacheFile(file), mappingFunc.__name__, file
+								, sections
+								, _readMultipartReport(mappingFunc, 'utf-16', '\t', file))
+	if removeSource:
+		remove(file)
+
+	return cacheFile
+
+
+
+def archiveDate(date, removeSource=False):
+	"""
+	[String] date (yyyy-mm-dd), [Bool] delete the report files afterwards
+		=> [List] ([String]) cache files written
+
+	Reports of the date that are already a cache are left alone.
+	"""
+	def archive(reportType):
+		file = _getGenevaReportFile(reportType, date)
+		return [] if isReportCacheFile(file) else \
+				[archiveReport(reportType, file, removeSource)]
+
+
+	return list(chain.from_iterable(map(archive, _GENEVA_REPORT_PREFIXES)))
+
+
+
+def getArchiveDates():
+	"""
+	=> [List] ([String]) dates (yyyy-mm-dd) with a tax lot report
+	"""
+	return getReportDates('tax lot')
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='archive Geneva reports as report caches')
+	parser.add_argument('dates', metavar='date', type=str, nargs='*', help="report dates (yyyy-mm-dd)")
+	parser.add_argument('--all', action='store_true', help="all dates with a tax lot report")
+	parser.add_argument('--remove', action='store_true', help="delete the report files afterwards")
+	args = parser.parse_args()
+
+	for date in (getArchiveDates() if args.all else args.dates):
+		for file in archiveDate(date, args.remove):
+			print(file)
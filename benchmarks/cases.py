@@ -0,0 +1,273 @@
+# coding=utf-8
+#
+# Benchmark cases, see harness.py.
+#
+# Each case takes the 'benchmark' callable and the dataset, a
+# dictionary with the generated files ('files'), the date ('date'),
+# portfolio codes ('portfolios') and output directory ('outputDir').
+#
+from factset.geneva_position import readMultipartTaxlotReport \
+								, readMultipartDividendReceivableReport \
+								, readMultipartCashLedgerReport \
+								, readMultipartNavReport \
+								, readMultipartPurchaseSalesReport
+from factset.factset_position import getPositions, getPositionsBatch
+from factset.factset_transaction import get_transactions
+from factset.worker import _writeFactPositionToCsv, writePositionsShared \
+						, _writeFactPositionToCsvBatch \
+						, _write_factset_transaction_to_csv \
+						, _doColumnarOutput, _getFactsetPositionCsvHeaders \
+						, _getOutputFilename, _getCashLedgerCsvHeaders
+from factset.data import getGenevaCashLedger
+from steven_utils.utility import writeCsv, dictToValues
+from factset.factset_position import getPositionColumns
+from factset.output import readTable, writeDicts
+from factset.compression import addCompression, compressWriter
+from factset.report_cache import getReportCacheFile, writeReportCache
+from factset.validation import scanSections
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from os.path import basename, getsize, join
+import csv, shutil
+
+
+
+def _readAll(readerFunc, file):
+	return len(list(readerFunc('utf-16', '\t', file)))
+
+
+
+def _forAllPortfolios(func, dataset):
+	return list(map( lambda p: func(dataset['date'], p)
+				   , dataset['portfolios']))
+
+
+
+def bench_read_taxlot(benchmark, dataset):
+	benchmark(_readAll, readMultipartTaxlotReport, dataset['files']['tax lot'])
+
+
+
+def bench_read_dividend_receivable(benchmark, dataset):
+	benchmark( _readAll, readMultipartDividendReceivableReport
+			 , dataset['files']['dividend receivable'])
+
+
+
+def bench_read_nav(benchmark, dataset):
+	benchmark(_readAll, readMultipartNavReport, dataset['files']['nav'])
+
+
+
+def bench_read_cash_ledger(benchmark, dataset):
+	benchmark(_readAll, readMultipartCashLedgerReport, dataset['files']['cash ledger'])
+
+
+
+def bench_read_purchase_sales(benchmark, dataset):
+	benchmark( _readAll, readMultipartPurchaseSalesReport
+			 , dataset['files']['purchase sales'])
+
+
+
+def bench_get_positions(benchmark, dataset):
+	benchmark(_forAllPortfolios, getPositions, dataset)
+
+
+
+def bench_get_positions_batch(benchmark, dataset):
+	benchmark(_forAllPortfolios, getPositionsBatch, dataset)
+
+
+
+def bench_write_positions_batch(benchmark, dataset):
+	benchmark( _forAllPortfolios
+			 , partial(_writeFactPositionToCsvBatch, dataset['outputDir'])
+			 , dataset)
+
+
+
+def bench_write_positions_processes(benchmark, dataset):
+	"""
+	Positions of all portfolios in 4 processes, each process reading the
+	reports itself, compare with write_positions_shared.
+	"""
+	def run():
+		with ProcessPoolExecutor(max_workers=4) as executor:
+			return list(executor.map(
+				partial(_writeFactPositionToCsv, dataset['outputDir'], dataset['date'])
+			  , dataset['portfolios']))
+
+
+	benchmark(run)
+
+
+
+def bench_write_positions_shared(benchmark, dataset):
+	benchmark( writePositionsShared, dataset['outputDir'], dataset['date']
+			 , dataset['portfolios'], 4)
+
+
+
+def bench_get_transactions(benchmark, dataset):
+	benchmark(_forAllPortfolios, get_transactions, dataset)
+
+
+
+def bench_worker(benchmark, dataset):
+	"""
+	A full worker run: positions and transactions csv for every
+	portfolio.
+	"""
+	def run():
+		for func in (_writeFactPositionToCsv, _write_factset_transaction_to_csv):
+			_forAllPortfolios(partial(func, dataset['outputDir']), dataset)
+
+
+	benchmark(run)
+
+
+
+def _getCashLedgerRows(dataset):
+	"""
+	Cash ledger of all portfolios, loaded once so that the cases below
+	time the csv writing only.
+	"""
+	return list(chain.from_iterable(_forAllPortfolios(getGenevaCashLedger, dataset)))
+
+
+
+def bench_write_cash_ledger(benchmark, dataset):
+	file = _getOutputFilename(dataset['outputDir'], 'cash_ledger', dataset['date'], 'all')
+	benchmark(writeDicts, file, _getCashLedgerCsvHeaders(), _getCashLedgerRows(dataset))
+	benchmark.extra_info.update({'bytes': getsize(file)})
+
+
+
+def bench_write_cash_ledger_legacy(benchmark, dataset):
+	"""
+	The same file written the way it was before the row serializer.
+	"""
+	benchmark( lambda file, headers, rows: writeCsv(
+					file, chain([headers], map(partial(dictToValues, headers), rows)))
+			 , _getOutputFilename(dataset['outputDir'], 'cash_ledger_legacy', dataset['date'], 'all')
+			 , _getCashLedgerCsvHeaders()
+			 , _getCashLedgerRows(dataset))
+
+
+
+def _compressInput(dataset, reportType, compression):
+	"""
+	[Dictionary] dataset, [String] report type, [String] compression
+		=> [String] compressed copy of the report file, in the output
+			directory
+	"""
+	file = dataset['files'][reportType]
+	compressed = join(dataset['outputDir'], addCompression(basename(file), compression))
+	with open(file, 'rb') as source, open(compressed, 'wb') as f:
+		with compressWriter(f, compression) as target:
+			shutil.copyfileobj(source, target, 1 << 20)
+
+	return compressed
+
+
+
+def _readTaxlotCompressed(compression, benchmark, dataset):
+	"""
+	Reading the tax lot report from a compressed copy, compare with
+	read_taxlot.
+	"""
+	file = _compressInput(dataset, 'tax lot', compression)
+	benchmark.extra_info.update(
+		{'plain bytes': getsize(dataset['files']['tax lot']), 'bytes': getsize(file)})
+	benchmark(_readAll, readMultipartTaxlotReport, file)
+
+
+
+def bench_read_taxlot_gz(benchmark, dataset):
+	_readTaxlotCompressed('gz', benchmark, dataset)
+
+
+
+def bench_read_taxlot_zst(benchmark, dataset):
+	_readTaxlotCompressed('zst', benchmark, dataset)
+
+
+
+def bench_read_taxlot_cache(benchmark, dataset):
+	"""
+	Reading the tax lot report from its report cache, compare with
+	read_taxlot.
+	"""
+	file = dataset['files']['tax lot']
+	cacheFile = writeReportCache( join(dataset['outputDir'], basename(getReportCacheFile(file)))
+								, '_readTaxlotReportFromLines', file
+								, scanSections('utf-16', '\t', file)
+								, readMultipartTaxlotReport('utf-16', '\t', file))
+	benchmark.extra_info.update({'plain bytes': getsize(file), 'bytes': getsize(cacheFile)})
+	benchmark(_readAll, readMultipartTaxlotReport, cacheFile)
+
+
+
+def _writeCashLedgerCompressed(compression, benchmark, dataset):
+	"""
+	The file of write_cash_ledger, compressed as it is written.
+	"""
+	file = addCompression(
+		_getOutputFilename(dataset['outputDir'], 'cash_ledger', dataset['date'], 'all')
+	  , compression)
+	benchmark(writeDicts, file, _getCashLedgerCsvHeaders(), _getCashLedgerRows(dataset))
+	benchmark.extra_info.update({'bytes': getsize(file)})
+
+
+
+def bench_write_cash_ledger_gz(benchmark, dataset):
+	_writeCashLedgerCompressed('gz', benchmark, dataset)
+
+
+
+def bench_write_cash_ledger_zst(benchmark, dataset):
+	_writeCashLedgerCompressed('zst', benchmark, dataset)
+
+
+
+def _writePositionFiles(outputFormat, dataset):
+	return _forAllPortfolios(
+		partial( _doColumnarOutput, outputFormat, getPositionColumns
+			   , _getFactsetPositionCsvHeaders(), 'factset_position'
+			   , dataset['outputDir'])
+	  , dataset)
+
+
+
+def _readCsvFiles(files):
+	result = []
+	for file in files:
+		with open(file, newline='') as f:
+			result.extend(csv.reader(f))
+
+	return len(result)
+
+
+
+def bench_reload_positions_csv(benchmark, dataset):
+	"""
+	Reading back the position files of all portfolios.
+	"""
+	benchmark(_readCsvFiles, _writePositionFiles('csv', dataset))
+
+
+
+def bench_reload_positions_parquet(benchmark, dataset):
+	benchmark(readTable, _writePositionFiles('parquet', dataset))
+
+
+
+def getCases():
+	"""
+	[Dictionary] ([String] case name -> [Function] case)
+	"""
+	return { name[len('bench_'):]: func for name, func in globals().items()
+			 if name.startswith('bench_') and callable(func)
+		   }
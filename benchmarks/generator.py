@@ -0,0 +1,366 @@
+# coding=utf-8
+#
+# Generate synthetic 'all funds ...' Geneva reports for benchmarks.
+#
+# The reports follow the layout of the real exports: UTF-16, tab
+# delimited, one section per portfolio, each section being the column
+# headers, the rows, then the parameter block with Portfolio,
+# PeriodEndDate etc.
+#
+# Security and portfolio name files (xlsx) are written too when
+# openpyxl is installed, so that FactSet positions can be generated
+# from the synthetic data.
+#
+from functools import partial
+from itertools import chain, count
+from datetime import datetime
+from os import makedirs
+from os.path import join
+import random
+
+try:
+	import openpyxl
+except ImportError:
+	openpyxl = None
+
+
+
+_USD_HKD = 7.7741
+
+_TAXLOT_HEADERS = \
+( 'SortByDescription', 'ThenByDescription', 'InvestmentDescription'
+, 'TaxLotDescription', 'TaxLotID', 'TaxLotDate', 'Quantity', 'OriginalFace'
+, 'UnitCost', 'MarketPrice', 'CostBook', 'MarketValueBook', 'UnrealizedPriceGainLossBook'
+, 'UnrealizedFXGainLossBook', 'AccruedAmortBook', 'AccruedInterestBook'
+, 'ExtendedDescription', 'Description3'
+)
+
+_CASH_LEDGER_HEADERS = \
+( 'Currency_OpeningBalDesc', 'CurrBegBalLocal', 'CurrBegBalBook'
+, 'GroupWithinCurrency_OpeningBalDesc', 'GroupWithinCurrencyBegBalLoc'
+, 'GroupWithinCurrencyBegBalBook', 'CashDate', 'TradeDate', 'SettleDate', 'TransID'
+, 'TranDescription', 'Investment', 'Quantity', 'Price', 'LocalAmount', 'LocalBalance'
+, 'BookAmount', 'BookBalance', 'GroupWithinCurrency_ClosingBalDesc'
+, 'GroupWithinCurrencyClosingBalLoc', 'GroupWithinCurrencyClosingBalBook'
+, 'Currency_ClosingBalDesc', 'CurrClosingBalLocal', 'CurrClosingBalBook'
+)
+
+_DIVIDEND_RECEIVABLE_HEADERS = \
+( 'SortByDescription', 'LocalAccountingName', 'Currency', 'Textbox96', 'Investment'
+, 'TransID', 'EXDate', 'ExDateQuantity', 'LocalCurrency', 'LocalGrossDividendRecPay'
+, 'WHTaxRate', 'LocalWHTaxPayable', 'LocalNetDividendRecPay', 'BookGrossDividendRecPay'
+, 'BookWHTaxPayable', 'BookNetDividendRecPay', 'UnrealizedFXGainLoss', 'PayDate'
+, 'LocalPerShareAmount', 'LocalReclaimReceivable', 'BookReclaimReceivable'
+, 'LocalReliefReceivable', 'BookReliefReceivable'
+)
+
+_NAV_HEADERS = \
+( 'Textbox1', 'SumBal', 'Balance', 'SumBal5', 'SumBal4', 'SumBal3', 'SumBal2'
+, 'SumBal1'
+)
+
+_PURCHASE_SALES_HEADERS = \
+( 'TradeDate', 'SettleDate', 'TranType', 'InvestID', 'Investment', 'CustodianAccount'
+, 'Quantity', 'Price', 'SEC', 'LocalAmount', 'BookAmount', 'ContractDate', 'TranID'
+, 'GenericInvestment', 'Broker', 'Trader', 'Commission', 'Expenses', 'LocalCurrency'
+, 'TotalBookAmount'
+)
+
+_CURRENCY_NAMES = {'HKD': 'Hong Kong Dollar', 'USD': 'United States Dollar'}
+
+
+
+def _genevaDate(date):
+	"""
+	[String] date (yyyy-mm-dd) => [String] date (m/d/yyyy)
+	"""
+	d = datetime.strptime(date, '%Y-%m-%d')
+	return '{0}/{1}/{2}'.format(d.month, d.day, d.year)
+
+
+
+def _number(x):
+	"""
+	[Float] x => [String] x as in Geneva export, with thousand separators
+	and double quotes when abs(x) >= 1000.
+	"""
+	return '"{0:,.2f}"'.format(x) if abs(x) >= 1000 else '{0:.4f}'.format(x).rstrip('0').rstrip('.')
+
+
+
+def _sectionLines(headers, rows, portfolio, startDate, date):
+	"""
+	[Tuple] headers, [Iterable] ([Tuple]) rows, [String] portfolio,
+	[String] start date, [String] date
+		=> [Iterable] ([Tuple]) lines of one section
+	"""
+	params = \
+	( ('ParameterName', 'ParameterValue')
+	, ('AccountingRunType', 'Dynamic')
+	, ('BookCurrency', 'HKD')
+	, ('KnowledgeDate', _genevaDate(date) + ' 18:00')
+	, ('PeriodEndDate', _genevaDate(date) + ' 23:59')
+	, ('PeriodStartDate', _genevaDate(startDate) + ' 0:00')
+	, ('Portfolio', portfolio)
+	, ('PortfolioDescription', 'Portfolio ' + portfolio)
+	)
+
+	return chain( [headers], rows, [()], params, [()]
+				, [('EventNumber', 'ErrorMessage')], [()], [()])
+
+
+
+def writeReport(file, headers, sections):
+	"""
+	[String] file,
+	[Tuple] headers,
+	[Iterable] ([Iterable] lines) sections
+		=> [String] file
+
+	Write a multipart report like Geneva does: every section after the
+	first one starts with a byte order mark.
+	"""
+	width = len(headers)
+	with open(file, 'w', encoding='utf-16', newline='') as f:
+		for n, lines in zip(count(), sections):
+			for i, line in zip(count(), lines):
+				text = '\t'.join(chain(line, [''] * (width - len(line))))
+				f.write(('\ufeff' + text if n > 0 and i == 0 else text) + '\r\n')
+
+	return file
+
+
+
+def _securities(nSecurities):
+	"""
+	[Int] number of securities
+		=> [List] ([Dictionary]) securities
+	"""
+	return list(map(
+		lambda i: { 'InvestID': '{0} HK'.format(1000 + i) if i % 4 else '{0} US'.format(i)
+				  , 'Name': 'SYNTHETIC SECURITY {0}'.format(i)
+				  , 'Currency': 'HKD' if i % 4 else 'USD'
+				  , 'Price': round(1 + (i * 7919) % 500 / 3.0, 2)
+				  , 'SEDOL': 'B{0:06d}'.format(i)
+				  }
+	  , range(nSecurities)
+	))
+
+
+
+def _taxlotRows(rnd, securities, nLots):
+	"""
+	[Random] rnd, [List] securities, [Int] number of lots
+		=> [List] ([Tuple]) rows, [Float] market value in book currency
+	"""
+	rows, total = [], 0
+	for i in range(nLots):
+		s = securities[rnd.randrange(len(securities))]
+		fx = _USD_HKD if s['Currency'] == 'USD' else 1.0
+		quantity = float(rnd.randrange(1, 500) * 100)
+		unitCost = round(s['Price'] * rnd.uniform(0.8, 1.2), 4)
+		mv = round(quantity * s['Price'] * fx, 2)
+		cost = round(quantity * unitCost * fx, 2)
+		total = total + mv
+		rows.append(( _CURRENCY_NAMES[s['Currency']], 'Common Stock'
+					, '{0} ({1})'.format(s['Name'], s['InvestID']), s['Name']
+					, str(1100000 + i), '3/1/2021', _number(quantity), '0'
+					, _number(unitCost), _number(s['Price']), _number(cost)
+					, _number(mv), _number(mv - cost), '0', '0', '0', '', ''
+					))
+
+	for currency, fx in (('HKD', 1.0), ('USD', _USD_HKD)):
+		quantity = round(rnd.uniform(1e5, 1e7), 2)
+		total = total + quantity * fx
+		rows.append(( _CURRENCY_NAMES[currency], 'Cash and Equivalents'
+					, '{0} ({1})'.format(_CURRENCY_NAMES[currency], currency)
+					, _CURRENCY_NAMES[currency] + '-JPM OnHand', '', ''
+					, _number(quantity), '0', '1', _number(fx), _number(quantity * fx)
+					, _number(quantity * fx), '0', '0', '0', '0', '', ''
+					))
+
+	return rows, total
+
+
+
+def _cashLedgerRows(rnd, securities, date, nTransactions):
+	"""
+	[Random] rnd, [List] securities, [String] date, [Int] number of transactions
+		=> [List] ([Tuple]) rows
+	"""
+	def row(i):
+		s = securities[rnd.randrange(len(securities))]
+		amount = round(rnd.uniform(-1e6, 1e6), 2)
+		currency = _CURRENCY_NAMES[s['Currency']]
+		return ( currency, '0', '0', '', '0', '0', _genevaDate(date), _genevaDate(date)
+			   , _genevaDate(date), str(2000000 + i)
+			   , rnd.choice(('Buy', 'Sell', 'Dividend', 'AccountingRelated'))
+			   , s['Name'], '0', '0', _number(amount), '0', _number(amount), '0'
+			   , '', '0', '0', currency, '0', '0'
+			   )
+
+
+	return list(map(row, range(nTransactions)))
+
+
+
+def _dividendReceivableRows(rnd, taxlotRows, date, nDividends):
+	"""
+	[Random] rnd, [List] tax lot rows, [String] date, [Int] number of dividends
+		=> [List] ([Tuple]) rows
+
+	Dividends are on securities held, one per security, about half of
+	them go ex on the date.
+	"""
+	def row(t):
+		i, lot = t
+		amount = round(rnd.uniform(1e3, 1e5), 2)
+		return ( 'Dividends Receivable', '', lot[0], '', lot[3], str(3000000 + i)
+			   , _genevaDate(date) if i % 2 else '3/1/2021', lot[6], 'HKD'
+			   , _number(amount), '0%', '0', _number(amount), _number(amount), '0'
+			   , _number(amount), '0', _genevaDate(date), '0.1', '0', '0', '0', '0'
+			   )
+
+
+	lots = list({ lot[3]: lot for lot in taxlotRows
+				  if lot[1] != 'Cash and Equivalents'}.values())
+	return list(map(row, enumerate(rnd.sample(lots, min(nDividends, len(lots))))))
+
+
+
+def _purchaseSalesRows(rnd, securities, date, nTransactions):
+	"""
+	[Random] rnd, [List] securities, [String] date, [Int] number of transactions
+		=> [List] ([Tuple]) rows
+	"""
+	def row(i):
+		s = securities[rnd.randrange(len(securities))]
+		quantity = float(rnd.randrange(1, 100) * 100)
+		tranType = rnd.choice(('Buy', 'Sell'))
+		amount = quantity * s['Price'] * (-1 if tranType == 'Buy' else 1)
+		return ( _genevaDate(date), _genevaDate(date), tranType, s['InvestID']
+			   , '{0} ({1})'.format(s['Name'], s['InvestID']), 'JPM'
+			   , _number(quantity), _number(s['Price']), '0', _number(amount)
+			   , _number(amount), _genevaDate(date), str(4000000 + i), ''
+			   , 'BROKER', '', '10', '5', s['Currency'], _number(amount)
+			   )
+
+
+	return list(map(row, range(nTransactions)))
+
+
+
+def _writeMasterFiles(directory, securities, portfolios):
+	"""
+	[String] directory, [List] securities, [List] ([String]) portfolios
+
+	Side effect: write security id and type, SEDOL and portfolio name
+	files (xlsx).
+	"""
+	def writeXlsx(file, rows):
+		wb = openpyxl.Workbook()
+		for row in rows:
+			wb.active.append(row)
+		wb.save(join(directory, file))
+
+
+	cash = list(map( lambda c: (c, 'Cash and Equivalents', c)
+				   , _CURRENCY_NAMES))
+	writeXlsx( 'Steven Zhang Security ID and Type Report.xlsx'
+			 , chain( [('Code', 'InvestmentType Description', 'BifurcationCurrency Code')]
+			 		, map( lambda s: (s['InvestID'], 'Common Stock', s['Currency'])
+			 			 , securities)
+			 		, cash
+			 		))
+	writeXlsx( 'Equity Sedol Code.xlsx'
+			 , chain( [('Investment Id', 'SEDOL')]
+			 		, map(lambda s: (s['InvestID'], s['SEDOL']), securities)))
+	writeXlsx( 'Steven Zhang Portfolio Names.xlsx'
+			 , chain( [('NameSort', 'NameLine1')]
+			 		, map(lambda p: (p, 'Portfolio ' + p), portfolios)))
+
+
+
+def generateDataset( directory, date, nPortfolios=10, nLots=200, nTransactions=200
+				   , nSecurities=300, seed=0):
+	"""
+	[String] directory,
+	[String] date (yyyy-mm-dd),
+	[Int] number of portfolios,
+	[Int] number of tax lots per portfolio,
+	[Int] number of cash ledger and purchase sales rows per portfolio,
+	[Int] number of securities,
+	[Int] random seed
+		=> [Dictionary] ([String] report type -> [String] file)
+
+	Side effect: write all five 'all funds ...' reports for the date,
+	plus the master files if openpyxl is installed.
+	"""
+	makedirs(directory, exist_ok=True)
+	rnd = random.Random(seed)
+	securities = _securities(nSecurities)
+	portfolios = list(map(lambda i: str(20000 + i), range(nPortfolios)))
+	startDate = date[:8] + '01'
+	section = partial(_sectionLines, startDate=startDate, date=date)
+
+	taxlots = dict(map( lambda p: (p, _taxlotRows(rnd, securities, nLots))
+					  , portfolios))
+	reports = \
+	{ 'tax lot': ( 'all funds tax lot {0}.txt'.format(date), _TAXLOT_HEADERS
+				 , map(lambda p: section(_TAXLOT_HEADERS, taxlots[p][0], p), portfolios)
+				 )
+	, 'dividend receivable': (
+				   'all funds dividend receivable {0}.txt'.format(date)
+				 , _DIVIDEND_RECEIVABLE_HEADERS
+				 , map( lambda p: section( _DIVIDEND_RECEIVABLE_HEADERS
+				 						 , _dividendReceivableRows( rnd, taxlots[p][0]
+				 						 						  , date, max(1, nLots//20))
+				 						 , p)
+				 	  , portfolios)
+				 )
+	, 'nav': ( 'all funds nav {0}.txt'.format(date), _NAV_HEADERS
+			 , map( lambda p: section( _NAV_HEADERS
+			 						 , [('Total', '0', '0', '0', '0', '0', '0'
+			 						 	, _number(taxlots[p][1]))]
+			 						 , p)
+			 	  , portfolios)
+			 )
+	, 'cash ledger': ( 'all funds cash ledger {0} {1}.txt'.format(startDate, date)
+					 , _CASH_LEDGER_HEADERS
+					 , map( lambda p: section( _CASH_LEDGER_HEADERS
+					 						 , _cashLedgerRows(rnd, securities, date, nTransactions)
+					 						 , p)
+					 	  , portfolios)
+					 )
+	, 'purchase sales': ( 'all funds purchase sales {0} {1}.txt'.format(startDate, date)
+						, _PURCHASE_SALES_HEADERS
+						, map( lambda p: section( _PURCHASE_SALES_HEADERS
+												, _purchaseSalesRows(rnd, securities, date, nTransactions)
+												, p)
+							 , portfolios)
+						)
+	}
+
+	if openpyxl != None:
+		_writeMasterFiles(directory, securities, portfolios)
+
+	return { reportType: writeReport(join(directory, fn), headers, sections)
+			 for reportType, (fn, headers, sections) in reports.items()
+		   }
+
+
+
+
+if __name__ == "__main__":
+	import argparse
+	parser = argparse.ArgumentParser(description='generate synthetic Geneva reports')
+	parser.add_argument('directory', metavar='directory', type=str)
+	parser.add_argument('date', metavar='date', type=str, help="date (yyyy-mm-dd)")
+	parser.add_argument('--portfolios', type=int, default=10)
+	parser.add_argument('--lots', type=int, default=200)
+	parser.add_argument('--transactions', type=int, default=200)
+	args = parser.parse_args()
+
+	for file in generateDataset( args.directory, args.date, args.portfolios
+							   , args.lots, args.transactions).values():
+		print(file)
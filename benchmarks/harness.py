@@ -0,0 +1,110 @@
+# coding=utf-8
+#
+# A small benchmark harness.
+#
+# Cases are written like pytest-benchmark tests: a case is a function
+# taking a 'benchmark' callable and the dataset, and calls
+# benchmark(func, *args) on the code to measure. Here the harness
+# provides 'benchmark', so no plugin is needed, and results go to a
+# json file that can be compared with a later run.
+#
+# As in pytest-benchmark, a case can put more figures (file sizes,
+# etc.) in benchmark.extra_info, they are kept with the timings.
+#
+from factset.data import clearReportCaches
+from factset.result_store import clearMemory
+from time import perf_counter
+import json, logging, platform, statistics
+logger = logging.getLogger(__name__)
+
+
+
+def _clearCaches():
+	"""
+	Side effect: every round starts without parsed reports in memory,
+	security and portfolio names stay loaded.
+	"""
+	clearReportCaches()
+	clearMemory()
+
+
+
+def runCase(caseFunc, dataset, rounds):
+	"""
+	[Function] ([Function] benchmark, [Dictionary] dataset),
+	[Dictionary] dataset,
+	[Int] number of rounds
+		=> [Dictionary] timing statistics in seconds, or the error
+	"""
+	timings = []
+
+	def benchmark(func, *args, **kwargs):
+		result = None
+		for _ in range(rounds):
+			_clearCaches()
+			start = perf_counter()
+			result = func(*args, **kwargs)
+			timings.append(perf_counter() - start)
+
+		return result
+	# End of benchmark()
+
+	benchmark.extra_info = {}
+	try:
+		caseFunc(benchmark, dataset)
+	except Exception as e:
+		logger.exception('runCase(): {0}'.format(caseFunc.__name__))
+		return {'error': repr(e)}
+
+	return dict(
+	{ 'rounds': len(timings)
+	, 'min': min(timings)
+	, 'max': max(timings)
+	, 'mean': statistics.mean(timings)
+	, 'median': statistics.median(timings)
+	}, **({'extra_info': benchmark.extra_info} if benchmark.extra_info else {}))
+
+
+
+def runCases(cases, dataset, params, rounds):
+	"""
+	[Dictionary] ([String] name -> [Function] case),
+	[Dictionary] dataset,
+	[Dictionary] dataset parameters,
+	[Int] number of rounds
+		=> [Dictionary] results
+	"""
+	return \
+	{ 'params': params
+	, 'python': platform.python_version()
+	, 'machine': platform.platform()
+	, 'cases': {name: runCase(func, dataset, rounds) for name, func in cases.items()}
+	}
+
+
+
+def writeResults(file, results):
+	"""
+	[String] file, [Dictionary] results => [String] file
+	"""
+	with open(file, 'w', encoding='utf-8') as f:
+		json.dump(results, f, indent=2)
+
+	return file
+
+
+
+def compareResults(baseline, results):
+	"""
+	[Dictionary] baseline results, [Dictionary] results
+		=> [List] ([Tuple]) (case, baseline median, median, ratio)
+	"""
+	def median(r, name):
+		return r['cases'].get(name, {}).get('median')
+
+
+	return [ ( name, median(baseline, name), median(results, name)
+			 , median(results, name) / median(baseline, name))
+			 for name in results['cases']
+			 if median(baseline, name) and median(results, name)
+		   ]
@@ -0,0 +1,128 @@
+# coding=utf-8
+#
+# Load test for query_service.py
+#
+# Opens a number of concurrent keep-alive connections, each sending a
+# series of GET requests, then reports throughput and latency.
+#
+# python -m factset.benchmarks.query_service_load 2021-03-31 12307
+#
+from itertools import chain
+from time import perf_counter
+import asyncio, json, statistics
+
+
+
+async def _get(reader, writer, host, target, headers):
+	"""
+	[StreamReader] reader, [StreamWriter] writer, [String] host,
+	[String] target, [Dictionary] headers
+		=> ([Int] status, [Dictionary] response headers, [Bytes] body)
+	"""
+	writer.write(
+		('GET {0} HTTP/1.1\r\nHost: {1}\r\n'.format(target, host) \
+			+ ''.join(map(lambda kv: '{0}: {1}\r\n'.format(*kv), headers.items())) \
+			+ '\r\n').encode('latin-1')
+	)
+	await writer.drain()
+
+	status = int((await reader.readline()).split()[1])
+	responseHeaders = {}
+	while True:
+		line = await reader.readline()
+		if line in (b'\r\n', b'\n', b''):
+			break
+		key, _, value = line.decode('latin-1').partition(':')
+		responseHeaders[key.strip().lower()] = value.strip()
+
+	body = await reader.readexactly(int(responseHeaders.get('content-length', 0)))
+	return status, responseHeaders, body
+
+
+
+async def _client(host, port, targets, nRequests, useEtag, useGzip):
+	"""
+	[String] host, [Int] port, [List] ([String]) targets,
+	[Int] number of requests, [Bool] use etag, [Bool] use gzip
+		=> [List] ([Float]) latency of each request in seconds
+
+	All requests go through one connection.
+	"""
+	reader, writer = await asyncio.open_connection(host, port)
+	etags, latencies = {}, []
+	for i in range(nRequests):
+		target = targets[i % len(targets)]
+		headers = {'Accept-Encoding': 'gzip'} if useGzip else {}
+		if useEtag and target in etags:
+			headers['If-None-Match'] = etags[target]
+
+		start = perf_counter()
+		status, responseHeaders, _ = await _get(reader, writer, host, target, headers)
+		latencies.append(perf_counter() - start)
+		if status == 200:
+			etags[target] = responseHeaders.get('etag', '')
+		elif status != 304:
+			raise ValueError('_client(): status {0} for {1}'.format(status, target))
+
+	writer.close()
+	return latencies
+
+
+
+async def runLoadTest( host, port, targets, nConnections, nRequests
+					 , useEtag=True, useGzip=True):
+	"""
+	[String] host, [Int] port, [List] ([String]) targets,
+	[Int] number of connections, [Int] requests per connection,
+	[Bool] use etag, [Bool] use gzip
+		=> [Dictionary] results
+	"""
+	start = perf_counter()
+	latencies = list(chain.from_iterable(
+		await asyncio.gather(*map( lambda _: _client( host, port, targets, nRequests
+													, useEtag, useGzip)
+								 , range(nConnections)
+								 ))
+	))
+	elapsed = perf_counter() - start
+	latencies.sort()
+
+	return \
+	{ 'connections': nConnections
+	, 'requests': len(latencies)
+	, 'seconds': elapsed
+	, 'requests per second': len(latencies)/elapsed
+	, 'latency p50 ms': 1000*statistics.median(latencies)
+	, 'latency p95 ms': 1000*latencies[int(0.95*(len(latencies)-1))]
+	, 'latency max ms': 1000*latencies[-1]
+	}
+
+
+
+
+if __name__ == "__main__":
+	import argparse
+	parser = argparse.ArgumentParser(description='load test the query service')
+	parser.add_argument('date', metavar='date', type=str, help="date (yyyy-mm-dd)")
+	parser.add_argument('portfolio', metavar='portfolio', type=str, help="portfolio id")
+	parser.add_argument('--host', type=str, default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--connections', type=int, default=10)
+	parser.add_argument('--requests', type=int, default=100)
+	parser.add_argument('--no-etag', action='store_true')
+	parser.add_argument('--no-gzip', action='store_true')
+	args = parser.parse_args()
+
+	targets = list(map(
+		lambda t: '{0}?date={1}&portfolio={2}&format={3}'.format(
+					t[0], args.date, args.portfolio, t[1])
+	  , [ ('/positions', 'json'), ('/positions', 'csv')
+		, ('/transactions', 'json'), ('/cash_ledger', 'json')
+		]
+	))
+
+	print(json.dumps(
+		asyncio.run(runLoadTest( args.host, args.port, targets, args.connections
+							   , args.requests, not args.no_etag, not args.no_gzip))
+	  , indent=2
+	))
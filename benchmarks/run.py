@@ -0,0 +1,102 @@
+# coding=utf-8
+#
+# Generate a synthetic dataset, run the benchmark cases on it and save
+# the results as json.
+#
+# python -m factset.benchmarks.run --portfolios 50 --lots 2000 \
+#	--transactions 1000 --output results.json --compare baseline.json
+#
+# Logging follows logging.config, use --log-level to override it (for
+# example compare DEBUG against WARNING to see the cost of logging).
+#
+from factset.benchmarks.generator import generateDataset
+from factset.benchmarks.harness import runCases, writeResults, compareResults
+from factset.benchmarks.cases import getCases
+from factset.utility import config
+from os import makedirs
+from os.path import join
+import json, tempfile
+
+
+
+def _useDirectories(dataDir, outputDir):
+	"""
+	[String] data directory, [String] output directory
+
+	Side effect: point the configuration to the benchmark directories.
+	"""
+	if not 'Data' in config:
+		config['Data'] = {}
+
+	config['Data']['inputDirectory'] = dataDir
+	config['Data']['outputDirectory'] = outputDir
+	config['Data']['storeDirectory'] = join(outputDir, 'store')
+
+
+
+def runBenchmarks(directory, date, nPortfolios, nLots, nTransactions, rounds, names=None):
+	"""
+	[String] working directory,
+	[String] date (yyyy-mm-dd),
+	[Int] number of portfolios,
+	[Int] number of tax lots per portfolio,
+	[Int] number of transactions per portfolio,
+	[Int] number of rounds,
+	[List] ([String]) case names to run, None means all
+		=> [Dictionary] results
+	"""
+	dataDir, outputDir = join(directory, 'data'), join(directory, 'output')
+	params = { 'date': date, 'portfolios': nPortfolios, 'lots': nLots
+			 , 'transactions': nTransactions}
+	files = generateDataset(dataDir, date, nPortfolios, nLots, nTransactions)
+	makedirs(outputDir, exist_ok=True)
+	_useDirectories(dataDir, outputDir)
+
+	dataset = \
+	{ 'date': date
+	, 'files': files
+	, 'portfolios': list(map(lambda i: str(20000 + i), range(nPortfolios)))
+	, 'outputDir': outputDir
+	}
+
+	cases = { name: func for name, func in getCases().items()
+			  if names == None or name in names}
+	return runCases(cases, dataset, params, rounds)
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='run benchmarks on synthetic data')
+	parser.add_argument('--date', type=str, default='2021-03-31')
+	parser.add_argument('--portfolios', type=int, default=10)
+	parser.add_argument('--lots', type=int, default=200)
+	parser.add_argument('--transactions', type=int, default=200)
+	parser.add_argument('--rounds', type=int, default=3)
+	parser.add_argument('--cases', type=str, nargs='*', help="case names, default all")
+	parser.add_argument('--output', type=str, default='benchmark_results.json')
+	parser.add_argument('--compare', type=str, help="baseline results json")
+	parser.add_argument('--log-level', type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+	args = parser.parse_args()
+
+	if args.log_level:
+		logging.getLogger().setLevel(args.log_level)
+
+	with tempfile.TemporaryDirectory() as directory:
+		results = runBenchmarks( directory, args.date, args.portfolios, args.lots
+							   , args.transactions, args.rounds, args.cases)
+
+	print(writeResults(args.output, results))
+	for name, r in results['cases'].items():
+		print('{0:<30} {1}'.format(name, r.get('median', r.get('error'))))
+
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as f:
+			baseline = json.load(f)
+
+		for name, old, new, ratio in compareResults(baseline, results):
+			print('{0:<30} {1:.4f}s -> {2:.4f}s ({3:.2f}x)'.format(name, old, new, ratio))
@@ -0,0 +1,104 @@
+# coding=utf-8
+#
+# Compressed files, by file name suffix: .gz (gzip) and .zst
+# (Zstandard, when the zstandard package is installed).
+#
+# Files are compressed and decompressed as a stream, a compressed
+# input is never decompressed to disk or held in memory as a whole.
+#
+import gzip, io, logging
+logger = logging.getLogger(__name__)
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+
+
+"""
+	[String] compression => [String] file name suffix
+"""
+_SUFFIXES = {'gz': '.gz', 'zst': '.zst'}
+
+
+
+def getCompressions():
+	"""
+	=> [List] ([String]) supported compressions
+	"""
+	return list(_SUFFIXES)
+
+
+
+def getCompression(file):
+	"""
+	[String] file => [String] compression ('gz', 'zst'), '' for none
+	"""
+	for compression, suffix in _SUFFIXES.items():
+		if file.lower().endswith(suffix):
+			return compression
+
+	return ''
+
+
+
+def stripCompression(file):
+	"""
+	[String] file => [String] file name without the compression suffix
+	"""
+	compression = getCompression(file)
+	return file[:-len(_SUFFIXES[compression])] if compression else file
+
+
+
+def addCompression(file, compression):
+	"""
+	[String] file, [String] compression, '' for none => [String] file
+	"""
+	return file + _SUFFIXES[compression] if compression else file
+
+
+
+def _checkZstandard():
+	if zstandard == None:
+		logger.error('_checkZstandard(): zstandard is not installed')
+		raise ValueError
+
+
+
+def openInput(file, encoding, newline=None):
+	"""
+	[String] file, [String] encoding, [String] newline (as open())
+		=> [File] text file, decompressed as it is read
+	"""
+	compression = getCompression(file)
+	if compression == 'gz':
+		return gzip.open(file, 'rt', encoding=encoding, newline=newline)
+	elif compression == 'zst':
+		_checkZstandard()
+		return io.TextIOWrapper(
+			io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file, 'rb')))
+		  , encoding=encoding, newline=newline)
+	else:
+		return open(file, 'r', encoding=encoding, newline=newline)
+
+
+
+def compressWriter(f, compression, level=None):
+	"""
+	[File] binary file open for writing,
+	[String] compression ('gz' or 'zst'),
+	[Int] compression level, None for the default
+		=> [File] binary file, what is written to it goes compressed to
+			f. Closing it ends the compressed stream but leaves f open.
+	"""
+	if compression == 'gz':
+		return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6 if level == None else level)
+	elif compression == 'zst':
+		_checkZstandard()
+		return zstandard.ZstdCompressor(level=3 if level == None else level) \
+				.stream_writer(f, closefd=False)
+	else:
+		logger.error('compressWriter(): {0} not supported'.format(compression))
+		raise ValueError
@@ -6,8 +6,13 @@ from factset.geneva_position import readMultipartTaxlotReport \
 								, readMultipartDividendReceivableReport \
 								, readMultipartCashLedgerReport \
 								, readMultipartNavReport \
-								, readMultipartPurchaseSalesReport
+								, readMultipartPurchaseSalesReport \
+								, _CASH_AND_EQUIVALENTS
 from factset.utility import getDataDirectory
+from factset.instrument import timed, registerCache
+from factset.compression import getCompression, stripCompression
+from factset.report_cache import isReportCacheFile, isReportCacheFresh, stripReportCache
+from factset.shared_report import shareRows, attachRows, getRows
 from steven_utils.file import getFiles
 from steven_utils.utility import mergeDict, allEquals
 from steven_utils.excel import getRawPositionsFromFile
@@ -16,24 +21,40 @@ from toolz.itertoolz import groupby as groupbyToolz
 from toolz.dicttoolz import valmap
 from functools import lru_cache, partial
 from itertools import filterfalse
+from os import stat
 from os.path import join
-import logging, re
+import logging, re, sys
 logger = logging.getLogger(__name__)
 
 
 
+"""
+	([Function] report loader, [String] date) -> [Dictionary] shared
+	report view, see attachSharedReports()
+"""
+_sharedViews = {}
+
+
+
 def _getGenevaPortfolioData(dataGetterFunc, date, portfolio):
 	"""
 	[Function] ([String] date -> [Iterable] ([Dictionary]) positions),
 	[String] date (yyyy-mm-dd), 
 	[String] portfolio
 		=> [List] ([Dictionary]) Positions from a Geneva report
+
+	If the report is attached from shared memory, only the rows of the
+	portfolio are built from it.
 	"""
-	logger.debug('_getGenevaPortfolioData(): {0}, {1}'.format(date, portfolio))
+	logger.debug('_getGenevaPortfolioData(): %s, %s', date, portfolio)
 
-	if portfolio == 'all':
+	view = _sharedViews.get((dataGetterFunc, date))
+	if view != None:
+		return getRows(view, None if portfolio == 'all' else portfolio)
+	elif portfolio == 'all':
 		return list(dataGetterFunc(date))
 	else:
+		portfolio = sys.intern(portfolio)	# Portfolio values are interned
 		return compose(
 			list
 		  , partial(filter, lambda p: p['Portfolio'] == portfolio)
@@ -84,7 +105,7 @@ def getFxTable(date):
 	  , partial(filterfalse, lambda p: p['MarketPrice'] == 'NA')
 	  , partial(filterfalse, lambda p: p['BookCurrency'] == p['InvestID'])
 	  , partial( filter
-	  		   , lambda p: p['ThenByDescription'] == 'Cash and Equivalents'
+	  		   , lambda p: p['ThenByDescription'] == _CASH_AND_EQUIVALENTS
 	  		   )
 	  , lambda date: getGenevaPositions(date, 'all')
 	)(date)
@@ -131,6 +152,51 @@ def getPortfolioNames():
 
 
 
+def getPortfolioCodes(date):
+	"""
+	[String] date (yyyy-mm-dd) => [List] ([String]) portfolio codes
+
+	Portfolios in the tax lot report of the date, sorted.
+	"""
+	return compose(
+		sorted
+	  , set
+	  , partial(map, lambda p: p['Portfolio'])
+	  , _getGenevaPositionsFromFile
+	)(date)
+
+
+
+def getReportDates(reportType):
+	"""
+	[String] report type ('tax lot', 'nav', etc.)
+		=> [List] ([String]) dates (yyyy-mm-dd) with a report file of
+			the type in the data directory, sorted.
+	"""
+	return compose(
+		sorted
+	  , set
+	  , partial(map, _getEndDateFromFilename)
+	  , partial(filter, partial(_isGenevaReportFile, reportType))
+	  , getFiles
+	  , getDataDirectory
+	)()
+
+
+
+def clearReportCaches():
+	"""
+	Side effect: clear the cached Geneva reports and FX tables, so
+	that re-exported report files are read again. Security and
+	portfolio names are kept.
+	"""
+	for func in ( getFxTable, _getGenevaPositionsFromFile
+				, _getGenevaDividendReceivableFromFile, _getGenevaCashLedgerFromFile
+				, _getGenevaNavFromFile, _getGenevaPurchaseSalesFromFile):
+		func.cache_clear()
+
+
+
 def _getEndDateFromFilename(fn):
 	"""
 	[String] file name (without path) => [String] date
@@ -159,6 +225,71 @@ def _checkOnlyOne(L):
 
 
 
+"""
+	[String] report type => [String] file name prefix (lower case)
+"""
+_GENEVA_REPORT_PREFIXES = \
+{ 'tax lot': 'all funds tax lot'
+, 'dividend receivable': 'all funds dividend receivable'
+, 'nav': 'all funds nav'
+, 'cash ledger': 'all funds cash ledger'
+, 'purchase sales': 'all funds purchase sales'
+}
+
+
+
+def _isGenevaReportFile(reportType, fn):
+	"""
+	[String] report type, [String] file name (without path) => [Bool]
+	"""
+	return fn.lower().startswith(_GENEVA_REPORT_PREFIXES[reportType])
+
+
+
+def _getGenevaReportType(fn):
+	"""
+	[String] file name (without path)
+		=> [String] report type, or None if not a Geneva report file
+	"""
+	for reportType in _GENEVA_REPORT_PREFIXES:
+		if _isGenevaReportFile(reportType, fn):
+			return reportType
+
+	return None
+
+
+
+def _pickReportFiles(fns):
+	"""
+	[List] ([String]) file names => [List] ([String]) file names
+
+	A report may be there in more than one form: plain, compressed
+	(x.txt.gz) and report cache (x.txt.cache). Keep one of each: the
+	cache if it is fresh or the only one, else the plain file, else the
+	compressed one.
+	"""
+	def pick(L):
+		caches = list(filter(isReportCacheFile, L))
+		others = sorted( filterfalse(isReportCacheFile, L)
+					   , key=lambda fn: (getCompression(fn) != '', fn))
+		if len(caches) > 0 and \
+			(len(others) == 0 or isReportCacheFresh( join(getDataDirectory(), caches[0])
+												   , join(getDataDirectory(), others[0]))):
+			return caches[0]
+		else:
+			return others[0]
+
+
+	return compose(
+		list
+	  , partial(map, pick)
+	  , lambda d: d.values()
+	  , partial(groupbyToolz, compose(stripCompression, stripReportCache))
+	)(fns)
+
+
+
+@timed('file discovery')
 def _getGenevaFileWithDate(func, date):
 	"""
 	[Function] ([String] -> [Bool]) file name pattern function,
@@ -167,6 +298,7 @@ def _getGenevaFileWithDate(func, date):
 
 	Using the file name pattern function to filter files from the
 	data directory, then get the file with the correct end date.
+	The file may be compressed (.gz, .zst) or a report cache.
 	"""
 	# def show(L):
 	# 	for x in L:
@@ -179,7 +311,7 @@ def _getGenevaFileWithDate(func, date):
 	return compose(
 		lambda L: join(getDataDirectory(), L[0])
 	  , _checkOnlyOne
-	  , list
+	  , _pickReportFiles
 	  , partial(filter, lambda fn: _getEndDateFromFilename(fn) == date)
   	  # , show
 	  , partial(filter, func)
@@ -194,7 +326,7 @@ def _getGenevaFileWithDate(func, date):
 """
 _getGenevaTaxlotFile = partial(
 	_getGenevaFileWithDate
-  , lambda fn: fn.lower().startswith('all funds tax lot')
+  , partial(_isGenevaReportFile, 'tax lot')
 )
 
 
@@ -204,7 +336,7 @@ _getGenevaTaxlotFile = partial(
 """
 _getGenevaDividendReceivableFile = partial(
 	_getGenevaFileWithDate
-  , lambda fn: fn.lower().startswith('all funds dividend receivable')
+  , partial(_isGenevaReportFile, 'dividend receivable')
 )
 
 
@@ -214,7 +346,7 @@ _getGenevaDividendReceivableFile = partial(
 """
 _getGenevaCashLedgerFile = partial(
 	_getGenevaFileWithDate
-  , lambda fn: fn.lower().startswith('all funds cash ledger')
+  , partial(_isGenevaReportFile, 'cash ledger')
 )
 
 
@@ -224,18 +356,49 @@ _getGenevaCashLedgerFile = partial(
 """
 _getGenevaPurchaseSalesFile = partial(
 	_getGenevaFileWithDate
-  , lambda fn: fn.lower().startswith('all funds purchase sales')
+  , partial(_isGenevaReportFile, 'purchase sales')
 )
 
 
 
+"""
+	[String] date => [String] NAV file
+"""
 _getGenevaNavFile = partial(
 	_getGenevaFileWithDate
-  , lambda fn: fn.lower().startswith('all funds nav')
+  , partial(_isGenevaReportFile, 'nav')
 )
 
 
 
+def _getGenevaReportFile(reportType, date):
+	"""
+	[String] report type, [String] date (yyyy-mm-dd) => [String] file
+	"""
+	return _getGenevaFileWithDate(partial(_isGenevaReportFile, reportType), date)
+
+
+
+def getInputFingerprints(reportTypes, date):
+	"""
+	[Tuple] ([String]) report types, [String] date (yyyy-mm-dd)
+		=> [Dictionary] ([String] input file -> [List] ([Int] size, [Int] mtime))
+
+	Only the file stats are used, so this takes milliseconds.
+	"""
+	def fingerprint(file):
+		s = stat(file)
+		return [s.st_size, s.st_mtime_ns]
+
+
+	return compose(
+		dict
+	  , partial(map, lambda file: (file, fingerprint(file)))
+	  , partial(map, lambda t: _getGenevaReportFile(t, date))
+	)(reportTypes)
+
+
+
 @lru_cache(maxsize=3)
 def _getGenevaPortfolioNamesFromFile(file):
 	"""
@@ -440,4 +603,68 @@ def getGenevaNav(date, portfolio):
 					date, portfolio))
 		raise ValueError
 
-	return (positions[0]['BookCurrency'], positions[0]['SumBal1'])
\ No newline at end of file
+	return (positions[0]['BookCurrency'], positions[0]['SumBal1'])
+
+
+
+"""
+	[String] report type -> [Function] ([String] date -> [List] positions)
+"""
+_REPORT_LOADERS = \
+{ 'tax lot': _getGenevaPositionsFromFile
+, 'dividend receivable': _getGenevaDividendReceivableFromFile
+, 'nav': _getGenevaNavFromFile
+, 'cash ledger': _getGenevaCashLedgerFromFile
+, 'purchase sales': _getGenevaPurchaseSalesFromFile
+}
+
+
+
+def shareReports(date, reportTypes):
+	"""
+	[String] date (yyyy-mm-dd), [Iterable] ([String]) report types
+		=> ( [List] ([SharedMemory]) blocks
+		   , [Dictionary] ([String] report type -> [Dictionary] handle)
+		   )
+
+	Load the reports and put them in shared memory, see shared_report.py.
+	The caller frees the blocks with releaseRows() when done.
+	"""
+	shared = {t: shareRows(_REPORT_LOADERS[t](date)) for t in reportTypes}
+	return list(map(lambda x: x[0], shared.values())), valmap(lambda x: x[1], shared)
+
+
+
+def attachSharedReports(date, handles):
+	"""
+	[String] date (yyyy-mm-dd),
+	[Dictionary] ([String] report type -> [Dictionary] handle)
+
+	Side effect: in this process, the reports of the date are read from
+	shared memory from now on. Used as the initializer of child
+	processes.
+	"""
+	for reportType, handle in handles.items():
+		_sharedViews[(_REPORT_LOADERS[reportType], date)] = attachRows(handle)
+
+
+
+def _registerCaches():
+	"""
+	Side effect: cache hits and misses show up in the instrumentation
+	summary (when enabled).
+	"""
+	for name, func in ( ('fx table', getFxTable)
+					  , ('security id and type', getSecurityIdAndType)
+					  , ('portfolio names', getPortfolioNames)
+					  , ('tax lot', _getGenevaPositionsFromFile)
+					  , ('dividend receivable', _getGenevaDividendReceivableFromFile)
+					  , ('cash ledger', _getGenevaCashLedgerFromFile)
+					  , ('nav', _getGenevaNavFromFile)
+					  , ('purchase sales', _getGenevaPurchaseSalesFromFile)
+					  ):
+		registerCache(name, func)
+
+
+
+_registerCaches()
\ No newline at end of file
@@ -7,12 +7,16 @@ from factset.data import getGenevaPositions, getSecurityIdAndType \
 						, getFxTable, getGenevaNav
 from steven_utils.utility import mergeDict
 from steven_utils.iter import firstOf
+from factset.instrument import timed
+from factset.utility import isSampledDebugRow
 from toolz.functoolz import compose
 from functools import partial
-from itertools import filterfalse
+from itertools import filterfalse, count
+from operator import itemgetter
 from os.path import join
 import logging
 logger = logging.getLogger(__name__)
+_positionCounter = count()
 
 
 
@@ -348,6 +352,7 @@ def changeDateFormat(dt):
 
 
 
+@timed('fx lookup')
 def _getFxRate(date, portfolio, currency, targetCurrency):
 	"""
 	[String] date (yyyy-mm-dd),
@@ -387,8 +392,8 @@ def _getFxRate(date, portfolio, currency, targetCurrency):
 	if p != None:
 		return 1.0/p['ExchangeRate']
 
-	logger.debug('FX not found for portfolio {0}, {1}->{2}, try other portfolio'.format(
-				portfolio, currency, targetCurrency))
+	logger.debug( 'FX not found for portfolio %s, %s->%s, try other portfolio'
+				, portfolio, currency, targetCurrency)
 
 	p = firstOf( lambda p: all(( date == p['Date']
 							   , currency == p['Currency']
@@ -410,19 +415,21 @@ def _getFxRate(date, portfolio, currency, targetCurrency):
 	if p != None:
 		return 1.0/p['ExchangeRate']
 
-	logger.error('FX not found for {1}->{2}'.format(currency, targetCurrency))
+	logger.error('FX not found for %s->%s', currency, targetCurrency)
 	raise ValueError
 
 
 
+@timed('factset position')
 def _factsetPosition(dividendReceivable, position):
 	"""
 	[Dictionary] dividend receivable,
 	[Dictionary] position 
 		=> [Dictionary] factset position
 	"""
-	logger.debug('_factsetPosition(): {0}, {1}'.format(
-				_getPortfolioCode(position), _getInvestId(position)))
+	if isSampledDebugRow(logger, _positionCounter):
+		logger.debug( '_factsetPosition(): %s, %s'
+					, _getPortfolioCode(position), _getInvestId(position))
 
 	assetClass, assetType = _getAssetClassAndType(position)
 
@@ -450,6 +457,7 @@ def _factsetPosition(dividendReceivable, position):
 
 
 
+@timed('nav check')
 def _checkNavConsistency(date, portfolio, positions):
 	"""
 	[Float] nav,
@@ -458,7 +466,7 @@ def _checkNavConsistency(date, portfolio, positions):
 	[List] factset positions
 		=> [List] factset positions
 	"""
-	logger.debug('checkNavConsistency(): {0}, {1}'.format(date, portfolio))
+	logger.debug('checkNavConsistency(): %s, %s', date, portfolio)
 
 	navCurrency, nav = getGenevaNav(date, portfolio)
 	s = sum(map( lambda p: p['Ending Market Value'] * _getFxRate(date
@@ -466,31 +474,55 @@ def _checkNavConsistency(date, portfolio, positions):
 			   , positions
 			   ))
 
-	if abs(nav - s)/nav < 0.00001:
-		return positions
-	else:
+	_checkNavSum(date, portfolio, nav, s)
+	return positions
+
+
+
+def _checkNavSum(date, portfolio, nav, s):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Float] nav,
+	[Float] sum of ending market values in NAV currency
+
+	Raise ValueError if they do not agree.
+	"""
+	if not abs(nav - s)/nav < 0.00001:
 		logger.error('checkNavConsistency(): {0}, {1}, {2}, {3}'.format(
 					date, portfolio, nav, s))
 		raise ValueError
 
 
 
-def getPositions(date, portfolio):
+def _getDividendIndex(date, portfolio):
 	"""
 	[String] date (yyyy-mm-dd), [String] portfolio
-		=> [List] ([Dictionary]) factset positions
+		=> [Dictionary] ([String] portfolio, [String] investment) -> [Dictionary] dividend entry
 
-	Note: portfolio cannot be 'all', must be a portfolio code.
+	Dividend receivables going ex on the date.
 	"""
-	logger.debug('getPositions(): date={0}, portfolio={1}'.format(date, portfolio))
-	
-	dividendReceivable = compose(
+	return compose(
 		dict
 	  , partial(map, lambda p: ((p['Portfolio'], p['Investment']), p))
 	  , partial(filter, lambda p: date == p['EXDate'])
 	  , getGenevaDividendReceivable
 	)(date, portfolio)
 
+
+
+@timed('positions')
+def getPositions(date, portfolio):
+	"""
+	[String] date (yyyy-mm-dd), [String] portfolio
+		=> [List] ([Dictionary]) factset positions
+
+	Note: portfolio cannot be 'all', must be a portfolio code.
+	"""
+	logger.debug('getPositions(): date=%s, portfolio=%s', date, portfolio)
+	
+	dividendReceivable = _getDividendIndex(date, portfolio)
+
 	return compose(
 		partial(_checkNavConsistency, date, portfolio)
 	  , list
@@ -500,3 +532,214 @@ def getPositions(date, portfolio):
 
 
 
+def getSecurityInfo(date, portfolio):
+	"""
+	[String] date (yyyy-mm-dd), [String] portfolio
+		=> [List] ([String] security type, [Dictionary] security info)
+
+	One entry for each Geneva investment held by the portfolio.
+	"""
+	return compose(
+		list
+	  , partial( map
+	  		   , lambda p: ( _getAssetClassAndType(p)[1]
+	  		   			   , getSecurityIdAndType()[_getInvestId(p)]
+	  		   			   )
+	  		   )
+	  , lambda d: d.values()
+	  , dict
+	  , partial(map, lambda p: (_getInvestId(p), p))
+	  , getGenevaPositions
+	)(date, portfolio)
+
+
+
+"""
+	Batch (columnar) version of getPositions().
+
+	Positions of a portfolio are turned into columns, fields that only
+	depend on the investment are computed once per investment, FX rates
+	once per currency pair and dividends are joined by key. The other
+	fields are computed column by column. The values are the same as
+	those from _factsetPosition().
+"""
+def _getInvestmentFields(position):
+	"""
+	[Dictionary] geneva position
+		=> [Dictionary] factset position fields that only depend on
+			the investment
+	"""
+	assetClass, assetType = _getAssetClassAndType(position)
+
+	return \
+	{ 'Symbol': _getSecuritySymbol(position)
+	, 'Asset Class': assetClass
+	, 'Asset Type': assetType
+	, 'Price ISO': _getLocalCurrency(position)
+	, 'Per Share Principal': _getPerSharePrincipal(position)
+	, 'Contract Size': _getContractSize(position)
+	, 'Underlying ID': _getUnderlyingId(position)
+	, 'Strategy': _getStrategy(position)
+	}
+
+
+
+def _getFxMatrix(date, portfolio, currencyPairs):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Iterable] ([Tuple]) (currency, target currency)
+		=> [Dictionary] ([Tuple] (currency, target currency) -> [Float] FX rate)
+	"""
+	return { pair: _getFxRate(date, portfolio, pair[0], pair[1])
+			 for pair in set(currencyPairs)}
+
+
+
+def _getPositionColumn(field, positions):
+	"""
+	[String] field, [List] ([Dictionary]) geneva positions => [List] values
+	"""
+	return list(map(itemgetter(field), positions))
+
+
+
+def _getPerShareIncomeColumn(date, portfolio, dividendReceivable, columns):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Dictionary] dividend index, see _getDividendIndex(),
+	[Dictionary] columns (Portfolio Name, Security Name, Shares, Price ISO)
+		=> [List] per share income
+	"""
+	dividends = list(map( dividendReceivable.get
+						, zip(columns['Portfolio Name'], columns['Security Name'])
+						))
+	fx = _getFxMatrix( date, portfolio
+					 , map( lambda t: (t[0]['LocalCurrency'], t[1])
+					 	  , filter( lambda t: t[0] != None
+					 	  		  , zip(dividends, columns['Price ISO']))
+					 	  ))
+
+	return list(map( lambda d, quantity, currency: \
+						0 if d == None else \
+						d['LocalGrossDividendRecPay']/quantity * fx[(d['LocalCurrency'], currency)]
+				   , dividends, columns['Shares'], columns['Price ISO']
+				   ))
+
+
+
+@timed('position columns')
+def getPositionColumns(date, portfolio):
+	"""
+	[String] date (yyyy-mm-dd), [String] portfolio
+		=> [Dictionary] ([String] field -> [List] values), fields in the
+			same order as a factset position
+
+	Note: portfolio cannot be 'all', must be a portfolio code.
+	"""
+	logger.debug('getPositionColumns(): date=%s, portfolio=%s', date, portfolio)
+
+	positions = list(getGenevaPositions(date, portfolio))
+	if any(map(lambda p: p['AccruedInterestBook'] != 0, positions)):
+		logger.error('_getPerShareAccruedInterest(): not supported')
+		raise ValueError
+
+	investIds = _getPositionColumn('InvestID', positions)
+	investmentFields = compose(
+		dict
+	  , partial(map, lambda p: (_getInvestId(p), _getInvestmentFields(p)))
+	  , lambda d: d.values()
+	  , dict
+	  , partial(map, lambda p: (_getInvestId(p), p))
+	)(positions)
+
+	def investmentColumn(field):
+		return list(map(lambda i: investmentFields[i][field], investIds))
+
+
+	isCash = list(map(lambda c: c == 'Cash', investmentColumn('Asset Class')))
+	quantity = _getPositionColumn('Quantity', positions)
+	unitCost = _getPositionColumn('UnitCost', positions)
+	localCurrency = investmentColumn('Price ISO')
+	bookCurrency = _getPositionColumn('BookCurrency', positions)
+	fx = _getFxMatrix(date, portfolio, zip(bookCurrency, localCurrency))
+	portfolioNames = getPortfolioNames()
+
+	columns = \
+	{ 'Portfolio Name': _getPositionColumn('Portfolio', positions)
+	, 'Portfolio Description': list(map( lambda p: portfolioNames[p['Portfolio']]
+									   , positions))
+	, 'Date': list(map( compose(changeDateFormat, _getPositionDate)
+					  , positions))
+	, 'Symbol': investmentColumn('Symbol')
+	, 'Security Name': _getPositionColumn('TaxLotDescription', positions)
+	, 'Asset Class': investmentColumn('Asset Class')
+	, 'Asset Type': investmentColumn('Asset Type')
+	, 'Shares': quantity
+	, 'Price': list(map( lambda cash, price: 1.0 if cash else price
+					   , isCash, _getPositionColumn('MarketPrice', positions)))
+	, 'Price ISO': localCurrency
+	, 'Per Share Accrued Interest': [0] * len(positions)
+	, 'Per Share Principal': investmentColumn('Per Share Principal')
+	, 'Per Share Income': None
+	, 'Total Cost': list(map( lambda cash, q, c: q if cash else q * c
+							, isCash, quantity, unitCost))
+	, 'Contract Size': investmentColumn('Contract Size')
+	, 'Underlying ID': investmentColumn('Underlying ID')
+	, 'Ending Market Value': list(map(
+				lambda cash, q, mv, ai, book, local: \
+					q if cash else (mv + ai) * fx[(book, local)]
+			  , isCash, quantity
+			  , _getPositionColumn('MarketValueBook', positions)
+			  , _getPositionColumn('AccruedInterestBook', positions)
+			  , bookCurrency, localCurrency))
+	, 'Strategy': investmentColumn('Strategy')
+	, 'Average Cumulative Cost': list(map( lambda cash, c: 1.0 if cash else c
+										 , isCash, unitCost))
+	}
+	columns['Per Share Income'] = _getPerShareIncomeColumn(
+		date, portfolio, _getDividendIndex(date, portfolio), columns)
+
+	_checkNavColumns(date, portfolio, columns)
+	return columns
+
+
+
+@timed('nav check')
+def _checkNavColumns(date, portfolio, columns):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Dictionary] position columns
+
+	Same as _checkNavConsistency().
+	"""
+	navCurrency, nav = getGenevaNav(date, portfolio)
+	fx = _getFxMatrix( date, portfolio
+					 , map(lambda c: (c, navCurrency), columns['Price ISO']))
+	s = sum(map( lambda v, c: v * fx[(c, navCurrency)]
+			   , columns['Ending Market Value'], columns['Price ISO']))
+
+	_checkNavSum(date, portfolio, nav, s)
+
+
+
+def columnsToRows(columns):
+	"""
+	[Dictionary] ([String] field -> [List] values)
+		=> [Iterable] ([Dictionary]) rows
+	"""
+	fields = list(columns.keys())
+	return map(lambda values: dict(zip(fields, values)), zip(*columns.values()))
+
+
+
+def getPositionsBatch(date, portfolio):
+	"""
+	[String] date (yyyy-mm-dd), [String] portfolio
+		=> [List] ([Dictionary]) factset positions
+
+	Same as getPositions(), built by getPositionColumns().
+	"""
+	return list(columnsToRows(getPositionColumns(date, portfolio)))
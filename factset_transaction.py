@@ -8,26 +8,28 @@ from geneva_data.security_data import get_geneva_id_from_description \
 							, get_geneva_security_type, get_sedol_code
 from geneva_data.utility import first_of, merge_dict
 from factset.factset_position import changeDateFormat
-from toolz.functoolz import compose
-from functools import partial, reduce
-from itertools import chain, filterfalse
+from toolz.itertoolz import groupby as groupbyToolz
+from functools import lru_cache, reduce
+from itertools import chain
+from operator import itemgetter
+from collections import Counter
 import logging
 logger = logging.getLogger(__name__)
 
 
 
-def _factset_dividend_transaction(position):
+def _factset_in_transaction(security, position):
 	"""
-	[Dictionary] cash ledger dividend position
-		=> [Dictionary] factset dividend transaction
+	([String] symbol, [String] asset class, [String] asset type),
+	[Dictionary] cash ledger dividend or return of capital position
+		=> [Dictionary] factset IN transaction
 	"""
-	invest_id = get_geneva_id_from_description(position['Investment'])
-	asset_class, asset_type = _get_asset_class_type(invest_id)
+	symbol, asset_class, asset_type = security
 
 	return \
 	{ 'Portfolio Code': position['Portfolio']
 	, 'Date': changeDateFormat(position['CashDate'])
-	, 'Symbol': _get_security_symbol(invest_id)
+	, 'Symbol': symbol
 	, 'Asset Class': asset_class
 	, 'Asset Type': asset_type
 	, 'Transaction ID': position['Portfolio'] + '_' + position['TransID']
@@ -45,12 +47,49 @@ def _factset_dividend_transaction(position):
 
 
 
-def _factset_return_of_cap_transaction(position):
+def _merge_cash_ledger_positions(positions):
+	"""
+	[List] ([Dictionary]) cash ledger positions of the same transaction
+		=> [Dictionary] the first position, with the local amount of all
+	"""
+	if len(positions) == 1:
+		return positions[0]
+
+	return merge_dict( positions[0]
+					 , {'LocalAmount': sum(map(itemgetter('LocalAmount'), positions))})
+
+
+
+def _factset_dividend_transactions(positions):
 	"""
-	[Dictionary] cash ledger return of cap position
-		=> [Dictionary] factset transaction
+	[List] ([Dictionary]) cash ledger dividend or return of cap positions
+		=> [List] ([Dictionary]) factset IN transactions
+
+	A dividend may be paid in several cash ledger lines of the same
+	TransID, they make one transaction. The security of each investment
+	is looked up once. Transactions of securities other than equities
+	are skipped and counted, see get_unsupported_securities().
 	"""
-	return _factset_dividend_transaction(position)
+	merged = list(map( _merge_cash_ledger_positions
+					 , groupbyToolz( lambda p: (p['Portfolio'], p['TransID'])
+					 			   , positions).values()))
+	securities = { description: _get_security_info(description) \
+					for description in set(map(itemgetter('Investment'), merged))}
+
+	def supported(p):
+		if securities[p['Investment']] != None:
+			return True
+
+		key = (p['TranDescription'], p['Investment'])
+		if _unsupported_security_counts[key] == 0:
+			logger.warning('_factset_dividend_transactions(): {0}: {1} not supported'.format(
+							p['TranDescription'], p['Investment']))
+		_unsupported_security_counts[key] += 1
+		return False
+
+
+	return list(map( lambda p: _factset_in_transaction(securities[p['Investment']], p)
+				   , filter(supported, merged)))
 
 
 
@@ -128,55 +167,158 @@ def _factset_spot_fx_transaction(position):
 
 
 
-def _get_transactions_from_purchase_sales(date, portfolio):
+"""
+	[String] report ('purchase sales', 'cash ledger')
+		=> [String] field of the transaction type
+"""
+_TRANSACTION_TYPE_FIELDS = \
+{ 'purchase sales': 'TranType'
+, 'cash ledger': 'TranDescription'
+}
+
+
+
+"""
+	[String] report
+		=> [Dictionary] ([String] transaction type
+						-> [Function] ([List] positions -> [List] transactions),
+						   or None if the type is skipped)
+
+	Filled by register_transaction_handler() at import.
+"""
+_transaction_handlers = {report: {} for report in _TRANSACTION_TYPE_FIELDS}
+
+
+
+"""
+	([String] report, [String] transaction type) -> [Int] number of
+	positions of a type with no handler, they are skipped.
+"""
+_unknown_type_counts = Counter()
+
+
+
+def register_transaction_handler(report, tran_types, handler, bulk=False):
 	"""
-	[String] date (yyyy-mm-dd), [String] portfolio
+	[String] report ('purchase sales', 'cash ledger'),
+	[Iterable] ([String]) transaction types,
+	[Function] handler, None to skip the types,
+	[Bool] the handler takes all positions of a type at once
+		([List] positions -> [Iterable] transactions), otherwise one
+		position at a time (position -> transaction)
+
+	Side effect: positions of the types in the report are handled by
+	the handler, replacing any handler before.
+	"""
+	bulk_handler = handler if bulk or handler == None \
+					else lambda positions: list(map(handler, positions))
+	for tran_type in tran_types:
+		_transaction_handlers[report][tran_type] = bulk_handler
+
+
+
+"""
+	([String] transaction type, [String] investment description)
+		-> [Int] number of dividend or return of capital transactions
+	skipped, because the security is not an equity.
+"""
+_unsupported_security_counts = Counter()
+
+
+
+def get_unknown_transaction_types():
+	"""
+	=> [Dictionary] (([String] report, [String] transaction type)
+						-> [Int] positions skipped)
+	"""
+	return dict(_unknown_type_counts)
+
+
+
+def get_unsupported_securities():
+	"""
+	=> [Dictionary] (([String] transaction type, [String] investment)
+						-> [Int] transactions skipped)
+	"""
+	return dict(_unsupported_security_counts)
+
+
+
+def reset_unknown_transaction_types():
+	"""
+	Side effect: the counts of unknown transaction types and unsupported
+	securities are cleared, so each is warned about again when next
+	seen. Long running processes call this when they start over with
+	new report files.
+	"""
+	_unknown_type_counts.clear()
+	_unsupported_security_counts.clear()
+
+
+
+def _dispatch_transactions(report, positions):
+	"""
+	[String] report, [Iterable] ([Dictionary]) positions
 		=> [Iterable] ([Dictionary]) factset transactions
+
+	Positions are grouped by transaction type in one pass, then each
+	group goes to its handler. Transactions come in the order of the
+	types as first seen.
 	"""
-	return compose(
-		partial(map, lambda t: t[0](t[1]))
-	  , partial( map
-	  		   , lambda p: ( _get_purchase_sales_transaction_handler_map()[p['TranType']]
-	  		   			   , p
-	  		   			   )
-	  		   )
-	  , get_geneva_purchase_sales
-	)(date, portfolio)
+	handlers = _transaction_handlers[report]
 
+	def handle(t):
+		tran_type, group = t
+		if not tran_type in handlers:
+			if _unknown_type_counts[(report, tran_type)] == 0:
+				logger.warning('_dispatch_transactions(): {0}: {1} not supported'.format(
+								report, tran_type))
+			_unknown_type_counts[(report, tran_type)] += len(group)
+			return []
 
+		return [] if handlers[tran_type] == None else handlers[tran_type](group)
+	# End of handle()
 
-def _get_purchase_sales_transaction_handler_map():
-	return \
-	{ 'SpotFX': _factset_spot_fx_transaction
-	, 'Buy': _factset_buysell_transaction
-	, 'Sell': _factset_buysell_transaction
-	}
+	return chain.from_iterable(map(
+		handle
+	  , groupbyToolz(itemgetter(_TRANSACTION_TYPE_FIELDS[report]), positions).items()
+	))
 
 
 
-def _get_transactions_from_cash_ledger(date, portfolio):
+register_transaction_handler( 'purchase sales', ('Buy', 'Sell')
+							, _factset_buysell_transaction)
+register_transaction_handler( 'purchase sales', ('SpotFX', )
+							, _factset_spot_fx_transaction)
+
+register_transaction_handler( 'cash ledger', ('Dividend', 'ReturnOfCap')
+							, _factset_dividend_transactions, bulk=True)
+
+# Buy, Sell and SpotFX come from the purchase sales report
+register_transaction_handler( 'cash ledger'
+							, ( 'Buy', 'Sell', 'SpotFX', 'AccountingRelated'
+							  , 'GrossAmountDividend')
+							, None)
+
+
+
+def _get_transactions_from_purchase_sales(date, portfolio):
 	"""
 	[String] date (yyyy-mm-dd), [String] portfolio
 		=> [Iterable] ([Dictionary]) factset transactions
 	"""
-	funcMap = \
-		{ 
-		}
+	return _dispatch_transactions( 'purchase sales'
+								 , get_geneva_purchase_sales(date, portfolio))
 
-	ignored_types = ( 'AccountingRelated', 'ReturnOfCap', 'GrossAmountDividend'
-					, 'Dividend'
-					)
 
-	return compose(
-		partial(map, lambda t: t[0](t[1]))
-	  , partial(map, lambda p: (funcMap[p['TranDescription']], p))
-	  , partial(filterfalse, lambda p: p['TranDescription'] in ignored_types)
-	  , partial( filterfalse
-	  		   , lambda p: p['TranDescription'] in \
-	  		   				_get_purchase_sales_transaction_handler_map()
-	  		   )
-	  , get_geneva_cash_ledger
-	)(date, portfolio)
+
+def _get_transactions_from_cash_ledger(date, portfolio):
+	"""
+	[String] date (yyyy-mm-dd), [String] portfolio
+		=> [Iterable] ([Dictionary]) factset transactions
+	"""
+	return _dispatch_transactions( 'cash ledger'
+								 , get_geneva_cash_ledger(date, portfolio))
 
 
 
@@ -222,19 +364,54 @@ def _get_asset_class_type(gid):
 
 
 
+def _get_security_info(description):
+	"""
+	[String] investment description
+		=> ([String] symbol, [String] asset class, [String] asset type),
+			or None if the security is not an equity (no symbol)
+	"""
+	invest_id = get_geneva_id_from_description(description)
+	asset_class, asset_type = _get_asset_class_type(invest_id)
+	if asset_class != 'Equity':
+		return None
+
+	return (_get_security_symbol(invest_id), asset_class, asset_type)
+
+
+
+"""
+	[String] lower case prefix of a currency description
+		=> [String] currency code
+"""
+_CURRENCY_PREFIXES = \
+{ 'chinese renminbi yuan hk': 'CNH'
+, 'chinese renminbi yuan': 'CNY'
+, 'euro': 'EUR'
+, 'hong kong dollar': 'HKD'
+, 'macau dollar': 'MOP'
+, 'singapore dollar': 'SGD'
+, 'united states dollar': 'USD'
+}
+
+
+
+"""
+	Prefixes longest first, so that 'Chinese Renminbi Yuan HK' does not
+	match 'chinese renminbi yuan'.
+"""
+_CURRENCY_PREFIX_ORDER = tuple(sorted(_CURRENCY_PREFIXES, key=len, reverse=True))
+
+
+
+@lru_cache(maxsize=None)
 def _get_currency_from_description(description):
 	"""
 	[String] currency description => [String] currency code
 	"""
-	c_map = \
-	{ 'chinese renminbi yuan': 'CNY'
-	, 'hong kong dollar': 'HKD'
-	, 'united states dollar': 'USD'
-	}
-
-	key = first_of(lambda k: description.lower().startswith(k), c_map)
+	lower = description.lower()
+	key = first_of(lambda k: lower.startswith(k), _CURRENCY_PREFIX_ORDER)
 	if key != None:
-		return c_map[key]
+		return _CURRENCY_PREFIXES[key]
 	else:
 		raise ValueError('_get_currency_from_description(): not supported {0}'.format(
 						description))
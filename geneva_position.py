@@ -5,15 +5,38 @@
 from geneva.report import groupMultipartReportLines, txtReportToLines \
 						, readTxtReportFromLines, updatePositionWithFunctionMap
 from steven_utils.utility import mergeDict, allEquals
+from factset.instrument import timed, timedIterable, isEnabled
+from factset.utility import isSampledDebugRow
+from factset.compression import getCompression, openInput
+from factset.report_cache import isReportCacheFile, readReportCache
 from toolz.functoolz import compose
 from toolz.itertoolz import groupby as groupbyToolz
 from toolz.dicttoolz import valmap
 from functools import partial
-from itertools import chain, filterfalse
+from itertools import chain, filterfalse, count
 from datetime import datetime
 from os.path import join
-import logging, re
+import logging, re, sys
 logger = logging.getLogger(__name__)
+_strangeDateCounter = count()
+
+
+
+"""
+	Fields with a few distinct values repeated over many rows. Their
+	values are interned when a report is read, so equal values are one
+	object: less memory, and comparing with an interned constant (below)
+	is an identity check.
+"""
+_CATEGORICAL_FIELDS = \
+( 'SortByDescription', 'ThenByDescription', 'TranDescription', 'TranType'
+, 'Currency', 'LocalCurrency', 'Currency_OpeningBalDesc', 'Currency_ClosingBalDesc'
+, 'GroupWithinCurrency_OpeningBalDesc', 'GroupWithinCurrency_ClosingBalDesc'
+, 'LocalAccountingName', 'CustodianAccount', 'GenericInvestment', 'Broker', 'Trader'
+, 'Investment'
+)
+
+_CASH_AND_EQUIVALENTS = sys.intern('Cash and Equivalents')
 
 
 
@@ -44,7 +67,8 @@ def _updateDate(s):
 	try:
 		return datetime.strptime(s, '%m/%d/%Y').strftime('%Y-%m-%d')
 	except:
-		logger.debug('_updateDate strange date:{0}#'.format(s))
+		if isSampledDebugRow(logger, _strangeDateCounter):
+			logger.debug('_updateDate strange date:%s#', s)
 		return ''
 
 
@@ -95,7 +119,7 @@ def _isOTCType(assetType):
 
 
 def _isCash(assetType):
-	return assetType == 'Cash and Equivalents'
+	return assetType == _CASH_AND_EQUIVALENTS
 
 
 
@@ -113,12 +137,30 @@ def _addMetaDataToPosition(fields, positions, metaData):
 	"""
 	[Iterable] positions, [Dictionary] metaData
 		=> [Iterable] positions
+
+	The meta data values are interned, categorical fields of the
+	positions too.
 	"""
-	data = {key: metaData.get(key, '') for key in fields}
-	return map(lambda p: mergeDict(p, data), positions)
+	data = {key: sys.intern(metaData.get(key, '')) for key in fields}
+	return map(lambda p: _internFields(_CATEGORICAL_FIELDS, mergeDict(p, data)), positions)
 
 
 
+def _internFields(fields, p):
+	"""
+	[Tuple] ([String]) fields, [Dictionary] p => [Dictionary] p
+
+	String values of the fields are interned, p is updated in place.
+	"""
+	for key in fields:
+		if type(p.get(key)) == str:
+			p[key] = sys.intern(p[key])
+
+	return p
+
+
+
+@timed('consolidation')
 def _consolidateTaxlotPositions(positions):
 	"""
 	[Iterable] positions => [Iterable] positions
@@ -188,8 +230,7 @@ def _readTaxlotReportFromLines(lines):
 	positions updated, meta data unchanged.
 	"""
 	def lognContinue(positions, metaData):
-		logger.debug('_readTaxlotReportFromLines(): Portfolio {0}'.format(
-						metaData['Portfolio']))
+		logger.debug('_readTaxlotReportFromLines(): Portfolio %s', metaData['Portfolio'])
 		return positions, metaData
 
 
@@ -211,6 +252,7 @@ def _readTaxlotReportFromLines(lines):
 	return \
 	compose(
 		_consolidateTaxlotPositions
+	  , partial(timedIterable, 'tax lot field conversion')
 	  , partial(map, addInvestId)
 	  , partial( map
 			   , partial( updateNumberForFields
@@ -236,8 +278,8 @@ def _readCashLedgerReportFromLines(lines):
 	[Iterable] ([List]) lines => [Iterable] ([Dictionary]) positions
 	"""
 	def lognContinue(positions, metaData):
-		logger.debug('_readCashLedgerReportFromLines(): Portfolio {0}'.format(
-						metaData.get('Portfolio', '')))
+		logger.debug( '_readCashLedgerReportFromLines(): Portfolio %s'
+					, metaData.get('Portfolio', ''))
 		return positions, metaData
 
 
@@ -272,8 +314,8 @@ def _readDividendReceivableReportFromLines(lines):
 	[Iterable] ([List]) lines => [Iterable] ([Dictionary]) positions
 	"""
 	def lognContinue(positions, metaData):
-		logger.debug('_readDividendReceivableReportFromLines(): Portfolio {0}'.format(
-						metaData.get('Portfolio', '')))
+		logger.debug( '_readDividendReceivableReportFromLines(): Portfolio %s'
+					, metaData.get('Portfolio', ''))
 		return positions, metaData
 
 
@@ -365,8 +407,8 @@ def _readNavReportFromLines(lines):
 	[Iterable] ([List]) lines => [Iterable] ([Dictionary] NAV)
 	"""
 	def lognContinue(positions, metaData):
-		logger.debug('_readNavReportFromLines(): Portfolio {0}'.format(
-					metaData.get('Portfolio', '')))
+		logger.debug( '_readNavReportFromLines(): Portfolio %s'
+					, metaData.get('Portfolio', ''))
 		return positions, metaData
 
 
@@ -396,8 +438,8 @@ def _readPurchaseSalesReportFromLines(lines):
 	[Iterable] ([List]) lines => [Iterable] ([Dictionary] NAV)
 	"""
 	def lognContinue(positions, metaData):
-		logger.debug('_readPurchaseSalesReportFromLines(): Portfolio {0}'.format(
-					metaData.get('Portfolio', '')))
+		logger.debug( '_readPurchaseSalesReportFromLines(): Portfolio %s'
+					, metaData.get('Portfolio', ''))
 		return positions, metaData
 
 
@@ -427,26 +469,74 @@ def _readPurchaseSalesReportFromLines(lines):
 
 
 
+def _txtReportToLines(encoding, delimiter, file):
+	"""
+	[String] encoding, [String] delimiter, [String] filename
+		=> [Iterable] ([List]) lines
+
+	txtReportToLines() for plain files. A compressed file (.gz, .zst) is
+	decompressed as it is read, each line split on the delimiter with
+	quotes kept, the same as txtReportToLines().
+	"""
+	if getCompression(file) == '':
+		return txtReportToLines(encoding, delimiter, file)
+
+	def lines():
+		with openInput(file, encoding) as f:
+			for line in f:
+				yield line.rstrip('\r\n').split(delimiter)
+
+
+	return lines()
+
+
+
 def _readMultipartReport(mappingFunc, encoding, delimiter, file):
 	"""
 	[Func] ([Iterable] ([List]) lines => [Iterable] ([Dictionary] positions)),
 	[String] encoding, 
 	[String] delimiter, 
-	[String] filename 
+	[String] filename, may be compressed (.gz, .zst) or a report cache
 		=> [Iterable] ([Dictionary] position)
 
 	Read a multipart report (txt format), enrich it with meta data, 
 	and return all positions.
+
+	A report cache (see report_cache.py) has the positions already, it
+	is read as it is.
+
+	Sections are only materialized (to time them) when instrumentation
+	is enabled, otherwise the positions are as lazy as the mapping
+	function makes them.
 	"""
+	if isReportCacheFile(file):
+		return readReportCache(mappingFunc.__name__, file)
+
 	return compose(
 		chain.from_iterable
-	  , partial(map, mappingFunc)
+	  , partial(map, partial(_convertSection, mappingFunc) if isEnabled() else mappingFunc)
+	  , partial(timedIterable, 'multipart grouping')
 	  , groupMultipartReportLines
-	  , txtReportToLines
+	  , partial(timedIterable, 'utf-16 decode')
+	  , _txtReportToLines
 	)(encoding, delimiter, file)
 
 
 
+@timed('section conversion')
+def _convertSection(mappingFunc, lines):
+	"""
+	[Func] ([Iterable] ([List]) lines => [Iterable] ([Dictionary] positions)),
+	[List] ([List]) lines of one section
+		=> [List] ([Dictionary] positions)
+
+	Only used when instrumentation is enabled. The section is converted
+	as a whole, so that its time is recorded.
+	"""
+	return list(mappingFunc(lines))
+
+
+
 """
 	[String] encoding, [String] delimiter, [String] filename, 
 		=> [Iterable] ([Dictionary] position)
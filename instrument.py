@@ -0,0 +1,177 @@
+# coding=utf-8
+#
+# Lightweight per-stage instrumentation: wall time, row counts and
+# cache hits.
+#
+# Enabled by the environment variable FACTSET_STATS=1. When disabled
+# (the default), the decorators return the function unchanged and
+# timedIterable() returns the iterable unchanged, so there is no cost
+# per row.
+#
+# Stages nest (for example decode happens inside multipart grouping),
+# 'seconds' is inclusive of nested stages and 'selfSeconds' is not,
+# so 'selfSeconds' of all stages add up to the instrumented time.
+#
+from functools import wraps
+from time import perf_counter
+from os import environ
+import json, threading
+
+
+
+_enabled = environ.get('FACTSET_STATS', '') not in ('', '0')
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_caches = {}
+
+
+
+def isEnabled():
+	return _enabled
+
+
+
+def _getStack():
+	if not hasattr(_local, 'stack'):
+		_local.stack = []
+
+	return _local.stack
+
+
+
+def _enter(name):
+	_getStack().append([name, perf_counter(), 0.0])
+
+
+
+def _exit(calls, rows):
+	"""
+	[Int] number of calls, [Int] number of rows
+
+	Close the innermost stage and add its time to the stats.
+	"""
+	stack = _getStack()
+	name, start, childSeconds = stack.pop()
+	elapsed = perf_counter() - start
+	if stack:
+		stack[-1][2] = stack[-1][2] + elapsed
+
+	with _lock:
+		s = _stats.setdefault(name, {'calls': 0, 'rows': 0, 'seconds': 0.0, 'selfSeconds': 0.0})
+		s['calls'] = s['calls'] + calls
+		s['rows'] = s['rows'] + rows
+		s['seconds'] = s['seconds'] + elapsed
+		s['selfSeconds'] = s['selfSeconds'] + elapsed - childSeconds
+
+
+
+def timed(name):
+	"""
+	[String] stage name => [Function] decorator
+
+	Record the time of each call. If the function returns a list,
+	its length is counted as rows.
+	"""
+	def decorator(func):
+		if not _enabled:
+			return func
+
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			_enter(name)
+			result = None
+			try:
+				result = func(*args, **kwargs)
+				return result
+			finally:
+				_exit(1, len(result) if isinstance(result, list) else 0)
+
+		return wrapper
+	# End of decorator()
+
+	return decorator
+
+
+
+def _timedIterator(name, iterable):
+	"""
+	Time spent in each next() goes to the stage, each item is a row.
+	"""
+	it = iter(iterable)
+	calls = 1
+	while True:
+		_enter(name)
+		try:
+			x = next(it)
+		except StopIteration:
+			_exit(calls, 0)
+			return
+		except BaseException:
+			_exit(calls, 0)
+			raise
+
+		_exit(calls, 1)
+		calls = 0
+		yield x
+
+
+
+def timedIterable(name, iterable):
+	"""
+	[String] stage name, [Iterable] iterable => [Iterable]
+
+	For lazy pipelines, where the work happens when items are pulled.
+	"""
+	return _timedIterator(name, iterable) if _enabled else iterable
+
+
+
+def registerCache(name, func):
+	"""
+	[String] cache name, [Function] lru_cache wrapped function
+		=> [Function] the same function
+
+	Its cache hits and misses are included in the summary.
+	"""
+	if _enabled:
+		_caches[name] = func
+
+	return func
+
+
+
+def summary():
+	"""
+	=> [Dictionary] stats of all stages and caches
+	"""
+	with _lock:
+		stages = {name: dict(s) for name, s in _stats.items()}
+
+	return \
+	{ 'stages': stages
+	, 'caches': { name: func.cache_info()._asdict()
+				  for name, func in _caches.items()}
+	}
+
+
+
+def writeSummary(file):
+	"""
+	[String] file => [String] file
+
+	Side effect: write the summary as json.
+	"""
+	with open(file, 'w', encoding='utf-8') as f:
+		json.dump(summary(), f, indent=2)
+
+	return file
+
+
+
+def reset():
+	"""
+	Side effect: clear all stats.
+	"""
+	with _lock:
+		_stats.clear()
@@ -0,0 +1,598 @@
+# coding=utf-8
+#
+# Output formats for the worker.
+#
+# Data is written from columns ([String] field -> [List] values), the
+# column order comes from the csv header tuples in worker.py. Besides
+# csv, Parquet is supported when pyarrow is installed, so downstream
+# analytics can reload a month of files without parsing text.
+#
+# In Parquet, the schema is fixed by the header tuple: the numeric
+# fields below are float64 ('' and 'NA' in them become nulls), other
+# fields are string. So files of different days always have the same
+# column types, even if a day has only '' in a numeric column, and a
+# month of them can be read together.
+#
+# A csv file whose name ends with .gz or .zst is compressed as it is
+# written, see compression.py.
+#
+# Files are published atomically: they are written to a hidden temp
+# file in the same directory, fsync'ed, then renamed, so the uploader
+# never sees a half written file. After a run, a manifest of the date
+# (manifest_yyyymmdd.json) lists the output files with row counts and
+# sha256. Every run of the date updates it after its own files are
+# written, so it lists the files complete so far, not necessarily all
+# portfolios of the date: a consumer waits until the files it expects
+# are listed. pipeline.py writes all portfolios of a date in one run,
+# so there the manifest appears once, when everything is written.
+#
+# For fewer, larger uploads, the rows of all portfolios of a date can
+# go into one csv file, with an index file giving the byte range of
+# each portfolio, so one portfolio can be read without a scan.
+#
+from factset.utility import getFloatFormat
+from factset.compression import getCompression, compressWriter, openInput
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import islice
+from operator import itemgetter
+from os import chmod, fsync, remove, replace
+from os.path import basename, dirname, exists, join, splitext
+from tempfile import mkstemp
+from datetime import datetime
+from time import sleep, perf_counter
+import csv, hashlib, io, json, locale, logging, os
+logger = logging.getLogger(__name__)
+
+try:
+	import pyarrow, pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+
+
+def rowsToColumns(headers, rows):
+	"""
+	[Tuple] headers, [Iterable] ([Dictionary]) rows
+		=> [Dictionary] ([String] field -> [List] values)
+	"""
+	rows = list(rows)
+	return {h: list(map(lambda r: r[h], rows)) for h in headers}
+
+
+
+@lru_cache(maxsize=32)
+def makeRowSerializer(headers, floatFormat=None):
+	"""
+	[Tuple] headers, [String] float format spec (e.g. '.6f') or None
+		=> [Function] ([Dictionary] row -> [Tuple] values)
+
+	Built once per header tuple. Without a float format, values are
+	taken as they are and csv.writer formats floats with repr, same as
+	before.
+	"""
+	getter = itemgetter(*headers) if len(headers) > 1 \
+				else lambda row: (row[headers[0]], )
+	if floatFormat == None:
+		return getter
+
+	def formatValue(x):
+		return format(x, floatFormat) if type(x) == float else x
+
+
+	return lambda row: tuple(map(formatValue, getter(row)))
+
+
+
+@contextmanager
+def openAtomic(file, mode='w', **kwargs):
+	"""
+	[String] file, [String] mode, keyword arguments of open()
+		=> [File] a temp file in the directory of the file
+
+	On normal exit the temp file is fsync'ed and renamed to the file,
+	replacing any old one. On error the temp file is removed and the
+	file is not touched.
+	"""
+	fd, temp = mkstemp( prefix='.' + basename(file) + '.', suffix='.tmp'
+					  , dir=dirname(file) or '.')
+	try:
+		with open(fd, mode, **kwargs) as f:
+			yield f
+			f.flush()
+			fsync(f.fileno())
+
+		chmod(temp, 0o644)	# mkstemp() gives 0600
+		replace(temp, file)
+	except BaseException:
+		if exists(temp):
+			remove(temp)
+		raise
+
+
+
+def writeRows(file, headers, rows, floatFormat=None, chunkSize=10000):
+	"""
+	[String] file,
+	[Tuple] headers,
+	[Iterable] ([Tuple]) rows, values in the order of the headers,
+	[String] float format spec or None,
+	[Int] rows per writerows() call
+		=> [String] file
+
+	Side effect: write a csv file with the headers as the first row,
+	the file appears only when complete.
+	"""
+	formatRow = makeRowSerializer(tuple(range(len(headers))), floatFormat) \
+				if floatFormat != None else None
+	with _openCsvAtomic(file) as f:
+		writer = csv.writer(f)
+		writer.writerow(headers)
+		_writeChunks(writer, rows if formatRow == None else map(formatRow, rows), chunkSize)
+
+	return file
+
+
+
+@contextmanager
+def _openCsvAtomic(file):
+	"""
+	[String] csv file => [File] text file for csv.writer
+
+	See openAtomic(), compressed by the file name suffix.
+	"""
+	compression = getCompression(file)
+	if compression == '':
+		with openAtomic(file, 'w', newline='') as f:
+			yield f
+	else:
+		with openAtomic(file, 'wb') as f:
+			text = io.TextIOWrapper( compressWriter(f, compression)
+								   , encoding=locale.getpreferredencoding(False), newline='')
+			yield text
+			text.close()	# ends the compressed stream, f stays open
+
+
+
+def _writeChunks(writer, rows, chunkSize):
+	"""
+	[csv.writer] writer, [Iterable] ([Tuple]) rows, [Int] chunk size
+		=> [Int] number of rows written
+	"""
+	rows, n = iter(rows), 0
+	chunk = list(islice(rows, chunkSize))
+	while chunk:
+		writer.writerows(chunk)
+		n = n + len(chunk)
+		chunk = list(islice(rows, chunkSize))
+
+	return n
+
+
+
+def writeDicts(file, headers, rows, floatFormat=None):
+	"""
+	[String] file,
+	[Tuple] headers,
+	[Iterable] ([Dictionary]) rows,
+	[String] float format spec, None means the configured one
+		=> [String] file
+	"""
+	floatFormat = getFloatFormat() if floatFormat == None else floatFormat
+	return writeRows( file, headers
+					, map(makeRowSerializer(tuple(headers), floatFormat), rows)
+					)
+
+
+
+def getIndexFile(file):
+	"""
+	[String] consolidated csv file => [String] its index file
+	"""
+	return splitext(file)[0] + '.index.json'
+
+
+
+def writeConsolidated(file, headers, partitions, floatFormat=None, chunkSize=10000):
+	"""
+	[String] file,
+	[Tuple] headers,
+	[Iterable] ([Tuple]) ([String] portfolio, [Iterable] ([Dictionary]) rows),
+	[String] float format spec, None means the configured one,
+	[Int] rows per writerows() call
+		=> [String] file
+
+	Side effect: write one csv file with the rows of all portfolios, one
+	portfolio after another in the order given, then its index file
+	(see getIndexFile()), which has the byte offset, length and number
+	of rows of each portfolio and of the header line.
+
+	Rows are streamed, a portfolio's rows are not kept after written.
+	The file cannot be compressed, the offsets are of the plain file.
+	"""
+	if getCompression(file) != '':
+		logger.error('writeConsolidated(): {0} cannot be compressed'.format(file))
+		raise ValueError
+
+	floatFormat = getFloatFormat() if floatFormat == None else floatFormat
+	serialize = makeRowSerializer(tuple(headers), floatFormat)
+	portfolios = {}
+	with openAtomic(file, 'wb') as f:
+		text = io.TextIOWrapper( f, encoding=locale.getpreferredencoding(False)
+							   , newline='', write_through=True)
+		writer = csv.writer(text)
+		writer.writerow(headers)
+		header = {'offset': 0, 'length': f.tell()}
+		for portfolio, rows in partitions:
+			offset = f.tell()
+			n = _writeChunks(writer, map(serialize, rows), chunkSize)
+			portfolios[portfolio] = {'offset': offset, 'length': f.tell() - offset, 'rows': n}
+
+		text.detach()	# leave f open for openAtomic()
+
+	with openAtomic(getIndexFile(file), 'w', encoding='utf-8') as f:
+		json.dump( {'file': basename(file), 'header': header, 'portfolios': portfolios}
+				 , f, indent=1)
+
+	return file
+
+
+
+def readPortfolioBytes(file, portfolio):
+	"""
+	[String] consolidated csv file, [String] portfolio
+		=> [Bytes] the header line and the rows of the portfolio, the same
+			as a csv file of the portfolio alone
+
+	Only the index and the two byte ranges are read.
+	"""
+	with open(getIndexFile(file), 'r', encoding='utf-8') as f:
+		index = json.load(f)
+
+	if not portfolio in index['portfolios']:
+		logger.error('readPortfolioBytes(): {0} not in {1}'.format(portfolio, file))
+		raise ValueError
+
+	def readRange(f, entry):
+		f.seek(entry['offset'])
+		return f.read(entry['length'])
+
+
+	with open(file, 'rb') as f:
+		return readRange(f, index['header']) + readRange(f, index['portfolios'][portfolio])
+
+
+
+def extractPortfolio(file, portfolio):
+	"""
+	[String] consolidated csv file, [String] portfolio
+		=> [List] ([Dictionary]) rows of the portfolio, values are strings
+	"""
+	return list(csv.DictReader(io.StringIO(
+		readPortfolioBytes(file, portfolio).decode(locale.getpreferredencoding(False))
+	  , newline='')))
+
+
+
+"""
+	Numeric fields of the FactSet position, FactSet transaction, cash
+	ledger and FX table outputs.
+"""
+_NUMERIC_FIELDS = frozenset(
+[ 'Shares', 'Price', 'Per Share Accrued Interest', 'Per Share Principal'
+, 'Per Share Income', 'Total Cost', 'Contract Size', 'Ending Market Value'
+, 'Average Cumulative Cost'
+, 'Quantity', 'Gross Transaction Amount', 'Net Transaction Amount'
+, 'Commissions and Fees'
+, 'CurrBegBalLocal', 'CurrBegBalBook', 'GroupWithinCurrencyBegBalLoc'
+, 'GroupWithinCurrencyBegBalBook', 'LocalAmount', 'LocalBalance', 'BookAmount'
+, 'BookBalance', 'GroupWithinCurrencyClosingBalLoc', 'GroupWithinCurrencyClosingBalBook'
+, 'CurrClosingBalLocal', 'CurrClosingBalBook'
+, 'ExchangeRate'
+])
+
+
+
+def _isNumber(x):
+	return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+
+@lru_cache(maxsize=32)
+def getArrowSchema(headers):
+	"""
+	[Tuple] headers => [pyarrow.Schema]
+
+	Numeric fields are float64, others string.
+	"""
+	_checkPyarrow()
+	return pyarrow.schema(list(map(
+		lambda h: (h, pyarrow.float64() if h in _NUMERIC_FIELDS else pyarrow.string())
+	  , headers)))
+
+
+
+def _toFloat(field, x):
+	"""
+	[String] field, value => [Float] value, or None for '', 'NA' or None
+	"""
+	if _isNumber(x):
+		return float(x)
+	elif x in ('', 'NA', None):
+		return None
+	else:
+		logger.error('_toFloat(): {0}: {1} is not a number'.format(field, x))
+		raise ValueError
+
+
+
+def _toArrowColumn(field, values):
+	"""
+	[pyarrow.Field] field of the schema, [List] values => [pyarrow.Array]
+	"""
+	if field.type == pyarrow.float64():
+		return pyarrow.array( list(map(partial(_toFloat, field.name), values))
+							, type=pyarrow.float64())
+	else:
+		return pyarrow.array( list(map(lambda x: None if x == None else str(x), values))
+							, type=pyarrow.string())
+
+
+
+def toArrowTable(headers, columns):
+	"""
+	[Tuple] headers, [Dictionary] columns => [pyarrow.Table]
+
+	The table has the schema of the headers, see getArrowSchema().
+	"""
+	schema = getArrowSchema(tuple(headers))
+	return pyarrow.Table.from_arrays( list(map(lambda f: _toArrowColumn(f, columns[f.name]), schema))
+									, schema=schema)
+
+
+
+def _checkPyarrow():
+	if pyarrow == None:
+		logger.error('_checkPyarrow(): pyarrow is not installed')
+		raise ValueError
+
+
+
+def _writeCsvColumns(file, headers, columns):
+	"""
+	[String] file, [Tuple] headers, [Dictionary] columns => [String] file
+	"""
+	return writeRows( file, headers, zip(*map(lambda h: columns[h], headers))
+					, getFloatFormat())
+
+
+
+def _writeParquetColumns(file, headers, columns):
+	"""
+	[String] file, [Tuple] headers, [Dictionary] columns => [String] file
+	"""
+	table = toArrowTable(headers, columns)
+	with openAtomic(file, 'wb') as f:
+		pyarrow.parquet.write_table(table, f)
+
+	return file
+
+
+
+"""
+	[String] format => ([Function] writer, [String] file extension)
+"""
+_FORMATS = \
+{ 'csv': (_writeCsvColumns, '.csv')
+, 'parquet': (_writeParquetColumns, '.parquet')
+}
+
+
+
+def getFormats():
+	"""
+	=> [List] ([String]) supported output formats
+	"""
+	return list(_FORMATS)
+
+
+
+def getExtension(outputFormat):
+	"""
+	[String] format => [String] file extension
+	"""
+	return _getFormat(outputFormat)[1]
+
+
+
+def _getFormat(outputFormat):
+	try:
+		return _FORMATS[outputFormat]
+	except KeyError:
+		logger.error('_getFormat(): {0} not supported'.format(outputFormat))
+		raise ValueError
+
+
+
+def writeColumns(outputFormat, file, headers, columns):
+	"""
+	[String] format ('csv' or 'parquet'),
+	[String] file,
+	[Tuple] headers,
+	[Dictionary] columns
+		=> [String] file
+	"""
+	return _getFormat(outputFormat)[0](file, headers, columns)
+
+
+
+def readTable(files):
+	"""
+	[Iterable] ([String]) parquet files => [pyarrow.Table]
+
+	The files are put one after another, for example a month of
+	position files of a portfolio.
+	"""
+	_checkPyarrow()
+	return pyarrow.concat_tables(
+		map(pyarrow.parquet.read_table, files)
+	  , promote_options='permissive'
+	)
+
+
+
+def readColumns(files):
+	"""
+	[Iterable] ([String]) parquet files
+		=> [Dictionary] ([String] field -> [List] values)
+	"""
+	return readTable(files).to_pydict()
+
+
+
+def _countRows(file):
+	"""
+	[String] output file, csv may be compressed => [Int] number of data rows
+	"""
+	if file.endswith('.parquet'):
+		_checkPyarrow()
+		return pyarrow.parquet.ParquetFile(file).metadata.num_rows
+
+	with openInput(file, locale.getpreferredencoding(False), newline='') as f:
+		return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+
+def describeFile(file, blockSize=1 << 20):
+	"""
+	[String] output file
+		=> [Dictionary] 'rows', 'bytes' and 'sha256' of the file
+	"""
+	h, size = hashlib.sha256(), 0
+	with open(file, 'rb') as f:
+		for block in iter(partial(f.read, blockSize), b''):
+			h.update(block)
+			size = size + len(block)
+
+	return {'rows': _countRows(file), 'bytes': size, 'sha256': h.hexdigest()}
+
+
+
+def getManifestFile(outputDir, date):
+	"""
+	[String] output directory, [String] date (yyyy-mm-dd)
+		=> [String] manifest file of the date
+	"""
+	return join(outputDir, 'manifest_' + date.replace('-', '') + '.json')
+
+
+
+def _isStaleLock(lock, maxAge):
+	"""
+	[String] lock file, [Float] seconds
+		=> [Bool] the process that holds the lock is gone, or the lock
+			is older than the max age
+
+	The process is checked on posix only (os.kill() with signal 0 does
+	not just check on Windows), elsewhere the age decides.
+	"""
+	try:
+		with open(lock, 'r') as f:
+			pid = f.read().strip()
+		age = datetime.now().timestamp() - os.stat(lock).st_mtime
+	except FileNotFoundError:
+		return False
+
+	if age > maxAge:
+		return True
+
+	if os.name == 'posix' and pid.isdigit():
+		try:
+			os.kill(int(pid), 0)
+		except ProcessLookupError:
+			return True
+		except PermissionError:
+			pass
+
+	return False
+
+
+
+@contextmanager
+def _lockFile(file, timeout=60.0, interval=0.05, maxAge=600.0):
+	"""
+	[String] file to lock, [Float] seconds to wait, [Float] seconds,
+	[Float] seconds after which a lock is stale
+
+	A lock file created with O_EXCL, works across processes (parallel
+	portfolio workers) on any platform. The lock file has the pid of
+	its holder. A lock left by a process that was killed is broken,
+	see _isStaleLock().
+	"""
+	lock, start = file + '.lock', perf_counter()
+	while True:
+		try:
+			fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+			break
+		except FileExistsError:
+			if _isStaleLock(lock, maxAge):
+				logger.warning('_lockFile(): break stale lock {0}'.format(lock))
+				try:
+					remove(lock)
+				except FileNotFoundError:
+					pass
+				continue
+
+			if perf_counter() - start > timeout:
+				logger.error('_lockFile(): timeout waiting for {0}'.format(lock))
+				raise ValueError
+			sleep(interval)
+
+	try:
+		os.write(fd, str(os.getpid()).encode())
+		os.close(fd)
+		yield file
+	finally:
+		remove(lock)
+
+
+
+def _loadManifest(file):
+	if not exists(file):
+		return {}
+
+	with open(file, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+
+def writeManifest(outputDir, date, files):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[Iterable] ([String]) output files of the date
+		=> [String] manifest file
+
+	Side effect: the files are added to the manifest of the date (file
+	name -> rows, bytes, sha256), entries of files no longer in the
+	output directory are dropped. Runs of other portfolios may update
+	the same manifest, so it is done under a lock.
+
+	Call it after the files are written. The manifest then lists only
+	complete files, but other portfolios of the date may still be
+	running.
+	"""
+	entries = {basename(f): describeFile(f) for f in files}
+	manifestFile = getManifestFile(outputDir, date)
+	with _lockFile(manifestFile):
+		manifest = _loadManifest(manifestFile)
+		files = dict(filter( lambda t: exists(join(outputDir, t[0]))
+						   , manifest.get('files', {}).items()), **entries)
+		with openAtomic(manifestFile, 'w', encoding='utf-8') as f:
+			json.dump( { 'date': date
+					   , 'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+					   , 'files': dict(sorted(files.items()))
+					   }
+					 , f, indent=1)
+
+	return manifestFile
@@ -0,0 +1,212 @@
+# coding=utf-8
+#
+# Run all the stages for one date concurrently.
+#
+# Loading Geneva reports is dominated by file read and decode, and
+# the five reports do not depend on each other, so they are loaded
+# at the same time in a thread pool. Each conversion stage starts as
+# soon as the stages it depends on are done.
+#
+from factset.data import _getGenevaPositionsFromFile \
+						, _getGenevaDividendReceivableFromFile \
+						, _getGenevaNavFromFile, _getGenevaCashLedgerFromFile \
+						, _getGenevaPurchaseSalesFromFile, getFxTable
+from factset.factset_position import getPositions
+from factset.factset_transaction import get_transactions
+from factset.result_store import saveResults
+from factset.validation import checkInputDates
+from factset.output import writeManifest
+from factset.worker import _doCsvOutput, _doConsolidatedCsvOutput \
+						, _getFactsetPositionCsvHeaders \
+						, _get_factset_transaction_csv_headers
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+import asyncio, logging
+logger = logging.getLogger(__name__)
+
+
+
+def _loadStage(loaderFunc, date, portfolios):
+	"""
+	[Function] ([String] date -> [List] positions),
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios
+		=> [Int] number of positions loaded
+
+	Loaders are cached in data.py, so loading here makes the report
+	ready for the later stages.
+	"""
+	return len(loaderFunc(date))
+
+
+
+def _convertStage(func, kind, date, portfolios):
+	"""
+	[Function] ([String] date, [String] portfolio -> [Iterable] results),
+	[String] kind,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios
+		=> [Dictionary] ([String] portfolio -> [List] results)
+
+	Results are saved to the result store as well.
+	"""
+	return {p: saveResults(kind, date, p, func(date, p)) for p in portfolios}
+
+
+
+def _getStages():
+	"""
+	[Dictionary] ([String] stage name
+					-> ( [Tuple] ([String]) stages it depends on
+					   , [Function] ([String] date, [List] portfolios -> result)
+					   ))
+	"""
+	return \
+	{ 'tax lot': ((), partial(_loadStage, _getGenevaPositionsFromFile))
+	, 'dividend receivable': ((), partial(_loadStage, _getGenevaDividendReceivableFromFile))
+	, 'nav': ((), partial(_loadStage, _getGenevaNavFromFile))
+	, 'cash ledger': ((), partial(_loadStage, _getGenevaCashLedgerFromFile))
+	, 'purchase sales': ((), partial(_loadStage, _getGenevaPurchaseSalesFromFile))
+	, 'fx table': (('tax lot', ), lambda date, portfolios: len(getFxTable(date)))
+	, 'positions': ( ('tax lot', 'dividend receivable', 'nav', 'fx table')
+				   , partial(_convertStage, getPositions, 'factset_position')
+				   )
+	, 'transactions': ( ('cash ledger', 'purchase sales')
+					  , partial(_convertStage, get_transactions, 'factset_transaction')
+					  )
+	}
+
+
+
+def _topologicalOrder(stages):
+	"""
+	[Dictionary] stages => [List] ([String]) stage names
+
+	Every stage comes after the stages it depends on.
+	"""
+	order, visiting = [], set()
+
+	def visit(name):
+		if name in order:
+			return
+		if name in visiting or not name in stages:
+			logger.error('_topologicalOrder(): cyclic or unknown stage {0}'.format(name))
+			raise ValueError
+
+		visiting.add(name)
+		for dep in stages[name][0]:
+			visit(dep)
+		visiting.remove(name)
+		order.append(name)
+	# End of visit()
+
+	for name in stages:
+		visit(name)
+
+	return order
+
+
+
+async def runStages(stages, executor, date, portfolios):
+	"""
+	[Dictionary] stages,
+	[Executor] executor,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios
+		=> [Dictionary] ([String] stage name -> result)
+
+	Start every stage as a task, each task waits for its dependencies
+	then runs the stage function in the executor.
+	"""
+	loop = asyncio.get_running_loop()
+	tasks = {}
+
+	async def runStage(name):
+		dependencies, func = stages[name]
+		await asyncio.gather(*map(lambda d: tasks[d], dependencies))
+
+		start = perf_counter()
+		result = await loop.run_in_executor(executor, func, date, portfolios)
+		logger.debug('runStages(): {0} done in {1:.3f}s'.format(
+					name, perf_counter() - start))
+		return result
+	# End of runStage()
+
+	for name in _topologicalOrder(stages):
+		tasks[name] = asyncio.ensure_future(runStage(name))
+
+	results = await asyncio.gather(*tasks.values())
+	return dict(zip(tasks.keys(), results))
+
+
+
+def runDate(date, portfolios, maxWorkers=5):
+	"""
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios,
+	[Int] max number of threads
+		=> [Dictionary] ([String] stage name -> result)
+	"""
+	logger.debug('runDate(): {0}, {1}'.format(date, portfolios))
+	with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+		return asyncio.run(runStages(_getStages(), executor, date, portfolios))
+
+
+
+def writeDate(outputDir, date, portfolios, consolidated=False):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios,
+	[Bool] one position and one transaction file for all portfolios
+		=> [List] ([String]) output csv files
+
+	Side effect: create FactSet position and transaction csv files
+	in the output directory, then update the manifest of the date.
+
+	Input files whose dates do not agree with their names are rejected
+	before any report is parsed.
+	"""
+	checkInputDates(date)
+	results = runDate(date, portfolios)
+	outputs = \
+	( ('positions', _getFactsetPositionCsvHeaders(), 'factset_position')
+	, ('transactions', _get_factset_transaction_csv_headers(), 'factset_transaction')
+	)
+	if consolidated:
+		files = list(map( lambda t: _doConsolidatedCsvOutput( lambda d, p: results[t[0]][p]
+															, t[1], t[2], outputDir, date
+															, portfolios)
+						, outputs))
+	else:
+		files = [ _doCsvOutput( lambda d, p: results[name][p], headers, prefix
+							  , outputDir, date, p)
+				  for name, headers, prefix in outputs for p in portfolios]
+
+	writeManifest(outputDir, date, files)
+	return files
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	from factset.utility import getOutputDirectory
+	from factset.instrument import isEnabled, writeSummary
+	from factset.worker import _getOutputFilename
+	import argparse
+	parser = argparse.ArgumentParser(description='run all stages for a date')
+	parser.add_argument('date', metavar='date', type=str, help="position date (yyyy-mm-dd)")
+	parser.add_argument('portfolios', metavar='portfolio', type=str, nargs='+', help="portfolio ids")
+	parser.add_argument( '--consolidated', action='store_true'
+					   , help="one position and one transaction file for all portfolios")
+	args = parser.parse_args()
+
+	for file in writeDate(getOutputDirectory(), args.date, args.portfolios, args.consolidated):
+		print(file)
+
+	if isEnabled():
+		print(writeSummary(_getOutputFilename( getOutputDirectory(), 'run_stats'
+											 , args.date, 'all', '.json')))
@@ -0,0 +1,208 @@
+# coding=utf-8
+#
+# Day over day diff of FactSet positions, to validate daily uploads.
+#
+# Positions of two dates are joined on (Portfolio Name, Symbol) with a
+# hash join: the earlier date is put in a dictionary, then the later
+# date is probed against it. All portfolios are done in one pass.
+#
+from factset.target_api import getFactsetPositions
+from factset.data import getPortfolioCodes, getReportDates
+from factset.worker import _getOutputFilename
+from factset.utility import getOutputDirectory
+from factset.output import writeDicts
+from itertools import chain
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def _getKey(position):
+	"""
+	[Dictionary] factset position => [Tuple] (portfolio, symbol)
+	"""
+	return (position['Portfolio Name'], position['Symbol'])
+
+
+
+def _buildTable(positions):
+	"""
+	[Iterable] ([Dictionary]) factset positions
+		=> [Dictionary] ([Tuple] (portfolio, symbol)
+							-> [List] [quantity, market value])
+
+	Tax lots of the same symbol are added up.
+	"""
+	table = {}
+	for p in positions:
+		entry = table.setdefault(_getKey(p), [0, 0])
+		entry[0] = entry[0] + p['Shares']
+		entry[1] = entry[1] + p['Ending Market Value']
+
+	return table
+
+
+
+def _getAllPositions(date, portfolios):
+	"""
+	[String] date (yyyy-mm-dd), [List] ([String]) portfolios
+		=> [Iterable] ([Dictionary]) factset positions of all portfolios
+	"""
+	return chain.from_iterable(
+		map(lambda portfolio: getFactsetPositions(date, portfolio), portfolios))
+
+
+
+def getPreviousDate(date):
+	"""
+	[String] date (yyyy-mm-dd)
+		=> [String] the latest date before it with a tax lot report
+	"""
+	dates = list(filter(lambda d: d < date, getReportDates('tax lot')))
+	if len(dates) == 0:
+		logger.error('getPreviousDate(): no tax lot report before {0}'.format(date))
+		raise ValueError
+
+	return dates[-1]
+
+
+
+def _diffEntry(change, key, before, after):
+	"""
+	[String] change ('add', 'drop', 'change'),
+	[Tuple] (portfolio, symbol),
+	[List] [quantity, market value] before,
+	[List] [quantity, market value] after
+		=> [Dictionary] diff entry
+	"""
+	return \
+	{ 'Portfolio Name': key[0]
+	, 'Symbol': key[1]
+	, 'Change': change
+	, 'Quantity Before': before[0]
+	, 'Quantity After': after[0]
+	, 'Market Value Before': before[1]
+	, 'Market Value After': after[1]
+	}
+
+
+
+def _isChanged(quantityTolerance, marketValueTolerance, before, after):
+	"""
+	[Float] quantity tolerance (absolute),
+	[Float] market value tolerance (relative),
+	[List] [quantity, market value] before,
+	[List] [quantity, market value] after
+		=> [Bool]
+	"""
+	if abs(after[0] - before[0]) > quantityTolerance:
+		return True
+
+	base = max(abs(before[1]), abs(after[1]))
+	return base > 0 and abs(after[1] - before[1])/base > marketValueTolerance
+
+
+
+def diffPositions( beforePositions, afterPositions
+				 , quantityTolerance=0, marketValueTolerance=0.1):
+	"""
+	[Iterable] ([Dictionary]) factset positions before,
+	[Iterable] ([Dictionary]) factset positions after,
+	[Float] quantity tolerance (absolute),
+	[Float] market value tolerance (relative, 0.1 = 10%)
+		=> [List] ([Dictionary]) diff entries
+
+	Adds and changes come in the order of the later positions, drops
+	come last.
+	"""
+	before = _buildTable(beforePositions)
+	after = _buildTable(afterPositions)
+	zero = [0, 0]
+
+	def probe(key):
+		b = before.get(key)
+		if b == None:
+			return _diffEntry('add', key, zero, after[key])
+		elif _isChanged(quantityTolerance, marketValueTolerance, b, after[key]):
+			return _diffEntry('change', key, b, after[key])
+		else:
+			return None
+
+
+	return list(chain(
+		filter(lambda x: x != None, map(probe, after))
+	  , map( lambda key: _diffEntry('drop', key, before[key], zero)
+	  	   , filter(lambda key: not key in after, before))
+	))
+
+
+
+def getPositionDiff( date, previousDate=None, portfolios=None
+				   , quantityTolerance=0, marketValueTolerance=0.1):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] previous date (yyyy-mm-dd), None means the latest date
+		before with a tax lot report,
+	[List] ([String]) portfolios, None means all portfolios in the
+		tax lot reports of both dates,
+	[Float] quantity tolerance (absolute),
+	[Float] market value tolerance (relative)
+		=> [List] ([Dictionary]) diff entries
+	"""
+	previousDate = getPreviousDate(date) if previousDate == None else previousDate
+	logger.debug('getPositionDiff(): %s, %s', previousDate, date)
+
+	if portfolios == None:
+		beforePortfolios = getPortfolioCodes(previousDate)
+		afterPortfolios = getPortfolioCodes(date)
+	else:
+		beforePortfolios = afterPortfolios = portfolios
+
+	return diffPositions( _getAllPositions(previousDate, beforePortfolios)
+						, _getAllPositions(date, afterPortfolios)
+						, quantityTolerance, marketValueTolerance)
+
+
+
+def _getDiffCsvHeaders():
+	return \
+	( 'Portfolio Name', 'Symbol', 'Change', 'Quantity Before', 'Quantity After'
+	, 'Market Value Before', 'Market Value After'
+	)
+
+
+
+def writePositionDiffCsv(outputDir, date, diff):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([Dictionary]) diff entries
+		=> [String] output csv
+	"""
+	return writeDicts( _getOutputFilename(outputDir, 'position_diff', date, 'all')
+					 , _getDiffCsvHeaders(), diff)
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='diff positions against previous date')
+	parser.add_argument('date', metavar='date', type=str, help="position date (yyyy-mm-dd)")
+	parser.add_argument('--previous', type=str, help="previous date, default the latest before")
+	parser.add_argument('--portfolios', type=str, nargs='*', help="default all")
+	parser.add_argument( '--quantity-tolerance', type=float, default=0
+					   , help="absolute quantity change to report")
+	parser.add_argument( '--mv-tolerance', type=float, default=0.1
+					   , help="relative market value change to report, 0.1 = 10%%")
+	args = parser.parse_args()
+
+	diff = getPositionDiff( args.date, args.previous, args.portfolios
+						  , args.quantity_tolerance, args.mv_tolerance)
+	for change in ('add', 'drop', 'change'):
+		print('{0}: {1}'.format(change, len(list(filter(lambda x: x['Change'] == change, diff)))))
+
+	print(writePositionDiffCsv(getOutputDirectory(), args.date, diff))
@@ -0,0 +1,244 @@
+# coding=utf-8
+#
+# In-memory store of FactSet positions over many dates, for time series
+# queries such as the quantity of a symbol in 12307 over March.
+#
+# Each date is kept as columns: an index (portfolio -> symbol -> row),
+# quantities and ending market values in array('d'). Portfolio codes
+# and symbols are interned, so they are shared between dates and a
+# quarter of positions takes little memory. Tax lots of the same
+# symbol are added up.
+#
+# Positions are loaded through the result store, so dates already
+# processed by the worker are not computed again. When no portfolios
+# are given, all portfolios in the tax lot report of the date are
+# loaded (and any others in the result store for the date).
+#
+from factset.target_api import getFactsetPositions
+from factset.result_store import getStoredPortfolios
+from factset.data import getReportDates, getPortfolioCodes
+from toolz.functoolz import compose
+from functools import partial
+from itertools import chain
+from array import array
+from bisect import bisect_left, bisect_right
+import sys, logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+	[String] field name in queries => [String] factset position field
+"""
+_FIELDS = \
+{ 'quantity': 'Shares'
+, 'market value': 'Ending Market Value'
+}
+
+_dates = []		# loaded dates, sorted
+_store = {}		# date -> (index, quantity array, market value array)
+
+
+
+def _toColumns(positions):
+	"""
+	[Iterable] ([Dictionary]) factset positions
+		=> ( [Dictionary] ([String] portfolio -> [Dictionary] ([String] symbol -> [Int] row))
+		   , [array] quantity
+		   , [array] market value
+		   )
+	"""
+	index, quantity, marketValue = {}, array('d'), array('d')
+	for p in positions:
+		rows = index.setdefault(sys.intern(p['Portfolio Name']), {})
+		symbol = sys.intern(p['Symbol'])
+		i = rows.get(symbol)
+		if i == None:
+			rows[symbol] = len(quantity)
+			quantity.append(p[_FIELDS['quantity']])
+			marketValue.append(p[_FIELDS['market value']])
+		else:
+			quantity[i] = quantity[i] + p[_FIELDS['quantity']]
+			marketValue[i] = marketValue[i] + p[_FIELDS['market value']]
+
+	return index, quantity, marketValue
+
+
+
+def _addDate(date, columns):
+	"""
+	[String] date (yyyy-mm-dd), [Tuple] columns => [String] date
+	"""
+	if not date in _store:
+		_dates.insert(bisect_left(_dates, date), date)
+
+	_store[date] = columns
+	return date
+
+
+
+def _getPortfolios(date):
+	"""
+	[String] date (yyyy-mm-dd) => [List] ([String]) portfolios, sorted
+
+	Portfolios in the tax lot report of the date, and those with
+	positions of the date in the result store. The result store alone
+	would miss the portfolios not processed yet.
+	"""
+	return sorted( set(getPortfolioCodes(date))
+				 | set(getStoredPortfolios('factset_position', date)))
+
+
+
+def loadDate(date, portfolios=None):
+	"""
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios, None means all portfolios of the
+		date, see _getPortfolios()
+		=> [Int] number of (portfolio, symbol) loaded
+
+	Side effect: positions of the date are added to the store,
+	replacing those loaded before.
+	"""
+	logger.debug('loadDate(): %s', date)
+
+	portfolios = _getPortfolios(date) if portfolios == None else portfolios
+	columns = compose(
+		_toColumns
+	  , chain.from_iterable
+	  , partial(map, lambda portfolio: getFactsetPositions(date, portfolio))
+	)(portfolios)
+
+	_addDate(date, columns)
+	return len(columns[1])
+
+
+
+def loadRange(startDate, endDate, portfolios=None, reload=False):
+	"""
+	[String] start date (yyyy-mm-dd),
+	[String] end date (yyyy-mm-dd),
+	[List] ([String]) portfolios, None means all,
+	[Bool] load again the dates already in the store
+		=> [List] ([String]) dates loaded
+
+	Loads the dates in the range that have a tax lot report.
+	"""
+	dates = list(filter( lambda date: reload or not date in _store
+					   , getDatesInRange(getReportDates('tax lot'), startDate, endDate)))
+	for date in dates:
+		loadDate(date, portfolios)
+
+	return dates
+
+
+
+def getDatesInRange(dates, startDate, endDate):
+	"""
+	[List] ([String]) sorted dates,
+	[String] start date (yyyy-mm-dd),
+	[String] end date (yyyy-mm-dd)
+		=> [List] ([String]) dates within the range, inclusive
+	"""
+	return dates[bisect_left(dates, startDate):bisect_right(dates, endDate)]
+
+
+
+def getLoadedDates():
+	"""
+	=> [List] ([String]) dates in the store, sorted
+	"""
+	return list(_dates)
+
+
+
+def _getColumn(field):
+	"""
+	[String] field ('quantity' or 'market value') => [Int] column position
+	"""
+	try:
+		return {'quantity': 1, 'market value': 2}[field]
+	except KeyError:
+		logger.error('_getColumn(): {0} not supported'.format(field))
+		raise ValueError
+
+
+
+def getSeries(portfolio, symbol, startDate, endDate, field='quantity'):
+	"""
+	[String] portfolio,
+	[String] symbol,
+	[String] start date (yyyy-mm-dd),
+	[String] end date (yyyy-mm-dd),
+	[String] field ('quantity' or 'market value')
+		=> [List] ([Tuple]) ([String] date, [Float] value)
+
+	One entry per loaded date in the range, 0 when the symbol is not
+	held on the date.
+	"""
+	column = _getColumn(field)
+
+	def value(date):
+		columns = _store[date]
+		i = columns[0].get(portfolio, {}).get(symbol)
+		return 0.0 if i == None else columns[column][i]
+
+
+	return list(map( lambda date: (date, value(date))
+				   , getDatesInRange(_dates, startDate, endDate)))
+
+
+
+def getPortfolioSeries(portfolio, startDate, endDate, field='quantity'):
+	"""
+	[String] portfolio,
+	[String] start date (yyyy-mm-dd),
+	[String] end date (yyyy-mm-dd),
+	[String] field ('quantity' or 'market value')
+		=> ( [List] ([String]) dates
+		   , [Dictionary] ([String] symbol -> [array] values, one per date)
+		   )
+
+	All symbols held by the portfolio on any date in the range.
+	"""
+	column = _getColumn(field)
+	dates = getDatesInRange(_dates, startDate, endDate)
+	series = {}
+	for n, date in enumerate(dates):
+		columns = _store[date]
+		for symbol, i in columns[0].get(portfolio, {}).items():
+			series.setdefault(symbol, array('d', [0.0]*len(dates)))[n] = columns[column][i]
+
+	return dates, series
+
+
+
+def clear():
+	"""
+	Side effect: remove all dates from the store.
+	"""
+	_dates.clear()
+	_store.clear()
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='position time series')
+	parser.add_argument('portfolio', metavar='portfolio', type=str, help="portfolio id")
+	parser.add_argument('startDate', metavar='start_date', type=str, help="start date (yyyy-mm-dd)")
+	parser.add_argument('endDate', metavar='end_date', type=str, help="end date (yyyy-mm-dd)")
+	parser.add_argument('--symbol', type=str, help="one symbol, default all")
+	parser.add_argument( '--field', type=str, default='quantity'
+					   , choices=['quantity', 'market value'])
+	args = parser.parse_args()
+
+	loadRange(args.startDate, args.endDate, [args.portfolio])
+	dates, series = getPortfolioSeries(args.portfolio, args.startDate, args.endDate, args.field)
+	print(','.join(['Symbol'] + dates))
+	for symbol in sorted(series) if args.symbol == None else [args.symbol]:
+		print(','.join([symbol] + list(map(str, series.get(symbol, [0.0]*len(dates))))))
@@ -0,0 +1,289 @@
+# coding=utf-8
+#
+# A small HTTP service (asyncio, stdlib only) for other teams to query
+# FactSet positions, transactions and Geneva cash ledger.
+#
+# GET /positions?date=yyyy-mm-dd&portfolio=12307&format=json|csv
+# GET /transactions?...
+# GET /cash_ledger?...
+#
+# Connections are kept alive (HTTP/1.1), responses can be gzipped,
+# and ETags are based on the size and modified time of the source
+# Geneva files. When those change, parsed reports cached in data.py
+# are cleared, and result store entries of the old files are stale.
+#
+from factset.target_api import getFactsetPositions, getFactsetTransactions \
+							, getGenevaCashLedger
+from factset.data import getInputFingerprints
+from factset.result_store import refreshIfChanged
+from factset.worker import _getFactsetPositionCsvHeaders \
+						, _get_factset_transaction_csv_headers \
+						, _getCashLedgerCsvHeaders
+from factset.output import makeRowSerializer
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from itertools import chain
+import asyncio, csv, gzip, hashlib, io, json, logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+	route => ( [Function] ([String] date, [String] portfolio -> [Iterable] rows)
+			 , [Tuple] csv headers
+			 , [Tuple] ([String]) report types of the source files
+			 )
+"""
+_ROUTES = \
+{ '/positions': ( getFactsetPositions
+				, _getFactsetPositionCsvHeaders()
+				, ('tax lot', 'dividend receivable', 'nav')
+				)
+, '/transactions': ( getFactsetTransactions
+				   , _get_factset_transaction_csv_headers()
+				   , ('cash ledger', 'purchase sales')
+				   )
+, '/cash_ledger': ( getGenevaCashLedger
+				  , _getCashLedgerCsvHeaders()
+				  , ('cash ledger', )
+				  )
+}
+
+_STATUS_TEXT = \
+{ 200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found'
+, 405: 'Method Not Allowed', 500: 'Internal Server Error'
+}
+
+_MAX_CACHED_RESPONSES = 256
+
+"""
+	Parsed reports are cached in data.py and the result store, but
+	they are not thread safe against double loading, so all data
+	access goes through one worker thread.
+"""
+_executor = ThreadPoolExecutor(max_workers=1)
+
+"""
+	[String] etag => ([String] content type, [Bytes] body, [Bytes] gzipped body)
+"""
+_responseCache = OrderedDict()
+
+
+
+def _getEtag(route, date, portfolio, fmt):
+	"""
+	[String] route, [String] date (yyyy-mm-dd), [String] portfolio,
+	[String] format
+		=> [String] etag
+
+	The etag changes whenever any of the source files is modified.
+
+	Side effect: if the source files changed since last seen, the
+	parsed reports cached in data.py are cleared, so the response of
+	the new etag is built from the new files.
+	"""
+	_, _, reportTypes = _ROUTES[route]
+	inputs = getInputFingerprints(reportTypes, date)
+	refreshIfChanged(inputs)
+	return '"' + hashlib.sha1(
+					json.dumps([route, date, portfolio, fmt, sorted(inputs.items())]).encode()
+				).hexdigest() + '"'
+
+
+
+def _toJson(rows):
+	"""
+	[Iterable] ([Dictionary]) rows => [Bytes] json
+	"""
+	return json.dumps(list(rows), default=str).encode('utf-8')
+
+
+
+def _toCsv(headers, rows):
+	"""
+	[Tuple] headers, [Iterable] ([Dictionary]) rows => [Bytes] csv
+	"""
+	buf = io.StringIO()
+	csv.writer(buf).writerows(
+		chain([headers], map(makeRowSerializer(tuple(headers)), rows))
+	)
+	return buf.getvalue().encode('utf-8')
+
+
+
+def _buildResponse(etag, route, date, portfolio, fmt):
+	"""
+	[String] etag, [String] route, [String] date (yyyy-mm-dd),
+	[String] portfolio, [String] format
+		=> ([String] content type, [Bytes] body, [Bytes] gzipped body)
+
+	Runs in the worker thread.
+	"""
+	if etag in _responseCache:
+		_responseCache.move_to_end(etag)
+		return _responseCache[etag]
+
+	logger.debug('_buildResponse(): {0}, {1}, {2}, {3}'.format(
+				route, date, portfolio, fmt))
+	getterFunc, headers, _ = _ROUTES[route]
+	rows = getterFunc(date, portfolio)
+	if fmt == 'csv':
+		contentType, body = 'text/csv; charset=utf-8', _toCsv(headers, rows)
+	else:
+		contentType, body = 'application/json', _toJson(rows)
+
+	_responseCache[etag] = (contentType, body, gzip.compress(body))
+	while len(_responseCache) > _MAX_CACHED_RESPONSES:
+		_responseCache.popitem(last=False)
+
+	return _responseCache[etag]
+
+
+
+def _parseQuery(target):
+	"""
+	[String] request target => ([String] route, [Dictionary] parameters)
+	"""
+	url = urlsplit(target)
+	return url.path.rstrip('/'), {k: v[0] for k, v in parse_qs(url.query).items()}
+
+
+
+async def _readRequest(reader):
+	"""
+	[StreamReader] reader
+		=> ([String] method, [String] target, [String] version, [Dictionary] headers)
+		, or None if the client closed the connection.
+	"""
+	line = await reader.readline()
+	if not line.strip():
+		return None
+
+	method, target, version = line.decode('latin-1').split()
+	headers = {}
+	while True:
+		line = await reader.readline()
+		if line in (b'\r\n', b'\n', b''):
+			break
+		key, _, value = line.decode('latin-1').partition(':')
+		headers[key.strip().lower()] = value.strip()
+
+	return method, target, version, headers
+
+
+
+def _writeResponse(writer, status, headers, body, keepAlive):
+	"""
+	[StreamWriter] writer, [Int] status, [Dictionary] headers,
+	[Bytes] body, [Bool] keep alive
+	"""
+	headers = dict( headers
+				  , **{ 'Content-Length': str(len(body))
+				  	  , 'Connection': 'keep-alive' if keepAlive else 'close'
+				  	  }
+				  )
+	writer.write(
+		('HTTP/1.1 {0} {1}\r\n'.format(status, _STATUS_TEXT[status]) \
+			+ ''.join(map(lambda kv: '{0}: {1}\r\n'.format(*kv), headers.items())) \
+			+ '\r\n').encode('latin-1') + body
+	)
+
+
+
+async def _respond(method, target, headers):
+	"""
+	[String] method, [String] target, [Dictionary] request headers
+		=> ([Int] status, [Dictionary] response headers, [Bytes] body)
+	"""
+	route, params = _parseQuery(target)
+	if route not in _ROUTES:
+		return 404, {}, b''
+
+	if method != 'GET':
+		return 405, {'Allow': 'GET'}, b''
+
+	if not 'date' in params or not 'portfolio' in params:
+		return 400, {}, b'date and portfolio are required'
+
+	fmt = params.get('format', 'json')
+	args = (route, params['date'], params['portfolio'], fmt)
+	loop = asyncio.get_running_loop()
+	try:
+		etag = await loop.run_in_executor(_executor, _getEtag, *args)
+	except ValueError:
+		return 404, {}, b'source file not found'
+
+	if etag in map(str.strip, headers.get('if-none-match', '').split(',')):
+		return 304, {'ETag': etag}, b''
+
+	try:
+		contentType, body, gzipped = \
+			await loop.run_in_executor(_executor, _buildResponse, etag, *args)
+	except Exception:
+		logger.exception('_respond(): {0}'.format(target))
+		return 500, {}, b''
+
+	if 'gzip' in headers.get('accept-encoding', ''):
+		return 200, { 'ETag': etag, 'Content-Type': contentType
+					, 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'}, gzipped
+	else:
+		return 200, { 'ETag': etag, 'Content-Type': contentType
+					, 'Vary': 'Accept-Encoding'}, body
+
+
+
+async def _handleConnection(reader, writer):
+	"""
+	Serve requests on one connection until the client closes it or
+	asks to close it.
+	"""
+	try:
+		while True:
+			request = await _readRequest(reader)
+			if request == None:
+				break
+
+			method, target, version, headers = request
+			keepAlive = headers.get('connection', '').lower() != 'close' \
+						if version == 'HTTP/1.1' else \
+						headers.get('connection', '').lower() == 'keep-alive'
+
+			status, responseHeaders, body = await _respond(method, target, headers)
+			_writeResponse(writer, status, responseHeaders, body, keepAlive)
+			await writer.drain()
+			if not keepAlive:
+				break
+
+	except (ConnectionError, ValueError):
+		logger.warning('_handleConnection(): bad request or connection lost')
+	finally:
+		writer.close()
+
+
+
+async def serve(host, port):
+	"""
+	[String] host, [Int] port
+
+	Run the service until cancelled.
+	"""
+	server = await asyncio.start_server(_handleConnection, host, port)
+	logger.info('serve(): listening on {0}:{1}'.format(host, port))
+	async with server:
+		await server.serve_forever()
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='FactSet query service')
+	parser.add_argument('--host', type=str, default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8080)
+	args = parser.parse_args()
+
+	asyncio.run(serve(args.host, args.port))
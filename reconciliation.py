@@ -0,0 +1,283 @@
+# coding=utf-8
+#
+# Position roll forward reconciliation: positions of the previous date
+# plus transactions since then should give positions of the date.
+#
+# Positions are indexed by (portfolio, symbol) with quantities, tax
+# lots of the same symbol added up, cash is the quantity of the
+# CASH_ZERO_<currency> symbol. Transactions are applied on trade date,
+# those with a trade date after the previous date, up to the date, each
+# transaction ID once (the cash ledger and purchase sales reports cover
+# many days, so a transaction comes with the reports of several dates):
+#
+# BL / SL: quantity of the symbol goes up / down, cash of the price
+# 	currency goes down / up by the Geneva local amount.
+#
+# Spot FX (BL of a CASH_ZERO_ symbol): the bought currency goes up by
+# 	the quantity, the price currency goes down by the local amount.
+#
+# IN (dividend, return of capital): cash goes up by the net amount.
+#
+# The result is compared with the positions of the date, differences
+# beyond the tolerance are breaks.
+#
+from factset.target_api import getFactsetPositions, getFactsetTransactions
+from factset.position_diff import getPreviousDate
+from factset.data import getPortfolioCodes, getReportDates
+from factset.worker import _getOutputFilename
+from factset.utility import getOutputDirectory
+from factset.output import writeDicts
+from toolz.functoolz import compose
+from functools import partial
+from itertools import chain
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def _getCashSymbol(currency):
+	return 'CASH_ZERO_' + currency
+
+
+
+def _isCashSymbol(symbol):
+	return symbol.startswith('CASH_ZERO_')
+
+
+
+def _buildQuantityTable(positions):
+	"""
+	[Iterable] ([Dictionary]) factset positions
+		=> [Dictionary] ([Tuple] (portfolio, symbol) -> [Float] quantity)
+	"""
+	table = {}
+	for p in positions:
+		key = (p['Portfolio Name'], p['Symbol'])
+		table[key] = table.get(key, 0) + p['Shares']
+
+	return table
+
+
+
+def _getQuantityChanges(transaction):
+	"""
+	[Dictionary] factset transaction
+		=> [List] ([Tuple]) ([String] symbol, [Float] quantity change)
+	"""
+	symbol = transaction['Symbol']
+	tradeType = transaction['Trade Type']
+	cash = _getCashSymbol(transaction['Price ISO'])
+
+	if tradeType == 'BL' and _isCashSymbol(symbol):
+		return [ (symbol, transaction['Quantity'])
+			   , (cash, -abs(transaction['Gross Transaction Amount']))]
+	elif tradeType == 'BL':
+		return [ (symbol, abs(transaction['Quantity']))
+			   , (cash, -abs(transaction['Gross Transaction Amount']))]
+	elif tradeType == 'SL':
+		return [ (symbol, -abs(transaction['Quantity']))
+			   , (cash, abs(transaction['Net Transaction Amount']))]
+	elif tradeType == 'IN':
+		return [(cash, transaction['Net Transaction Amount'])]
+	else:
+		logger.error('_getQuantityChanges(): {0} not supported'.format(tradeType))
+		raise ValueError
+
+
+
+def rollForward(positions, transactions, includeCash=True):
+	"""
+	[Dictionary] ([Tuple] (portfolio, symbol) -> [Float] quantity),
+	[Iterable] ([Dictionary]) factset transactions,
+	[Bool] include cash
+		=> [Dictionary] ([Tuple] (portfolio, symbol) -> [Float] quantity)
+
+	The positions are not changed.
+	"""
+	result = dict(positions)
+	for t in transactions:
+		for symbol, change in _getQuantityChanges(t):
+			if includeCash or not _isCashSymbol(symbol):
+				key = (t['Portfolio Code'], symbol)
+				result[key] = result.get(key, 0) + change
+
+	return result
+
+
+
+def _getBreaks(expected, actual, tolerance, includeCash):
+	"""
+	[Dictionary] expected quantities,
+	[Dictionary] actual quantities,
+	[Float] tolerance (absolute),
+	[Bool] include cash
+		=> [List] ([Dictionary]) breaks, sorted by (portfolio, symbol)
+	"""
+	def toBreak(key):
+		e, a = expected.get(key, 0), actual.get(key, 0)
+		return \
+		{ 'Portfolio Name': key[0]
+		, 'Symbol': key[1]
+		, 'Expected Quantity': e
+		, 'Actual Quantity': a
+		, 'Difference': a - e
+		}
+
+
+	return compose(
+		list
+	  , partial(filter, lambda b: abs(b['Difference']) > tolerance)
+	  , partial(map, toBreak)
+	  , sorted
+	  , partial(filter, lambda key: includeCash or not _isCashSymbol(key[1]))
+	  , set
+	  , chain
+	)(expected, actual)
+
+
+
+def _getTransactionDates(previousDate, date):
+	"""
+	[String] previous date (yyyy-mm-dd), [String] date (yyyy-mm-dd)
+		=> [List] ([String]) dates after the previous date, up to and
+			including the date, with both a cash ledger and a purchase
+			sales report
+
+	Dates without the reports (weekends, holidays) are left out, their
+	transactions come with the reports of a later date.
+	"""
+	return sorted(filter( lambda dt: previousDate < dt <= date
+						, set(getReportDates('cash ledger')) & set(getReportDates('purchase sales'))
+						))
+
+
+
+def _selectTransactions(previousDate, date, transactions):
+	"""
+	[String] previous date (yyyy-mm-dd),
+	[String] date (yyyy-mm-dd),
+	[Iterable] ([Dictionary]) factset transactions
+		=> [List] ([Dictionary]) transactions with trade date after the
+			previous date, up to and including the date. The same
+			transaction ID is taken once, the first seen.
+	"""
+	start, end = ''.join(previousDate.split('-')), ''.join(date.split('-'))
+	seen, result = set(), []
+	for t in transactions:
+		if start < t['Date'] <= end and not t['Transaction ID'] in seen:
+			seen.add(t['Transaction ID'])
+			result.append(t)
+
+	return result
+
+
+
+def reconcile( date, previousDate=None, portfolios=None
+			 , tolerance=0.0001, includeCash=True):
+	"""
+	[String] date (yyyy-mm-dd),
+	[String] previous date (yyyy-mm-dd), None means the latest date
+		before with a tax lot report,
+	[List] ([String]) portfolios, None means all portfolios in the
+		tax lot reports of both dates,
+	[Float] tolerance (absolute quantity),
+	[Bool] include cash
+		=> [List] ([Dictionary]) breaks
+
+	Transactions with a trade date after the previous date, up to the
+	date, are applied, see _selectTransactions(). They are read from
+	the transaction reports of the dates in between that have them.
+	Each break has the date and previous date.
+	"""
+	previousDate = getPreviousDate(date) if previousDate == None else previousDate
+	portfolios = sorted(set(getPortfolioCodes(previousDate)) | set(getPortfolioCodes(date))) \
+					if portfolios == None else portfolios
+	logger.debug('reconcile(): %s, %s', previousDate, date)
+
+	def positionsOf(dt):
+		return compose(
+			_buildQuantityTable
+		  , chain.from_iterable
+		  , partial(map, partial(getFactsetPositions, dt))
+		)(portfolios)
+
+
+	transactions = _selectTransactions(
+		previousDate, date
+	  , chain.from_iterable(
+	  		map( lambda t: getFactsetTransactions(t[0], t[1])
+	  		   , ((dt, p) for dt in _getTransactionDates(previousDate, date) for p in portfolios)
+	  		   )))
+
+	return list(map( lambda b: dict(b, **{'Date': date, 'Previous Date': previousDate})
+				   , _getBreaks( rollForward(positionsOf(previousDate), transactions, includeCash)
+				   			   , positionsOf(date), tolerance, includeCash)
+				   ))
+
+
+
+def reconcileMonth(date, portfolios=None, tolerance=0.0001, includeCash=True):
+	"""
+	[String] date (yyyy-mm-dd), any date in the month,
+	[List] ([String]) portfolios, None means all,
+	[Float] tolerance,
+	[Bool] include cash
+		=> [List] ([Dictionary]) breaks of all dates in the month
+
+	Every date in the month with a tax lot report is reconciled against
+	the one before it, the first of them against the last date of the
+	month before (if any).
+	"""
+	month = date[:7]
+	allDates = getReportDates('tax lot')
+	return list(chain.from_iterable(
+		map( lambda t: reconcile(t[1], t[0], portfolios, tolerance, includeCash)
+		   , filter( lambda t: t[1][:7] == month
+		   		   , zip(allDates, allDates[1:]))
+		   )))
+
+
+
+def _getBreakCsvHeaders():
+	return \
+	( 'Date', 'Previous Date', 'Portfolio Name', 'Symbol', 'Expected Quantity'
+	, 'Actual Quantity', 'Difference'
+	)
+
+
+
+def writeBreaksCsv(outputDir, date, breaks):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([Dictionary]) breaks
+		=> [String] output csv
+	"""
+	return writeDicts( _getOutputFilename(outputDir, 'reconciliation', date, 'all')
+					 , _getBreakCsvHeaders(), breaks)
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='roll forward reconciliation')
+	parser.add_argument('date', metavar='date', type=str, help="position date (yyyy-mm-dd)")
+	parser.add_argument('--previous', type=str, help="previous date, default the latest before")
+	parser.add_argument('--portfolios', type=str, nargs='*', help="default all")
+	parser.add_argument('--month', action='store_true', help="all dates in the month")
+	parser.add_argument('--tolerance', type=float, default=0.0001)
+	parser.add_argument('--no-cash', action='store_true', help="securities only")
+	args = parser.parse_args()
+
+	if args.month:
+		breaks = reconcileMonth(args.date, args.portfolios, args.tolerance, not args.no_cash)
+	else:
+		breaks = reconcile( args.date, args.previous, args.portfolios
+						  , args.tolerance, not args.no_cash)
+
+	print('breaks: {0}'.format(len(breaks)))
+	print(writeBreaksCsv(getOutputDirectory(), args.date, breaks))
@@ -0,0 +1,230 @@
+# coding=utf-8
+#
+# Binary cache of a Geneva report: the positions read from the report
+# file, stored columnar, so reading them again needs no UTF-16 decode
+# and no field conversion. See archive.py for the command that creates
+# them.
+#
+# A cache file is the report file name (less any .gz / .zst) plus
+# '.cache', e.g. 'all funds tax lot 2021-03-31.txt.cache'. Cache files
+# sit in the data directory next to the reports, so they are only data:
+# no pickle, reading one cannot run code. A cache file has three parts:
+#
+# 1. a header, one line of JSON: version, the reader that made it, the
+# 	source file and its sections as validation.scanSections() gives
+# 	them, the byte order of the arrays.
+#
+# 2. the body, one line of JSON: rows are kept in runs of rows with the
+# 	same fields, each run column by column.
+#
+# 3. the raw bytes of the arrays of the body, one after another.
+#
+# Columns are encoded as:
+#
+# all strings: dictionary encoded, the distinct values and an array
+# 	of codes, values are interned when read, so repeated values are
+# 	one object.
+#
+# mostly floats: array('d') plus the other values by row number
+# 	(e.g. 'NA').
+#
+# anything else: a list.
+#
+from factset.compression import stripCompression
+from factset.output import openAtomic
+from functools import partial
+from array import array
+from itertools import chain, groupby
+from os import stat
+from os.path import basename
+import json, logging, sys
+logger = logging.getLogger(__name__)
+
+
+
+_CACHE_VERSION = 2
+_SUFFIX = '.cache'
+
+
+
+def isReportCacheFile(file):
+	"""
+	[String] file => [Bool]
+	"""
+	return file.lower().endswith(_SUFFIX)
+
+
+
+def getReportCacheFile(file):
+	"""
+	[String] report file => [String] its cache file
+	"""
+	return stripCompression(file) + _SUFFIX
+
+
+
+def stripReportCache(file):
+	"""
+	[String] file => [String] file name without the cache suffix
+	"""
+	return file[:-len(_SUFFIX)] if isReportCacheFile(file) else file
+
+
+
+def _getFingerprint(file):
+	s = stat(file)
+	return {'name': basename(file), 'size': s.st_size, 'mtime': s.st_mtime_ns}
+
+
+
+def _encodeColumn(blob, values):
+	"""
+	[List] ([bytes]) array bytes written so far, [List] values
+		=> [List] encoded column
+
+	Side effect: the bytes of the column's array, if any, are added to
+	the blob, the column has their offset and length.
+	"""
+	def addArray(a):
+		offset = sum(map(len, blob))
+		blob.append(a.tobytes())
+		return [offset, len(blob[-1])]
+
+
+	if all(map(lambda x: type(x) == str, values)):
+		distinct = list(dict.fromkeys(values))
+		codes = {x: n for n, x in enumerate(distinct)}
+		return ['dict', distinct] + addArray(array('I', map(codes.__getitem__, values)))
+
+	others = {n: x for n, x in enumerate(values) if type(x) != float}
+	if len(others)*2 <= len(values):
+		return ['float'] \
+				+ addArray(array('d', map(lambda x: x if type(x) == float else 0.0, values))) \
+				+ [others]
+
+	return ['list', values]
+
+
+
+def _decodeColumn(blob, swap, column):
+	"""
+	[bytes] array bytes, [Bool] swap byte order, [List] encoded column
+		=> [List] values
+	"""
+	def getArray(typecode, offset, length):
+		a = array(typecode)
+		a.frombytes(blob[offset:offset + length])
+		if swap:
+			a.byteswap()
+		return a
+
+
+	if column[0] == 'dict':
+		distinct = list(map(sys.intern, column[1]))
+		return list(map(distinct.__getitem__, getArray('I', column[2], column[3])))
+	elif column[0] == 'float':
+		values = getArray('d', column[1], column[2]).tolist()
+		for n, x in column[3].items():
+			values[int(n)] = x
+		return values
+	else:
+		return column[1]
+
+
+
+def _writeLine(f, obj):
+	f.write(json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+	f.write(b'\n')
+
+
+
+def writeReportCache(file, readerName, sourceFile, sections, positions):
+	"""
+	[String] cache file,
+	[String] name of the reader (mapping function) of the positions,
+	[String] source report file,
+	[List] ([Dictionary]) sections of the source, see scanSections(),
+	[Iterable] ([Dictionary]) positions
+		=> [String] cache file
+	"""
+	blob = []
+	def encodeRun(t):
+		rows = list(map(lambda p: tuple(p.values()), t[1]))
+		return [ list(t[0]), len(rows)
+			   , list(map(partial(_encodeColumn, blob), map(list, zip(*rows))))]
+
+
+	runs = list(map(encodeRun, groupby(positions, lambda p: tuple(p))))
+	header = \
+	{ 'version': _CACHE_VERSION
+	, 'reader': readerName
+	, 'source': _getFingerprint(sourceFile)
+	, 'sections': sections
+	, 'rows': sum(map(lambda r: r[1], runs))
+	, 'byteorder': sys.byteorder
+	}
+	with openAtomic(file, 'wb') as f:
+		_writeLine(f, header)
+		_writeLine(f, runs)
+		for b in blob:
+			f.write(b)
+
+	return file
+
+
+
+def readReportCacheHeader(file):
+	"""
+	[String] cache file => [Dictionary] header
+	"""
+	with open(file, 'rb') as f:
+		return json.loads(f.readline())
+
+
+
+def readReportCache(readerName, file):
+	"""
+	[String] name of the reader (mapping function) expected,
+	[String] cache file
+		=> [List] ([Dictionary]) positions, as the reader gave them
+	"""
+	with open(file, 'rb') as f:
+		try:
+			header = json.loads(f.readline())
+		except ValueError:
+			logger.error('readReportCache(): {0} is not a report cache of this version'.format(file))
+			raise ValueError
+
+		if header['version'] != _CACHE_VERSION or header['reader'] != readerName:
+			logger.error('readReportCache(): {0} is version {1} of {2}, not {3}'.format(
+						file, header['version'], header['reader'], readerName))
+			raise ValueError
+
+		runs = json.loads(f.readline())
+		blob = f.read()
+
+	swap = header['byteorder'] != sys.byteorder
+	def decodeRun(run):
+		fields, n, columns = run
+		return map( lambda values: dict(zip(fields, values))
+				  , zip(*map(partial(_decodeColumn, blob, swap), columns)) if columns else [()]*n)
+
+
+	return list(chain.from_iterable(map(decodeRun, runs)))
+
+
+
+def isReportCacheFresh(file, sourceFile):
+	"""
+	[String] cache file, [String] a report file of the same name
+		=> [Bool] the cache is of the current version and was made from
+			the report file as it is now
+	"""
+	try:
+		header = readReportCacheHeader(file)
+	except Exception:
+		logger.warning('isReportCacheFresh(): cannot read {0}'.format(file))
+		return False
+
+	return header.get('version') == _CACHE_VERSION \
+			and header.get('source') == _getFingerprint(sourceFile)
@@ -0,0 +1,253 @@
+# coding=utf-8
+#
+# Store of FactSet results (positions, transactions, security info),
+# keyed by (date, portfolio). Worker runs populate the store, query
+# APIs read from it.
+#
+# Two levels: an in-process LRU, then json files in the store
+# directory.
+#
+# Each entry keeps the fingerprints (size, mtime) of the Geneva files
+# its results come from. An entry whose files changed since is stale,
+# the results are computed again.
+#
+from factset.utility import getStoreDirectory
+from factset.data import getInputFingerprints, clearReportCaches
+from factset.output import openAtomic
+from factset.factset_transaction import reset_unknown_transaction_types
+from toolz.functoolz import compose
+from functools import partial
+from collections import OrderedDict
+from os import listdir, makedirs
+from os.path import join, exists
+import json, logging
+logger = logging.getLogger(__name__)
+
+
+
+_MAX_ENTRIES = 64
+
+"""
+	([String] kind, [String] date, [String] portfolio)
+		=> ([Dictionary] input fingerprints, [List] results)
+"""
+_memoryStore = OrderedDict()
+
+
+
+"""
+	[String] kind => [Tuple] ([String]) report types its results come from
+"""
+_INPUT_REPORT_TYPES = \
+{ 'factset_position': ('tax lot', 'dividend receivable', 'nav')
+, 'factset_transaction': ('cash ledger', 'purchase sales')
+, 'factset_security_info': ('tax lot', )
+}
+
+
+
+"""
+	[String] input file => [List] ([Int] size, [Int] mtime), as last
+	seen when results were computed.
+"""
+_seenInputs = {}
+
+
+
+def getInputs(kind, date):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd)
+		=> [Dictionary] input fingerprints of the results of the kind
+	"""
+	return getInputFingerprints(_INPUT_REPORT_TYPES.get(kind, ()), date)
+
+
+
+def refreshIfChanged(inputs):
+	"""
+	[Dictionary] input fingerprints
+
+	Side effect: if any of the input files changed since results were
+	last computed from it, the parsed reports cached in data.py and the
+	unknown transaction type counts are cleared, so they start over
+	from the new files.
+	"""
+	if any(map(lambda t: _seenInputs.get(t[0], t[1]) != t[1], inputs.items())):
+		logger.info('refreshIfChanged(): Geneva files changed, clear report caches')
+		clearReportCaches()
+		reset_unknown_transaction_types()
+
+	_seenInputs.update(inputs)
+
+
+
+def _getStoreFile(kind, date, portfolio):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd), [String] portfolio
+		=> [String] store file
+	"""
+	return join( getStoreDirectory()
+			   , kind + '_' + ''.join(date.split('-')) + '_' + portfolio + '.json'
+			   )
+
+
+
+def getStoredPortfolios(kind, date):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd)
+		=> [List] ([String]) portfolios with results of the kind and date
+			in the persisted store, sorted. The results may be stale.
+	"""
+	prefix = kind + '_' + ''.join(date.split('-')) + '_'
+	directory = getStoreDirectory()
+	if not exists(directory):
+		return []
+
+	return compose(
+		sorted
+	  , partial(map, lambda fn: fn[len(prefix):-len('.json')])
+	  , partial(filter, lambda fn: fn.startswith(prefix) and fn.endswith('.json'))
+	)(listdir(directory))
+
+
+
+def _getFromMemory(key, inputs):
+	"""
+	[Tuple] key, [Dictionary] input fingerprints => [List] results
+
+	Raise KeyError if not found, or the entry is stale.
+	"""
+	stored, results = _memoryStore[key]
+	if stored != inputs:
+		raise KeyError(key)
+
+	_memoryStore.move_to_end(key)
+	return results
+
+
+
+def _putToMemory(key, inputs, results):
+	"""
+	[Tuple] key, [Dictionary] input fingerprints, [List] results
+		=> [List] results
+	"""
+	_memoryStore[key] = (inputs, results)
+	_memoryStore.move_to_end(key)
+	while len(_memoryStore) > _MAX_ENTRIES:
+		_memoryStore.popitem(last=False)
+
+	return results
+
+
+
+def _readPersisted(kind, date, portfolio, inputs):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd), [String] portfolio,
+	[Dictionary] input fingerprints
+		=> [List] results, or None if not in the store or stale
+	"""
+	file = _getStoreFile(kind, date, portfolio)
+	if not exists(file):
+		return None
+
+	logger.debug('_readPersisted(): {0}'.format(file))
+	with open(file, 'r', encoding='utf-8') as f:
+		entry = json.load(f)
+
+	if not isinstance(entry, dict) or entry.get('inputs') != inputs:
+		logger.debug('_readPersisted(): {0} is stale'.format(file))
+		return None
+
+	return entry['results']
+
+
+
+def _writePersisted(kind, date, portfolio, inputs, results):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd), [String] portfolio,
+	[Dictionary] input fingerprints, [List] results
+		=> [String] store file
+
+	Written atomically (see output.openAtomic()), so that a reader
+	never sees a half written file, and writers do not share a temp
+	file.
+	"""
+	file = _getStoreFile(kind, date, portfolio)
+	makedirs(getStoreDirectory(), exist_ok=True)
+	with openAtomic(file, 'w', encoding='utf-8') as f:
+		json.dump({'inputs': inputs, 'results': results}, f, default=str)
+
+	return file
+
+
+
+def saveResults(kind, date, portfolio, results, inputs=None):
+	"""
+	[String] kind, [String] date (yyyy-mm-dd), [String] portfolio,
+	[Iterable] results,
+	[Dictionary] input fingerprints taken before the results were
+		computed, None to take them now
+		=> [List] results
+
+	Side effect: results saved to both the memory and the persisted
+	store, replacing anything stored under the same key.
+	"""
+	inputs = getInputs(kind, date) if inputs == None else inputs
+	_seenInputs.update(inputs)
+	results = list(results)
+	_writePersisted(kind, date, portfolio, inputs, results)
+	return _putToMemory((kind, date, portfolio), inputs, results)
+
+
+
+def computeAndSave(kind, computeFunc, date, portfolio):
+	"""
+	[String] kind,
+	[Function] ([String] date, [String] portfolio -> [Iterable] results),
+	[String] date (yyyy-mm-dd),
+	[String] portfolio
+		=> [List] results
+
+	Always compute the results, then save them to the store. This is
+	what worker runs use, so the store is refreshed every run.
+	"""
+	inputs = getInputs(kind, date)
+	refreshIfChanged(inputs)
+	return saveResults(kind, date, portfolio, computeFunc(date, portfolio), inputs)
+
+
+
+def getResults(kind, computeFunc, date, portfolio):
+	"""
+	[String] kind,
+	[Function] ([String] date, [String] portfolio -> [Iterable] results),
+	[String] date (yyyy-mm-dd),
+	[String] portfolio
+		=> [List] results
+
+	Look up the memory store, then the persisted store. Only when
+	both miss, or the entry is stale (its Geneva files changed),
+	compute the results and save them.
+	"""
+	key = (kind, date, portfolio)
+	inputs = getInputs(kind, date)
+	try:
+		return _getFromMemory(key, inputs)
+	except KeyError:
+		pass
+
+	results = _readPersisted(kind, date, portfolio, inputs)
+	if results is None:
+		refreshIfChanged(inputs)
+		return saveResults(kind, date, portfolio, computeFunc(date, portfolio), inputs)
+	else:
+		return _putToMemory(key, inputs, results)
+
+
+
+def clearMemory():
+	"""
+	Side effect: empty the in-process store.
+	"""
+	_memoryStore.clear()
+	_seenInputs.clear()
@@ -0,0 +1,223 @@
+# coding=utf-8
+#
+# Parsed Geneva reports in shared memory, for child processes.
+#
+# The parent puts the rows of a report in one SharedMemory block,
+# column by column: floats as float64, strings as int32 codes into a
+# table of distinct values. What a child needs to find them (block
+# name, offsets, string tables) is a small dictionary, the handle,
+# which is cheap to pickle. A child attaches to the block and builds
+# the rows it asks for, e.g. one portfolio, straight from the shared
+# columns, the report is neither parsed nor copied through a pipe.
+#
+# Column kinds:
+#
+# 'float': mostly floats, the other values (e.g. 'NA') are kept in
+# 	the handle by row number.
+#
+# 'dict': strings, a code of -1 means the row has no such field.
+#
+# 'list': anything else, the values are in the handle.
+#
+from multiprocessing.shared_memory import SharedMemory
+from array import array
+from itertools import accumulate, chain
+import logging, sys
+logger = logging.getLogger(__name__)
+
+
+
+def _getFields(rows):
+	"""
+	[List] ([Dictionary]) rows => [List] ([String]) fields of all rows,
+		in the order first seen
+	"""
+	return list(dict.fromkeys(chain.from_iterable(map(tuple, rows))))
+
+
+
+def _getPartitions(rows, field):
+	"""
+	[List] ([Dictionary]) rows, [String] field
+		=> [Dictionary] ([String] value -> [List] ([List] [start, end]))
+			row ranges of each value of the field
+	"""
+	partitions, start = {}, 0
+	for n in range(1, len(rows) + 1):
+		if n == len(rows) or rows[n].get(field) != rows[start].get(field):
+			partitions.setdefault(rows[start].get(field), []).append([start, n])
+			start = n
+
+	return partitions
+
+
+
+def _encodeColumn(values):
+	"""
+	[List] values, None for a missing field
+		=> ([String] kind, [Int] item size, [array] shared values or None,
+			[Object] what goes in the handle)
+	"""
+	present = list(filter(lambda x: x != None, values))
+	if all(map(lambda x: type(x) == str, present)):
+		distinct = list(dict.fromkeys(present))
+		codes = {x: n for n, x in enumerate(distinct)}
+		return ( 'dict', 4
+			   , array('i', map(lambda x: -1 if x == None else codes[x], values))
+			   , distinct)
+
+	others = {n: x for n, x in enumerate(values) if type(x) != float and x != None}
+	if len(others)*2 <= len(present):
+		return ( 'float', 8
+			   , array('d', map(lambda x: x if type(x) == float else 0.0, values))
+			   , others)
+
+	return ('list', 0, None, values)
+
+
+
+def shareRows(rows, partitionField='Portfolio'):
+	"""
+	[Iterable] ([Dictionary]) rows,
+	[String] field to partition the rows by
+		=> ([SharedMemory] block, [Dictionary] handle)
+
+	The parent keeps the block, and calls releaseRows() when the child
+	processes are done.
+	"""
+	rows = list(rows)
+	fields = _getFields(rows)
+
+	def encode(field):
+		values = list(map(lambda r: r.get(field), rows))
+		missing = [n for n, r in enumerate(rows) if not field in r]
+		return (field, missing) + _encodeColumn(values)
+
+
+	# float64 columns first, then int32, so every column is aligned
+	encoded = sorted(map(encode, fields), key=lambda e: -e[3])
+	sizes = list(map(lambda e: e[3]*len(rows), encoded))
+	offsets = list(accumulate(chain([0], sizes)))
+	block = SharedMemory(create=True, size=max(1, offsets[-1]))
+
+	columns = {}
+	for (field, missing, kind, size, values, extra), offset in zip(encoded, offsets):
+		if values != None and len(values) > 0:
+			view = block.buf[offset:offset + size*len(rows)].cast(values.typecode)
+			view[:] = values
+			view.release()
+		columns[field] = (kind, offset, extra, missing)
+
+	return block, \
+	{ 'name': block.name
+	, 'rows': len(rows)
+	, 'fields': fields
+	, 'columns': columns
+	, 'partitions': _getPartitions(rows, partitionField)
+	}
+
+
+
+def releaseRows(block):
+	"""
+	[SharedMemory] block
+
+	Side effect: the block is freed, views attached to it no longer
+	work.
+	"""
+	block.close()
+	block.unlink()
+
+
+
+def attachRows(handle):
+	"""
+	[Dictionary] handle => [Dictionary] view
+
+	A view has the attached block ('block'), the handle ('handle') and
+	for each field its column ('columns'): a memoryview of the shared
+	values, and the (interned) string table for 'dict' columns.
+	"""
+	block = SharedMemory(name=handle['name'])
+	n = handle['rows']
+
+	def attach(field):
+		kind, offset, extra, missing = handle['columns'][field]
+		if kind == 'float':
+			return (kind, block.buf[offset:offset + 8*n].cast('d'), extra)
+		elif kind == 'dict':
+			# code -1 (field missing) gives None
+			return ( kind, block.buf[offset:offset + 4*n].cast('i')
+				   , list(map(sys.intern, extra)) + [None])
+		else:
+			return (kind, None, extra)
+
+
+	return { 'block': block, 'handle': handle
+		   , 'columns': {f: attach(f) for f in handle['fields']}}
+
+
+
+def detachRows(view):
+	"""
+	[Dictionary] view
+
+	Side effect: the view no longer works, the block stays for others.
+	"""
+	for kind, values, extra in view['columns'].values():
+		if values != None:
+			values.release()
+
+	view['block'].close()
+
+
+
+def _getColumnValues(column, start, end):
+	"""
+	[Tuple] attached column, [Int] start row, [Int] end row
+		=> [List] values of the rows
+	"""
+	kind, values, extra = column
+	if kind == 'float':
+		result = values[start:end].tolist()
+		for n, x in extra.items():
+			if start <= n < end:
+				result[n - start] = x
+		return result
+	elif kind == 'dict':
+		return list(map(extra.__getitem__, values[start:end].tolist()))
+	else:
+		return extra[start:end]
+
+
+
+def _getRange(view, start, end):
+	"""
+	[Dictionary] view, [Int] start row, [Int] end row
+		=> [List] ([Dictionary]) rows
+	"""
+	fields = view['handle']['fields']
+	rows = list(map( lambda values: dict(zip(fields, values))
+				   , zip(*map( lambda f: _getColumnValues(view['columns'][f], start, end)
+							 , fields))))
+	for field in fields:
+		for n in view['handle']['columns'][field][3]:
+			if start <= n < end:
+				del rows[n - start][field]
+
+	return rows
+
+
+
+def getRows(view, partition=None):
+	"""
+	[Dictionary] view, [String] value of the partition field, None
+		for all rows
+		=> [List] ([Dictionary]) rows, equal to the rows shared
+	"""
+	if partition == None:
+		return _getRange(view, 0, view['handle']['rows'])
+
+	return list(chain.from_iterable(
+		map( lambda r: _getRange(view, r[0], r[1])
+		   , view['handle']['partitions'].get(partition, []))))
@@ -2,9 +2,20 @@
 #
 # For API design only
 # 
+from factset.result_store import getResults
+from factset.factset_position import getPositions, getSecurityInfo
+from factset.factset_transaction import get_transactions
+from factset.data import getGenevaCashLedger as _getGenevaCashLedger \
+						, getGenevaPurchaseSales as _getGenevaPurchaseSales
+
+
 
 """
 This part is for Yu Dan.
+
+The FactSet getters are served from the result store, populated
+by worker runs. Only when a (date, portfolio) is not in the store,
+Geneva reports are parsed.
 """
 def getFactsetPositions(date, portfolio):
 	"""
@@ -12,7 +23,7 @@ def getFactsetPositions(date, portfolio):
 	[String] portfolio id
 		=> [Iterable] ([Dictionary] fact position)
 	"""
-	return []
+	return getResults('factset_position', getPositions, date, portfolio)
 
 
 
@@ -22,7 +33,7 @@ def getFactsetTransactions(date, portfolio):
 	[String] portfolio id
 		=> [Iterable] ([Dictionary] fact transaction)
 	"""
-	return []
+	return getResults('factset_transaction', get_transactions, date, portfolio)
 
 
 
@@ -32,7 +43,9 @@ def getFactsetSecurityInfo(date, portfolio):
 	[String] portfolio id
 		=> [Iterable] ([String] security type, [Dictionary] security info)
 	"""
-	return []
+	return map( tuple
+			  , getResults('factset_security_info', getSecurityInfo, date, portfolio)
+			  )
 
 
 
@@ -161,9 +174,9 @@ def getGenevaCashLedger(date, portfolio):
 	"""
 	[String] date (yyyy-mm-dd),
 	[String] portfolio id
-		=> [List] ([Dictionary] dividend receivable position)
+		=> [List] ([Dictionary] cash ledger position)
 	"""
-	return []
+	return _getGenevaCashLedger(date, portfolio)
 
 
 
@@ -171,7 +184,7 @@ def getGenevaPurchaseSales(date, portfolio):
 	"""
 	[String] date (yyyy-mm-dd),
 	[String] portfolio id
-		=> [List] ([Dictionary] dividend receivable position)
+		=> [List] ([Dictionary] purchase sales position)
 	"""
-	return []
+	return _getGenevaPurchaseSales(date, portfolio)
 
@@ -0,0 +1,167 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch
+from factset.factset_position import getPositions, getPositionsBatch \
+									, getPositionColumns
+
+
+
+def taxlotPosition(investId, description, quantity, unitCost, price, mvBook):
+	return \
+	{ 'Portfolio': '12307'
+	, 'PeriodEndDate': '2021-03-31'
+	, 'BookCurrency': 'HKD'
+	, 'InvestID': investId
+	, 'TaxLotDescription': description
+	, 'Quantity': quantity
+	, 'UnitCost': unitCost
+	, 'MarketPrice': price
+	, 'MarketValueBook': mvBook
+	, 'AccruedInterestBook': 0
+	}
+
+
+
+def securityInfo(investmentType, sedol, currency):
+	return \
+	{ 'InvestmentType Description': investmentType
+	, 'SEDOL': sedol
+	, 'BifurcationCurrency Code': currency
+	}
+
+
+
+positions = \
+[ taxlotPosition('HKD', 'Hong Kong Dollar', 1000000.0, 1.0, 1.0, 1000000.0)
+, taxlotPosition('USD', 'United States Dollar', 20000.0, 1.0, 1.0, 155482.0)
+, taxlotPosition('1088 HK', 'CHINA SHENHUA ENERGY CO-H', 761500, 14.687, 16.02, 12199230.0)
+, taxlotPosition('1088 HK', 'CHINA SHENHUA ENERGY CO-H', 1000, 15.1, 16.02, 16020.0)
+, taxlotPosition('BABA US', 'ALIBABA GROUP HOLDING-SP ADR', 3000, 230.5, 226.73, 5287897.2)
+]
+
+securities = \
+{ 'HKD': securityInfo('Cash and Equivalents', '', 'HKD')
+, 'USD': securityInfo('Cash and Equivalents', '', 'USD')
+, '1088 HK': securityInfo('Common Stock', 'B09N7M0', 'HKD')
+, 'BABA US': securityInfo('American Depository Receipt', 'BP41ZD1', 'USD')
+}
+
+fxTable = \
+[ { 'Date': '2021-03-31', 'Portfolio': '12307', 'Currency': 'USD'
+  , 'TargetCurrency': 'HKD', 'ExchangeRate': 7.7741}
+]
+
+dividends = \
+[ { 'Portfolio': '12307', 'Investment': 'CHINA SHENHUA ENERGY CO-H'
+  , 'EXDate': '2021-03-31', 'LocalCurrency': 'HKD'
+  , 'LocalGrossDividendRecPay': 76150.0}
+, { 'Portfolio': '12307', 'Investment': 'ALIBABA GROUP HOLDING-SP ADR'
+  , 'EXDate': '2021-03-31', 'LocalCurrency': 'HKD'
+  , 'LocalGrossDividendRecPay': 1200.0}
+, { 'Portfolio': '12307', 'Investment': 'HSBC HOLDINGS PLC'
+  , 'EXDate': '2021-03-30', 'LocalCurrency': 'HKD'
+  , 'LocalGrossDividendRecPay': 500.0}
+]
+
+
+
+def navFromPositions(date, portfolio):
+	"""
+	Portfolio NAV that agrees with the positions above.
+	"""
+	return ('HKD', sum(map(lambda p: p['MarketValueBook'], positions)))
+
+
+
+def patchData(positions):
+	"""
+	Replace the Geneva data used by factset_position with the above.
+	"""
+	module = 'factset.factset_position.'
+	return [ patch(module + 'getGenevaPositions', lambda date, portfolio: positions)
+		   , patch(module + 'getSecurityIdAndType', lambda: securities)
+		   , patch(module + 'getPortfolioNames', lambda: {'12307': 'CLO Equity'})
+		   , patch(module + 'getFxTable', lambda date: fxTable)
+		   , patch(module + 'getGenevaDividendReceivable', lambda date, portfolio: dividends)
+		   , patch(module + 'getGenevaNav', navFromPositions)
+		   ]
+
+
+
+class TestFactsetPosition(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestFactsetPosition, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		self.patches = patchData(positions)
+		for p in self.patches:
+			p.start()
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+
+
+
+	def testBatchEqualsPositions(self):
+		expected = getPositions('2021-03-31', '12307')
+		result = getPositionsBatch('2021-03-31', '12307')
+		self.assertEqual(5, len(result))
+		self.assertEqual(expected, result)
+		for p1, p2 in zip(expected, result):
+			self.assertEqual(list(p1.keys()), list(p2.keys()))
+			self.assertEqual( list(map(type, p1.values()))
+							, list(map(type, p2.values())))
+
+
+
+	def testBatchPositionValues(self):
+		result = getPositionsBatch('2021-03-31', '12307')
+
+		p = result[1]
+		self.assertEqual('CASH_ZERO_USD', p['Symbol'])
+		self.assertEqual(1.0, p['Price'])
+		self.assertEqual(20000.0, p['Ending Market Value'])
+
+		p = result[2]
+		self.assertEqual('B09N7M0', p['Symbol'])
+		self.assertEqual(('Equity', 'Equity Common'), (p['Asset Class'], p['Asset Type']))
+		self.assertAlmostEqual(0.1, p['Per Share Income'])
+		self.assertAlmostEqual(761500*14.687, p['Total Cost'])
+		self.assertEqual(14.687, p['Average Cumulative Cost'])
+
+		p = result[4]
+		self.assertEqual('USD', p['Price ISO'])
+		self.assertAlmostEqual(0.4/7.7741, p['Per Share Income'])
+		self.assertAlmostEqual(5287897.2/7.7741, p['Ending Market Value'])
+
+
+
+	def testBatchColumns(self):
+		columns = getPositionColumns('2021-03-31', '12307')
+		self.assertEqual(19, len(columns))
+		self.assertTrue(all(map(lambda c: len(c) == 5, columns.values())))
+		self.assertEqual( ['20210331']*5, columns['Date'])
+
+
+
+	def testBatchNotSupported(self):
+		for p in self.patches:
+			p.stop()
+
+		self.patches = patchData(positions + [dict(positions[2], AccruedInterestBook=100)])
+		for p in self.patches:
+			p.start()
+
+		with self.assertRaises(ValueError):
+			getPositions('2021-03-31', '12307')
+
+		with self.assertRaises(ValueError):
+			getPositionsBatch('2021-03-31', '12307')
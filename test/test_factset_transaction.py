@@ -0,0 +1,178 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch
+from factset.factset_transaction import get_transactions \
+									, get_unknown_transaction_types \
+									, reset_unknown_transaction_types \
+									, get_unsupported_securities
+
+
+
+def purchaseSales(tranType, tranId, investId, quantity, price, localAmount):
+	return \
+	{ 'Portfolio': '12307'
+	, 'TranType': tranType
+	, 'TranID': tranId
+	, 'InvestID': investId
+	, 'TradeDate': '2021-03-31'
+	, 'SettleDate': '2021-04-02'
+	, 'LocalCurrency': 'HKD'
+	, 'Quantity': quantity
+	, 'Price': price
+	, 'LocalAmount': localAmount
+	, 'Commission': 10.0
+	, 'Expenses': 5.0
+	, 'Broker': 'ABC'
+	}
+
+
+
+def cashLedger(tranDescription, transId, investment='', localAmount=0.0
+			  , currency='Hong Kong Dollar Closing Balance'):
+	return \
+	{ 'Portfolio': '12307'
+	, 'TranDescription': tranDescription
+	, 'TransID': transId
+	, 'Investment': investment
+	, 'CashDate': '2021-03-23'
+	, 'LocalAmount': localAmount
+	, 'Currency_ClosingBalDesc': currency
+	}
+
+
+
+purchaseSalesPositions = \
+[ purchaseSales('Buy', '1001', '1088 HK', 1000, 15.1, -15100.0)
+, purchaseSales('Sell', '1002', '1088 HK', 500, 16.0, 8000.0)
+, purchaseSales('NewType', '1003', '1088 HK', 100, 16.0, 1600.0)
+, purchaseSales('Buy', '1004', '1088 HK', 200, 15.5, -3100.0)
+]
+
+cashLedgerPositions = \
+[ cashLedger('Buy', '1001')
+, cashLedger('Dividend', '2001', 'MICROSOFT CORP', 11611.82, 'United States Dollar Closing Balance')
+, cashLedger('AccountingRelated', '1005')
+, cashLedger('Dividend', '2002', 'CLP HOLDINGS LTD', 335775.0)
+, cashLedger('Interest', '1006')
+, cashLedger('Dividend', '2001', 'MICROSOFT CORP', 125.44, 'United States Dollar Closing Balance')
+, cashLedger('ReturnOfCap', '2003', 'CNOOC LTD', 500.0, 'Chinese Renminbi Yuan HK Closing Balance')
+]
+
+
+
+class TestFactsetTransaction(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestFactsetTransaction, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		reset_unknown_transaction_types()
+
+
+
+	def tearDown(self):
+		reset_unknown_transaction_types()
+
+
+
+	@patch('factset.factset_transaction.get_geneva_id_from_description')
+	@patch('factset.factset_transaction.get_sedol_code')
+	@patch('factset.factset_transaction.get_geneva_security_type')
+	@patch('factset.factset_transaction.get_geneva_cash_ledger')
+	@patch('factset.factset_transaction.get_geneva_purchase_sales')
+	def testGetTransactions( self, mockPurchaseSales, mockCashLedger
+						   , mockSecurityType, mockSedol, mockInvestId):
+		mockPurchaseSales.return_value = purchaseSalesPositions
+		mockCashLedger.return_value = cashLedgerPositions
+		mockSecurityType.return_value = ('', 'Common Stock')
+		mockSedol.return_value = 'B09N7M0'
+		mockInvestId.side_effect = lambda d: d
+
+		transactions = get_transactions('2021-03-31', '12307')
+		self.assertEqual( [ '12307_2001', '12307_2002', '12307_2003'
+						  , '12307_1001', '12307_1004', '12307_1002']
+						, list(map(lambda t: t['Transaction ID'], transactions)))
+		self.assertEqual( ['IN', 'IN', 'IN', 'BL', 'BL', 'SL']
+						, list(map(lambda t: t['Trade Type'], transactions)))
+		self.assertAlmostEqual(15085.0, transactions[3]['Net Transaction Amount'])
+		self.assertAlmostEqual(7985.0, transactions[5]['Gross Transaction Amount'])
+
+		# dividend lines of the same TransID make one transaction
+		self.assertAlmostEqual(11737.26, transactions[0]['Gross Transaction Amount'])
+		self.assertEqual('20210323', transactions[0]['Date'])
+		self.assertEqual( ['USD', 'HKD', 'CNH']
+						, list(map(lambda t: t['Price ISO'], transactions[0:3])))
+
+		# one security lookup per investment
+		self.assertEqual(3, mockInvestId.call_count)
+
+		# unknown types are counted, not raised
+		unknown = get_unknown_transaction_types()
+		self.assertEqual(1, unknown[('purchase sales', 'NewType')])
+		self.assertEqual(1, unknown[('cash ledger', 'Interest')])
+		self.assertFalse(('cash ledger', 'AccountingRelated') in unknown)
+
+		reset_unknown_transaction_types()
+		self.assertEqual({}, get_unknown_transaction_types())
+
+
+
+	@patch('factset.factset_transaction.get_geneva_id_from_description')
+	@patch('factset.factset_transaction.get_sedol_code')
+	@patch('factset.factset_transaction.get_geneva_security_type')
+	@patch('factset.factset_transaction.get_geneva_cash_ledger')
+	@patch('factset.factset_transaction.get_geneva_purchase_sales')
+	def testUnsupportedSecurity( self, mockPurchaseSales, mockCashLedger
+							   , mockSecurityType, mockSedol, mockInvestId):
+		mockPurchaseSales.return_value = []
+		mockCashLedger.return_value = \
+		[ cashLedger('Dividend', '2001', 'LINK REIT', 800.0)
+		, cashLedger('Dividend', '2002', 'CLP HOLDINGS LTD', 335775.0)
+		, cashLedger('ReturnOfCap', '2003', 'LINK REIT', 100.0)
+		, cashLedger('Dividend', '2004', 'LINK REIT', 900.0)
+		]
+		mockSecurityType.side_effect = lambda gid: \
+			('', 'Real Estate Investment Trust') if gid == 'LINK REIT' else ('', 'Common Stock')
+		mockSedol.return_value = '6097017'
+		mockInvestId.side_effect = lambda d: d
+
+		transactions = get_transactions('2021-03-31', '12307')
+		self.assertEqual( ['12307_2002']
+						, list(map(lambda t: t['Transaction ID'], transactions)))
+		self.assertEqual( { ('Dividend', 'LINK REIT'): 2
+						  , ('ReturnOfCap', 'LINK REIT'): 1}
+						, get_unsupported_securities())
+
+		reset_unknown_transaction_types()
+		self.assertEqual({}, get_unsupported_securities())
+
+
+
+	@patch('factset.factset_transaction.get_sedol_code')
+	@patch('factset.factset_transaction.get_geneva_security_type')
+	@patch('factset.factset_transaction.get_geneva_cash_ledger')
+	@patch('factset.factset_transaction.get_geneva_purchase_sales')
+	def testTransactionOrder( self, mockPurchaseSales, mockCashLedger
+							, mockSecurityType, mockSedol):
+		"""
+		Transactions are grouped by type, types in the order first seen,
+		positions of a type in report order.
+		"""
+		mockPurchaseSales.return_value = \
+		[ purchaseSales('Sell', '1001', '1088 HK', 500, 16.0, 8000.0)
+		, purchaseSales('Buy', '1002', '1088 HK', 1000, 15.1, -15100.0)
+		, purchaseSales('Sell', '1003', '1088 HK', 100, 16.0, 1600.0)
+		, purchaseSales('Buy', '1004', '1088 HK', 200, 15.5, -3100.0)
+		, purchaseSales('Sell', '1005', '1088 HK', 300, 16.0, 4800.0)
+		]
+		mockCashLedger.return_value = []
+		mockSecurityType.return_value = ('', 'Common Stock')
+		mockSedol.return_value = 'B09N7M0'
+
+		self.assertEqual( ['12307_1001', '12307_1003', '12307_1005', '12307_1002', '12307_1004']
+						, list(map( lambda t: t['Transaction ID']
+								  , get_transactions('2021-03-31', '12307'))))
@@ -124,4 +124,13 @@ class TestGenevaPosition(unittest2.TestCase):
 				   )
 		self.assertEqual(-4861014.11, p['Quantity'])
 		self.assertEqual(6.5485, p['MarketPrice'])
-		
\ No newline at end of file
+		
+
+
+	def testMultipartTaxlotReportInterned(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		positions = list(filter( lambda p: p['Portfolio'] == '12307'
+							   , readMultipartTaxlotReport('utf-16', '\t', file)))
+		cashPositions = list(filter(isTaxlotCash, positions))
+		self.assertTrue(positions[0]['Portfolio'] is positions[-1]['Portfolio'])
+		self.assertTrue(cashPositions[0]['ThenByDescription'] is cashPositions[-1]['ThenByDescription'])
@@ -0,0 +1,172 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.output import writeRows, writeManifest, writeDicts, writeConsolidated \
+						, readPortfolioBytes, extractPortfolio, writeColumns, readTable \
+						, makeRowSerializer
+import factset.output as output
+from os import listdir, getpid, utime
+from os.path import join, exists
+import hashlib, json, subprocess, sys, tempfile
+
+
+
+class TestOutput(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestOutput, self).__init__(*args, **kwargs)
+
+
+
+	def testWriteRowsFailure(self):
+		def badRows():
+			yield (1, 2)
+			raise KeyError
+
+		with tempfile.TemporaryDirectory() as directory:
+			file = join(directory, 'factset_position_20210331_12307.csv')
+			writeRows(file, ('a', 'b'), [(1, 2)])
+			with self.assertRaises(KeyError):
+				writeRows(file, ('a', 'b'), badRows())
+
+			self.assertEqual(['factset_position_20210331_12307.csv'], listdir(directory))
+			with open(file, 'r', newline='') as f:
+				self.assertEqual('a,b\r\n1,2\r\n', f.read())
+
+
+
+	def testWriteManifest(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file1 = writeRows(join(directory, 'a_20210331_1.csv'), ('a', ), [(1, ), (2, )])
+			file2 = writeRows(join(directory, 'a_20210331_2.csv'), ('a', ), [])
+			writeManifest(directory, '2021-03-31', [file1])
+			manifestFile = writeManifest(directory, '2021-03-31', [file2])
+			with open(manifestFile, 'r', encoding='utf-8') as f:
+				manifest = json.load(f)
+			with open(file1, 'rb') as f:
+				sha256 = hashlib.sha256(f.read()).hexdigest()
+
+		self.assertEqual('manifest_20210331.json', manifestFile[-22:])
+		self.assertEqual(['a_20210331_1.csv', 'a_20210331_2.csv'], sorted(manifest['files']))
+		self.assertEqual(2, manifest['files']['a_20210331_1.csv']['rows'])
+		self.assertEqual(0, manifest['files']['a_20210331_2.csv']['rows'])
+		self.assertEqual(sha256, manifest['files']['a_20210331_1.csv']['sha256'])
+
+
+
+	def testStaleLock(self):
+		def writeLock(lock, pid, mtime=None):
+			with open(lock, 'w') as f:
+				f.write(str(pid))
+			if mtime != None:
+				utime(lock, (mtime, mtime))
+
+
+		# a process that is gone
+		child = subprocess.Popen([sys.executable, '-c', 'pass'])
+		child.wait()
+
+		with tempfile.TemporaryDirectory() as directory:
+			file = join(directory, 'manifest_20210331.json')
+			lock = file + '.lock'
+			writeLock(lock, child.pid)
+			with output._lockFile(file, timeout=0.5):
+				with open(lock, 'r') as f:
+					self.assertEqual(str(getpid()), f.read())
+			self.assertFalse(exists(lock))
+
+			# too old, whoever holds it
+			writeLock(lock, getpid(), 1000000000)
+			with output._lockFile(file, timeout=0.5):
+				pass
+
+			# held by a live process
+			writeLock(lock, getpid())
+			with self.assertRaises(ValueError):
+				with output._lockFile(file, timeout=0.2):
+					pass
+			self.assertTrue(exists(lock))
+
+
+
+	def testConsolidated(self):
+		headers = ('Portfolio', 'Symbol', 'Shares')
+		rows = \
+		{ '1': [{'Portfolio': '1', 'Symbol': 'A', 'Shares': 1.5}]
+		, '2': [ {'Portfolio': '2', 'Symbol': 'B, C', 'Shares': 2}
+			   , {'Portfolio': '2', 'Symbol': 'D', 'Shares': ''}]
+		}
+		with tempfile.TemporaryDirectory() as directory:
+			file = writeConsolidated( join(directory, 'a_20210331_all.csv'), headers
+									, sorted(rows.items()))
+			single = writeDicts(join(directory, 'a_20210331_2.csv'), headers, rows['2'])
+			with open(single, 'rb') as f:
+				self.assertEqual(f.read(), readPortfolioBytes(file, '2'))
+
+			self.assertEqual( [{'Portfolio': '1', 'Symbol': 'A', 'Shares': '1.5'}]
+							, extractPortfolio(file, '1'))
+
+
+
+	@unittest2.skipIf(output.pyarrow == None, 'pyarrow is not installed')
+	def testParquetSchema(self):
+		headers = ('Transaction ID', 'Trade Type', 'Quantity', 'Price', 'Broker')
+		dividends = \
+		{ 'Transaction ID': ['12307_1', '12307_2'], 'Trade Type': ['IN', 'IN']
+		, 'Quantity': ['', ''], 'Price': ['', 'NA'], 'Broker': ['', '']}
+		trades = \
+		{ 'Transaction ID': ['12307_3'], 'Trade Type': ['BL']
+		, 'Quantity': [1000], 'Price': [15.1], 'Broker': ['ABC']}
+		with tempfile.TemporaryDirectory() as directory:
+			file1 = writeColumns('parquet', join(directory, 'a_20210330_12307.parquet'), headers, dividends)
+			file2 = writeColumns('parquet', join(directory, 'a_20210331_12307.parquet'), headers, trades)
+			table = readTable([file1, file2])
+
+		self.assertEqual(output.getArrowSchema(headers), table.schema)
+		self.assertEqual([None, None, 1000.0], table.column('Quantity').to_pylist())
+		self.assertEqual([None, None, 15.1], table.column('Price').to_pylist())
+		self.assertEqual(['', '', 'ABC'], table.column('Broker').to_pylist())
+
+
+
+	def testRowSerializer(self):
+		row = {'Symbol': 'B09N7M0', 'Shares': 1000, 'Price': 15.1, 'Cost': 1/3.0}
+		self.assertEqual( ('B09N7M0', 1000, 15.1, 1/3.0)
+						, makeRowSerializer(('Symbol', 'Shares', 'Price', 'Cost'))(row))
+		self.assertEqual( ('B09N7M0', 1000, '15.100000', '0.333333')
+						, makeRowSerializer(('Symbol', 'Shares', 'Price', 'Cost'), '.6f')(row))
+		self.assertEqual(('0.33', ), makeRowSerializer(('Cost', ), '.2f')(row))
+		self.assertEqual(('B09N7M0', ), makeRowSerializer(('Symbol', ))(row))
+
+		# built once per header tuple
+		self.assertTrue(makeRowSerializer(('Symbol', 'Shares')) is makeRowSerializer(('Symbol', 'Shares')))
+
+		with tempfile.TemporaryDirectory() as directory:
+			file = writeDicts( join(directory, 'a_20210331_1.csv'), ('Symbol', 'Price')
+							 , [row, dict(row, Price='NA')], '.4f')
+			with open(file, 'r', newline='') as f:
+				self.assertEqual('Symbol,Price\r\nB09N7M0,15.1000\r\nB09N7M0,NA\r\n', f.read())
+
+
+
+	def testChunkBoundaries(self):
+		rows = list(map(lambda n: (n, n/7.0, 'x' + str(n)), range(25)))
+
+		def write(directory, chunkSize):
+			file = writeRows( join(directory, 'a_{0}.csv'.format(chunkSize)), ('n', 'x', 's')
+							, iter(rows), '.3f', chunkSize)
+			with open(file, 'rb') as f:
+				return f.read()
+
+		with tempfile.TemporaryDirectory() as directory:
+			outputs = list(map(lambda n: write(directory, n), (1, 5, 24, 25, 26, 10000)))
+			consolidated = writeConsolidated( join(directory, 'c_all.csv'), ('n', 'x', 's')
+											, [('1', map(lambda r: dict(zip(('n', 'x', 's'), r)), rows))]
+											, '.3f', 4)
+			with open(consolidated, 'rb') as f:
+				self.assertEqual(outputs[-1], f.read())
+
+		self.assertEqual(26, len(outputs[0].splitlines()))
+		for content in outputs[1:]:
+			self.assertEqual(outputs[0], content)
@@ -0,0 +1,73 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.pipeline import _topologicalOrder, _getStages, runStages
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+
+
+def stage(*dependencies):
+	return (dependencies, lambda date, portfolios: date)
+
+
+
+class TestPipeline(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestPipeline, self).__init__(*args, **kwargs)
+
+
+
+	def assertDependenciesFirst(self, stages, order):
+		self.assertEqual(sorted(stages), sorted(order))
+		for name in order:
+			for dep in stages[name][0]:
+				self.assertLess(order.index(dep), order.index(name))
+
+
+
+	def testTopologicalOrder(self):
+		stages = \
+		{ 'positions': stage('tax lot', 'fx table')
+		, 'fx table': stage('tax lot')
+		, 'tax lot': stage()
+		, 'transactions': stage('cash ledger')
+		, 'cash ledger': stage()
+		}
+		self.assertDependenciesFirst(stages, _topologicalOrder(stages))
+		self.assertDependenciesFirst(_getStages(), _topologicalOrder(_getStages()))
+
+
+
+	def testTopologicalOrderErrors(self):
+		with self.assertRaises(ValueError):
+			_topologicalOrder({'a': stage('b'), 'b': stage('c'), 'c': stage('a')})
+
+		with self.assertRaises(ValueError):
+			_topologicalOrder({'a': stage('a')})
+
+		with self.assertRaises(ValueError):
+			_topologicalOrder({'a': stage('no such stage')})
+
+
+
+	def testRunStages(self):
+		done = []
+		def func(name):
+			def f(date, portfolios):
+				done.append(name)
+				return name + ' ' + date
+			return f
+
+		stages = \
+		{ 'b': (('a', ), func('b'))
+		, 'a': ((), func('a'))
+		, 'c': (('a', 'b'), func('c'))
+		}
+		with ThreadPoolExecutor(max_workers=2) as executor:
+			results = asyncio.run(runStages(stages, executor, '2021-03-31', []))
+
+		self.assertEqual({'a': 'a 2021-03-31', 'b': 'b 2021-03-31', 'c': 'c 2021-03-31'}, results)
+		self.assertEqual(['a', 'b', 'c'], done)
@@ -0,0 +1,75 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.position_diff import diffPositions, _buildTable
+
+
+
+def position(portfolio, symbol, shares, marketValue):
+	return \
+	{ 'Portfolio Name': portfolio
+	, 'Symbol': symbol
+	, 'Shares': shares
+	, 'Ending Market Value': marketValue
+	}
+
+
+
+class TestPositionDiff(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestPositionDiff, self).__init__(*args, **kwargs)
+
+
+
+	def testBuildTable(self):
+		# tax lots with the same key are added up
+		table = _buildTable(
+			[ position('12307', 'B09N7M0', 1000.0, 16020.0)
+			, position('12307', 'B09N7M0', 500.0, 8010.0)
+			, position('40017', 'B09N7M0', 100.0, 1602.0)
+			])
+		self.assertEqual( { ('12307', 'B09N7M0'): [1500.0, 24030.0]
+						  , ('40017', 'B09N7M0'): [100.0, 1602.0]}
+						, table)
+
+
+
+	def testDiffPositions(self):
+		before = \
+		[ position('12307', 'KEEP', 1000.0, 10000.0)
+		, position('12307', 'SOLD', 200.0, 2000.0)
+		, position('12307', 'MORE', 100.0, 1000.0)
+		, position('12307', 'PRICE', 100.0, 1000.0)
+		, position('40017', 'KEEP', 50.0, 500.0)
+		]
+		after = \
+		[ position('12307', 'NEW', 300.0, 3000.0)
+		, position('12307', 'KEEP', 1000.0, 10500.0)
+		, position('12307', 'MORE', 60.0, 600.0)
+		, position('12307', 'MORE', 60.0, 600.0)
+		, position('12307', 'PRICE', 100.0, 1200.0)
+		, position('40017', 'KEEP', 50.0, 500.0)
+		]
+		diff = diffPositions(before, after)
+		self.assertEqual( [ ('12307', 'NEW', 'add'), ('12307', 'MORE', 'change')
+						  , ('12307', 'PRICE', 'change'), ('12307', 'SOLD', 'drop')]
+						, list(map(lambda d: (d['Portfolio Name'], d['Symbol'], d['Change']), diff)))
+
+		self.assertEqual( { 'Portfolio Name': '12307', 'Symbol': 'NEW', 'Change': 'add'
+						  , 'Quantity Before': 0, 'Quantity After': 300.0
+						  , 'Market Value Before': 0, 'Market Value After': 3000.0}
+						, diff[0])
+		self.assertEqual((100.0, 120.0), (diff[1]['Quantity Before'], diff[1]['Quantity After']))
+		self.assertEqual((200.0, 0), (diff[3]['Quantity Before'], diff[3]['Quantity After']))
+
+
+
+	def testDiffTolerance(self):
+		before = [position('12307', 'A', 100.0, 1000.0)]
+		after = [position('12307', 'A', 101.0, 1050.0)]
+		self.assertEqual(1, len(diffPositions(before, after)))
+		self.assertEqual([], diffPositions(before, after, quantityTolerance=1))
+		self.assertEqual(1, len(diffPositions(before, after, 1, marketValueTolerance=0.01)))
+		self.assertEqual([], diffPositions(before, before))
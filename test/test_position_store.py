@@ -0,0 +1,91 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch
+from factset.position_store import loadDate, loadRange, getSeries \
+								, getPortfolioSeries, getLoadedDates, clear
+
+
+
+def position(portfolio, symbol, shares, marketValue):
+	return \
+	{ 'Portfolio Name': portfolio
+	, 'Symbol': symbol
+	, 'Shares': shares
+	, 'Ending Market Value': marketValue
+	}
+
+
+
+positions = \
+{ ('2021-03-30', '12307'): [ position('12307', 'B09N7M0', 1000.0, 16020.0)
+						   , position('12307', 'B09N7M0', 500.0, 8010.0)]
+, ('2021-03-31', '12307'): [ position('12307', 'B09N7M0', 2000.0, 32040.0)
+						   , position('12307', 'BP41ZD1', 300.0, 68019.0)]
+, ('2021-03-31', '40017'): [position('40017', 'BP41ZD1', 100.0, 22673.0)]
+}
+
+
+
+class TestPositionStore(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestPositionStore, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		clear()
+		self.patches = \
+		[ patch( 'factset.position_store.getFactsetPositions'
+			   , side_effect=lambda d, p: positions.get((d, p), []))
+		, patch( 'factset.position_store.getStoredPortfolios'
+			   , side_effect=lambda k, d: sorted(p for (d2, p) in positions if d2 == d))
+		, patch( 'factset.position_store.getReportDates'
+			   , return_value=['2021-03-29', '2021-03-30', '2021-03-31', '2021-04-01'])
+		, patch('factset.position_store.getPortfolioCodes')
+		]
+		self.mocks = list(map(lambda p: p.start(), self.patches))
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		clear()
+
+
+
+	def testLoadDate(self):
+		# 40017 not processed yet, it is not in the result store
+		self.mocks[1].side_effect = lambda k, d: ['12307']
+		self.mocks[3].return_value = ['40017']
+		self.assertEqual(3, loadDate('2021-03-31'))
+		self.mocks[3].assert_called_once_with('2021-03-31')
+		self.assertEqual(['2021-03-31'], getLoadedDates())
+
+		self.mocks[1].side_effect = lambda k, d: []
+		self.mocks[3].return_value = []
+		self.assertEqual(0, loadDate('2021-03-29'))
+
+
+
+	def testSeries(self):
+		self.assertEqual( ['2021-03-30', '2021-03-31']
+						, loadRange('2021-03-30', '2021-03-31', ['12307']))
+		self.assertEqual([], loadRange('2021-03-30', '2021-03-31', ['12307']))
+
+		# tax lots of the same symbol are added up
+		self.assertEqual( [('2021-03-30', 1500.0), ('2021-03-31', 2000.0)]
+						, getSeries('12307', 'B09N7M0', '2021-03-01', '2021-03-31'))
+		self.assertEqual( [('2021-03-30', 0.0), ('2021-03-31', 68019.0)]
+						, getSeries('12307', 'BP41ZD1', '2021-03-01', '2021-03-31', 'market value'))
+
+		dates, series = getPortfolioSeries('12307', '2021-03-30', '2021-03-31')
+		self.assertEqual(['2021-03-30', '2021-03-31'], dates)
+		self.assertEqual( {'B09N7M0': [1500.0, 2000.0], 'BP41ZD1': [0.0, 300.0]}
+						, {k: list(v) for k, v in series.items()})
+
+		with self.assertRaises(ValueError):
+			getSeries('12307', 'B09N7M0', '2021-03-01', '2021-03-31', 'price')
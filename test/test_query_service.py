@@ -0,0 +1,145 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch, Mock
+import factset.query_service as query_service
+from factset.query_service import _respond
+from factset.result_store import clearMemory
+from os.path import join
+from os import utime
+import asyncio, gzip, json, tempfile
+
+
+
+class TestQueryService(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestQueryService, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		query_service._responseCache.clear()
+		self.inputs = {'cash ledger.txt': [100, 1]}
+		self.getter = Mock(side_effect=lambda d, p: [{'Portfolio': p, 'LocalAmount': 1.5}])
+		self.patches = \
+		[ patch.dict( 'factset.query_service._ROUTES'
+					, {'/cash_ledger': (self.getter, ('Portfolio', 'LocalAmount'), ('cash ledger', ))})
+		, patch( 'factset.query_service.getInputFingerprints'
+			   , side_effect=lambda t, d: dict(self.inputs))
+		, patch('factset.query_service.refreshIfChanged')
+		]
+		self.refresh = list(map(lambda p: p.start(), self.patches))[-1]
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		query_service._responseCache.clear()
+
+
+
+	def get(self, target, headers={}, method='GET'):
+		return asyncio.run(_respond(method, target, headers))
+
+
+
+	def testEtag(self):
+		target = '/cash_ledger?date=2021-03-31&portfolio=12307'
+		status, headers, body = self.get(target)
+		self.assertEqual(200, status)
+		self.assertEqual([{'Portfolio': '12307', 'LocalAmount': 1.5}], json.loads(body))
+
+		status, headers2, body = self.get(target, {'if-none-match': headers['ETag']})
+		self.assertEqual(304, status)
+		self.assertEqual(b'', body)
+		self.assertEqual(1, self.getter.call_count)
+
+		# re-exported source file: new etag, response built again
+		self.inputs = {'cash ledger.txt': [120, 2]}
+		status, headers3, body = self.get(target, {'if-none-match': headers['ETag']})
+		self.assertEqual(200, status)
+		self.assertNotEqual(headers['ETag'], headers3['ETag'])
+		self.assertEqual(2, self.getter.call_count)
+		self.refresh.assert_called_with({'cash ledger.txt': [120, 2]})
+
+
+
+	def testGzipAndCsv(self):
+		target = '/cash_ledger?date=2021-03-31&portfolio=12307&format=csv'
+		_, headers, body = self.get(target)
+		status, gzHeaders, gzBody = self.get(target, {'accept-encoding': 'gzip, deflate'})
+		self.assertEqual(200, status)
+		self.assertEqual('gzip', gzHeaders['Content-Encoding'])
+		self.assertEqual(body, gzip.decompress(gzBody))
+		self.assertEqual(b'Portfolio,LocalAmount\r\n12307,1.5\r\n', body)
+
+
+
+	def testErrors(self):
+		self.assertEqual(404, self.get('/no_such_route?date=2021-03-31&portfolio=1')[0])
+		status, headers, _ = self.get('/cash_ledger?date=2021-03-31&portfolio=1', method='POST')
+		self.assertEqual((405, 'GET'), (status, headers['Allow']))
+		self.assertEqual(400, self.get('/cash_ledger?date=2021-03-31')[0])
+
+
+
+class TestQueryServiceFiles(unittest2.TestCase):
+	"""
+	ETags from real files in the data directory.
+	"""
+	def __init__(self, *args, **kwargs):
+		super(TestQueryServiceFiles, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		query_service._responseCache.clear()
+		clearMemory()
+		self.directory = tempfile.TemporaryDirectory()
+		self.file = join(self.directory.name, 'all funds cash ledger 2021-03-31.txt')
+		self.getter = Mock(side_effect=[[{'LocalAmount': 1.5}], [{'LocalAmount': 2.5}]])
+		self.patches = \
+		[ patch.dict( 'factset.query_service._ROUTES'
+					, {'/cash_ledger': (self.getter, ('LocalAmount', ), ('cash ledger', ))})
+		, patch('factset.data.getDataDirectory', return_value=self.directory.name)
+		, patch('factset.result_store.clearReportCaches')
+		]
+		self.clearReportCaches = list(map(lambda p: p.start(), self.patches))[-1]
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		query_service._responseCache.clear()
+		clearMemory()
+		self.directory.cleanup()
+
+
+
+	def writeReport(self, content, mtime):
+		with open(self.file, 'w') as f:
+			f.write(content)
+		utime(self.file, ns=(mtime, mtime))
+
+
+
+	def testReexportedFile(self):
+		target = '/cash_ledger?date=2021-03-31&portfolio=12307'
+		self.writeReport('cash ledger', 1000000000)
+		_, headers, body = asyncio.run(_respond('GET', target, {}))
+		self.assertEqual([{'LocalAmount': 1.5}], json.loads(body))
+		_, headers2, _ = asyncio.run(_respond('GET', target, {}))
+		self.assertEqual(headers['ETag'], headers2['ETag'])
+		self.assertEqual(0, self.clearReportCaches.call_count)
+
+		self.writeReport('cash ledger', 2000000000)
+		status, headers3, body = asyncio.run(_respond( 'GET', target
+													 , {'if-none-match': headers['ETag']}))
+		self.assertEqual(200, status)
+		self.assertNotEqual(headers['ETag'], headers3['ETag'])
+		self.assertEqual([{'LocalAmount': 2.5}], json.loads(body))
+		self.assertEqual(1, self.clearReportCaches.call_count)
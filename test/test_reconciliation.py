@@ -0,0 +1,145 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch
+from factset.reconciliation import _getQuantityChanges, rollForward, _getBreaks \
+								, _selectTransactions, reconcile
+
+
+
+def transaction(tradeType, symbol, quantity, gross, net, date='20210331', tranId='1'):
+	return \
+	{ 'Portfolio Code': '12307'
+	, 'Date': date
+	, 'Symbol': symbol
+	, 'Transaction ID': '12307_' + tranId
+	, 'Trade Type': tradeType
+	, 'Price ISO': 'HKD'
+	, 'Quantity': quantity
+	, 'Gross Transaction Amount': gross
+	, 'Net Transaction Amount': net
+	}
+
+
+
+def position(portfolio, symbol, shares):
+	return {'Portfolio Name': portfolio, 'Symbol': symbol, 'Shares': shares}
+
+
+
+class TestReconciliation(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestReconciliation, self).__init__(*args, **kwargs)
+
+
+
+	def testGetQuantityChanges(self):
+		# amounts and quantities may come with either sign
+		self.assertEqual( [('B09N7M0', 1000), ('CASH_ZERO_HKD', -15100.0)]
+						, _getQuantityChanges(transaction('BL', 'B09N7M0', -1000, 15100.0, 15085.0)))
+		self.assertEqual( [('B09N7M0', -500), ('CASH_ZERO_HKD', 8000.0)]
+						, _getQuantityChanges(transaction('SL', 'B09N7M0', 500, 7985.0, -8000.0)))
+		self.assertEqual( [('CASH_ZERO_USD', 2000), ('CASH_ZERO_HKD', -15548.0)]
+						, _getQuantityChanges(transaction('BL', 'CASH_ZERO_USD', 2000, 15548.0, 15548.0)))
+		self.assertEqual( [('CASH_ZERO_HKD', 76150.0)]
+						, _getQuantityChanges(transaction('IN', 'B09N7M0', '', 76150.0, 76150.0)))
+		with self.assertRaises(ValueError):
+			_getQuantityChanges(transaction('XX', 'B09N7M0', 1, 1, 1))
+
+
+
+	def testRollForward(self):
+		positions = {('12307', 'B09N7M0'): 1000.0, ('12307', 'CASH_ZERO_HKD'): 20000.0}
+		transactions = \
+		[ transaction('BL', 'B09N7M0', 500, 8000.0, 7985.0)
+		, transaction('SL', 'BP41ZD1', 100, 22000.0, 22673.0)
+		]
+		self.assertEqual( { ('12307', 'B09N7M0'): 1500.0, ('12307', 'BP41ZD1'): -100
+						  , ('12307', 'CASH_ZERO_HKD'): 34673.0}
+						, rollForward(positions, transactions))
+		self.assertEqual( { ('12307', 'B09N7M0'): 1500.0, ('12307', 'BP41ZD1'): -100
+						  , ('12307', 'CASH_ZERO_HKD'): 20000.0}
+						, rollForward(positions, transactions, includeCash=False))
+		self.assertEqual(1000.0, positions[('12307', 'B09N7M0')])
+
+
+
+	def testGetBreaks(self):
+		expected = {('12307', 'A'): 100.0, ('12307', 'B'): 50.0, ('12307', 'CASH_ZERO_HKD'): 10.0}
+		actual = {('12307', 'A'): 100.00001, ('12307', 'C'): 20.0}
+		breaks = _getBreaks(expected, actual, 0.0001, True)
+		self.assertEqual( [('B', -50.0), ('C', 20.0), ('CASH_ZERO_HKD', -10.0)]
+						, list(map(lambda b: (b['Symbol'], b['Difference']), breaks)))
+		self.assertEqual( ['B', 'C']
+						, list(map(lambda b: b['Symbol'], _getBreaks(expected, actual, 0.0001, False))))
+
+
+
+	def testSelectTransactions(self):
+		transactions = \
+		[ transaction('BL', 'A', 1, 1.0, 1.0, '20210329', '1')
+		, transaction('BL', 'A', 1, 1.0, 1.0, '20210330', '2')
+		, transaction('BL', 'A', 1, 1.0, 1.0, '20210331', '3')
+		, transaction('BL', 'A', 1, 1.0, 1.0, '20210330', '2')
+		, transaction('BL', 'A', 1, 1.0, 1.0, '20210401', '4')
+		]
+		self.assertEqual( ['12307_2', '12307_3']
+						, list(map( lambda t: t['Transaction ID']
+								  , _selectTransactions('2021-03-29', '2021-03-31', transactions))))
+
+
+
+	@patch('factset.reconciliation.getReportDates')
+	@patch('factset.reconciliation.getPortfolioCodes')
+	@patch('factset.reconciliation.getFactsetTransactions')
+	@patch('factset.reconciliation.getFactsetPositions')
+	def testReconcile(self, mockPositions, mockTransactions, mockPortfolios, mockReportDates):
+		positions = \
+		{ ('2021-03-29', '12307'): [position('12307', 'A', 100.0)]
+		, ('2021-03-31', '12307'): [position('12307', 'A', 150.0)]
+		, ('2021-03-29', '40017'): [position('40017', 'A', 10.0)]
+		}
+		mockPositions.side_effect = lambda d, p: positions.get((d, p), [])
+		mockPortfolios.side_effect = lambda d: sorted(p for (d2, p) in positions if d2 == d)
+		mockReportDates.return_value = ['2021-03-29', '2021-03-30', '2021-03-31']
+
+		# the report of each date covers the month so far
+		mockTransactions.side_effect = lambda d, p: \
+			[ transaction('BL', 'A', 20, 1.0, 1.0, '20210301', '1')
+			, transaction('BL', 'A', 50, 1.0, 1.0, '20210330', '2')
+			] if p == '12307' else []
+
+		breaks = reconcile('2021-03-31', '2021-03-29', includeCash=False)
+
+		# 12307 reconciles with one BL of 50, 40017 (gone) is a break
+		self.assertEqual( [('40017', 'A', 10.0, 0)]
+						, list(map( lambda b: ( b['Portfolio Name'], b['Symbol']
+											  , b['Expected Quantity'], b['Actual Quantity'])
+								  , breaks)))
+
+
+
+	@patch('factset.reconciliation.getReportDates')
+	@patch('factset.reconciliation.getFactsetTransactions')
+	@patch('factset.reconciliation.getFactsetPositions')
+	def testReconcileOverWeekend(self, mockPositions, mockTransactions, mockReportDates):
+		positions = \
+		{ '2021-04-02': [position('12307', 'A', 100.0)]
+		, '2021-04-05': [position('12307', 'A', 130.0)]
+		}
+		mockPositions.side_effect = lambda d, p: positions[d]
+		mockReportDates.side_effect = lambda reportType: \
+			['2021-04-01', '2021-04-02', '2021-04-05'] if reportType == 'cash ledger' \
+			else ['2021-04-02', '2021-04-05', '2021-04-06']
+
+		# no transaction reports for the weekend
+		def transactions(d, p):
+			if d != '2021-04-05':
+				raise ValueError
+			return [transaction('BL', 'A', 30, 1.0, 1.0, '20210403', '1')]
+
+		mockTransactions.side_effect = transactions
+		self.assertEqual([], reconcile('2021-04-05', '2021-04-02', ['12307'], includeCash=False))
+		self.assertEqual(1, mockTransactions.call_count)
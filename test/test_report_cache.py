@@ -0,0 +1,70 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.geneva_position import readMultipartTaxlotReport \
+								, readMultipartCashLedgerReport
+from factset.report_cache import writeReportCache, getReportCacheFile \
+								, isReportCacheFresh, readReportCache
+from factset.validation import scanSections
+from os.path import join, dirname, abspath, basename, exists
+import pickle, tempfile
+
+
+
+def currentDir():
+	return dirname(abspath(__file__))
+
+
+
+class Planted(object):
+	"""
+	Creates the marker file when unpickled.
+	"""
+	def __init__(self, marker):
+		self.marker = marker
+
+	def __reduce__(self):
+		return (open, (self.marker, 'w'))
+
+
+
+class TestReportCache(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestReportCache, self).__init__(*args, **kwargs)
+
+
+
+	def testReadTaxlotCache(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		positions = list(readMultipartTaxlotReport('utf-16', '\t', file))
+		with tempfile.TemporaryDirectory() as directory:
+			cacheFile = writeReportCache( join(directory, basename(getReportCacheFile(file)))
+										, '_readTaxlotReportFromLines', file
+										, scanSections('utf-16', '\t', file), positions)
+			cached = readMultipartTaxlotReport('utf-16', '\t', cacheFile)
+			self.assertEqual(positions, cached)
+			self.assertEqual(scanSections('utf-16', '\t', file), scanSections('utf-16', '\t', cacheFile))
+			self.assertTrue(isReportCacheFresh(cacheFile, file))
+			same = list(filter(lambda p: p['Portfolio'] == cached[0]['Portfolio'], cached))
+			self.assertTrue(same[0]['Portfolio'] is same[-1]['Portfolio'])
+
+			# a cache is for the reader that made it
+			with self.assertRaises(ValueError):
+				list(readMultipartCashLedgerReport('utf-16', '\t', cacheFile))
+
+
+
+	def testCacheIsNotPickle(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		with tempfile.TemporaryDirectory() as directory:
+			marker = join(directory, 'marker')
+			cacheFile = join(directory, basename(getReportCacheFile(file)))
+			with open(cacheFile, 'wb') as f:
+				pickle.dump(Planted(marker), f)
+
+			with self.assertRaises(ValueError):
+				readReportCache('_readTaxlotReportFromLines', cacheFile)
+			self.assertFalse(isReportCacheFresh(cacheFile, file))
+			self.assertFalse(exists(marker))
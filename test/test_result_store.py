@@ -0,0 +1,154 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch, Mock
+import factset.result_store as result_store
+from factset.result_store import getResults, clearMemory, getStoredPortfolios \
+								, getInputs
+from os.path import join
+from os import utime
+import tempfile
+
+
+
+class TestResultStore(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestResultStore, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		clearMemory()
+		self.directory = tempfile.TemporaryDirectory()
+		self.inputs = {'tax lot.txt': [100, 1]}
+		self.patches = \
+		[ patch('factset.result_store.getStoreDirectory', return_value=self.directory.name)
+		, patch('factset.result_store.getInputFingerprints', side_effect=lambda t, d: dict(self.inputs))
+		, patch('factset.result_store.clearReportCaches')
+		]
+		self.clearReportCaches = list(map(lambda p: p.start(), self.patches))[-1]
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		clearMemory()
+		self.directory.cleanup()
+
+
+
+	def testGetResults(self):
+		computeFunc = Mock(side_effect=lambda d, p: [{'Portfolio': p, 'Date': d}])
+		results = getResults('factset_position', computeFunc, '2021-03-31', '12307')
+		self.assertEqual([{'Portfolio': '12307', 'Date': '2021-03-31'}], results)
+
+		# memory, then the persisted store
+		self.assertEqual(results, getResults('factset_position', computeFunc, '2021-03-31', '12307'))
+		clearMemory()
+		self.assertEqual(results, getResults('factset_position', computeFunc, '2021-03-31', '12307'))
+		self.assertEqual(1, computeFunc.call_count)
+		self.assertEqual(0, self.clearReportCaches.call_count)
+
+
+
+	def testGetResultsInputsChanged(self):
+		computeFunc = Mock(side_effect=[[{'Quantity': 1.0}], [{'Quantity': 2.0}]])
+		getResults('factset_position', computeFunc, '2021-03-31', '12307')
+
+		# re-exported report: stale in both memory and the persisted store
+		self.inputs = {'tax lot.txt': [120, 2]}
+		self.assertEqual( [{'Quantity': 2.0}]
+						, getResults('factset_position', computeFunc, '2021-03-31', '12307'))
+		self.assertEqual(1, self.clearReportCaches.call_count)
+		clearMemory()
+		self.assertEqual( [{'Quantity': 2.0}]
+						, getResults('factset_position', computeFunc, '2021-03-31', '12307'))
+		self.assertEqual(2, computeFunc.call_count)
+
+
+
+	def testLruEviction(self):
+		computeFunc = Mock(side_effect=lambda d, p: [p])
+		with patch('factset.result_store._MAX_ENTRIES', 2):
+			for p in ('a', 'b', 'a', 'c'):
+				getResults('factset_position', computeFunc, '2021-03-31', p)
+
+			# 'b' is the least recently used
+			self.assertEqual( [ ('factset_position', '2021-03-31', 'a')
+							  , ('factset_position', '2021-03-31', 'c')]
+							, list(result_store._memoryStore))
+
+
+
+	def testGetStoredPortfolios(self):
+		computeFunc = Mock(side_effect=lambda d, p: [p])
+		for p in ('40017', '12307'):
+			getResults('factset_position', computeFunc, '2021-03-31', p)
+		getResults('factset_transaction', computeFunc, '2021-03-31', '60001')
+		getResults('factset_position', computeFunc, '2021-03-30', '60001')
+
+		self.assertEqual(['12307', '40017'], getStoredPortfolios('factset_position', '2021-03-31'))
+		self.assertEqual([], getStoredPortfolios('factset_position', '2021-04-01'))
+
+
+
+class TestResultStoreFiles(unittest2.TestCase):
+	"""
+	Input fingerprints taken from real files in the data directory.
+	"""
+	def __init__(self, *args, **kwargs):
+		super(TestResultStoreFiles, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		clearMemory()
+		self.directory = tempfile.TemporaryDirectory()
+		self.file = join(self.directory.name, 'all funds tax lot 2021-03-31.txt')
+		self.patches = \
+		[ patch('factset.result_store.getStoreDirectory', return_value=self.directory.name)
+		, patch('factset.data.getDataDirectory', return_value=self.directory.name)
+		, patch('factset.result_store.clearReportCaches')
+		]
+		self.clearReportCaches = list(map(lambda p: p.start(), self.patches))[-1]
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		clearMemory()
+		self.directory.cleanup()
+
+
+
+	def writeReport(self, content, mtime):
+		with open(self.file, 'w') as f:
+			f.write(content)
+		utime(self.file, ns=(mtime, mtime))
+
+
+
+	def testFingerprintChanges(self):
+		self.writeReport('tax lot', 1000000000)
+		before = getInputs('factset_security_info', '2021-03-31')
+		self.assertEqual({self.file: [7, 1000000000]}, before)
+
+		self.writeReport('tax lot', 2000000000)
+		self.assertEqual( {self.file: [7, 2000000000]}
+						, getInputs('factset_security_info', '2021-03-31'))
+
+
+
+	def testGetResultsAfterRewrite(self):
+		computeFunc = Mock(side_effect=[['old'], ['new']])
+		self.writeReport('tax lot', 1000000000)
+		self.assertEqual(['old'], getResults('factset_security_info', computeFunc, '2021-03-31', '12307'))
+		self.assertEqual(['old'], getResults('factset_security_info', computeFunc, '2021-03-31', '12307'))
+
+		self.writeReport('tax lot 2', 2000000000)
+		self.assertEqual(['new'], getResults('factset_security_info', computeFunc, '2021-03-31', '12307'))
+		self.assertEqual(1, self.clearReportCaches.call_count)
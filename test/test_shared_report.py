@@ -0,0 +1,53 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.geneva_position import readMultipartTaxlotReport
+from factset.shared_report import shareRows, releaseRows, attachRows, detachRows \
+								, getRows
+from os.path import join, dirname, abspath
+
+
+
+def currentDir():
+	return dirname(abspath(__file__))
+
+
+
+class TestSharedReport(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestSharedReport, self).__init__(*args, **kwargs)
+
+
+
+	def testSharedTaxlot(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		positions = list(readMultipartTaxlotReport('utf-16', '\t', file))
+		block, handle = shareRows(positions)
+		try:
+			view = attachRows(handle)
+			self.assertEqual(positions, getRows(view))
+			self.assertEqual( list(filter(lambda p: p['Portfolio'] == '12307', positions))
+							, getRows(view, '12307'))
+			self.assertEqual([], getRows(view, 'no such portfolio'))
+			detachRows(view)
+		finally:
+			releaseRows(block)
+
+
+
+	def testSharedRowsMixed(self):
+		rows = \
+		[ {'Portfolio': 'a', 'x': 1.5, 'y': 'NA'}
+		, {'Portfolio': 'a', 'x': 'NA', 'z': None}
+		, {'Portfolio': 'b', 'x': 2.0, 'y': 3.0}
+		]
+		block, handle = shareRows(rows)
+		try:
+			view = attachRows(handle)
+			self.assertEqual(rows, getRows(view))
+			self.assertEqual(rows[2:], getRows(view, 'b'))
+			detachRows(view)
+		finally:
+			releaseRows(block)
@@ -0,0 +1,100 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch
+from factset.validation import validateReportDates, scanSections, preflight \
+								, _preflightReport
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, dirname, abspath
+import gzip, shutil, tempfile
+
+
+
+def currentDir():
+	return dirname(abspath(__file__))
+
+
+
+class TestValidation(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestValidation, self).__init__(*args, **kwargs)
+
+
+
+	def testScanSections(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		sections = scanSections('utf-16', '\t', file)
+		section = list(filter( lambda s: s['parameters'].get('Portfolio') == '12307'
+							 , sections))[0]
+		self.assertEqual('3/31/2021 23:59', section['parameters']['PeriodEndDate'])
+		self.assertEqual('USD', section['parameters']['BookCurrency'])
+		self.assertTrue(section['rows'] > 0)
+
+
+
+	def testValidateReportDates(self):
+		for fn in ( 'all funds tax lot 2021-03-31.txt'
+				  , 'all funds dividend receivable 2021-03-31.txt'):
+			self.assertEqual([], validateReportDates(join(currentDir(), 'samples', fn)))
+
+
+
+	def testValidateReportDatesMismatch(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file = join(directory, 'all funds tax lot 2021-04-01.txt')
+			shutil.copy(join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt'), file)
+			errors = validateReportDates(file)
+
+		self.assertTrue(len(errors) > 0)
+		self.assertTrue('PeriodEndDate 2021-03-31 != 2021-04-01' in errors[0])
+
+
+
+	def testScanSectionsCompressed(self):
+		file = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		with tempfile.TemporaryDirectory() as directory:
+			compressed = join(directory, 'all funds tax lot 2021-03-31.txt.gz')
+			with open(file, 'rb') as source, gzip.open(compressed, 'wb') as target:
+				shutil.copyfileobj(source, target)
+
+			self.assertEqual( scanSections('utf-16', '\t', file)
+							, scanSections('utf-16', '\t', compressed))
+			self.assertEqual([], validateReportDates(compressed))
+
+
+
+	@patch('factset.validation._getGenevaReportFile')
+	def testPreflightReport(self, mockFile):
+		mockFile.return_value = join(currentDir(), 'samples', 'all funds tax lot 2021-03-31.txt')
+		result = _preflightReport('tax lot', '2021-03-31', ['12307'])
+		self.assertEqual(mockFile.return_value, result['file'])
+		self.assertTrue('12307' in result['portfolios'])
+		self.assertTrue(result['rows'] > 0)
+		self.assertEqual( list(map( lambda p: 'all funds tax lot 2021-03-31.txt: unknown portfolio ' + p
+								  , filter(lambda p: p != '12307', result['portfolios'])))
+						, result['errors'])
+
+		mockFile.side_effect = ValueError
+		result = _preflightReport('nav', '2021-03-31', ['12307'])
+		self.assertEqual((None, ['nav: no file, or more than one file']), (result['file'], result['errors']))
+
+
+
+	@patch('factset.validation.ProcessPoolExecutor', ThreadPoolExecutor)
+	@patch('factset.validation.getPortfolioNames', return_value=['12307'])
+	@patch('factset.validation._preflightReport')
+	def testPreflightReportFails(self, mockPreflightReport, mockNames):
+		def preflightReport(reportType, date, knownPortfolios):
+			if reportType == 'cash ledger':
+				raise RuntimeError('bad file')
+			return { 'reportType': reportType, 'file': reportType + '.txt', 'sections': 1
+				   , 'rows': 1, 'portfolios': ['12307'], 'errors': []}
+
+		mockPreflightReport.side_effect = preflightReport
+		report = preflight('2021-03-31')
+		self.assertFalse(report['ok'])
+		self.assertEqual(['cash ledger: check failed, RuntimeError: bad file'], report['errors'])
+		self.assertEqual('tax lot.txt', report['reports']['tax lot']['file'])
+		self.assertEqual(None, report['reports']['cash ledger']['file'])
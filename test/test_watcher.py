@@ -0,0 +1,64 @@
+# coding=utf-8
+#
+
+import unittest2
+from factset.watcher import _getCompleteDates
+
+
+
+def snapshotOf(fileNames):
+	return dict(map(lambda fn: (fn, (100, 1)), fileNames))
+
+
+
+reportFiles = \
+[ 'all funds tax lot 2021-03-31.txt'
+, 'all funds dividend receivable 2021-03-31.txt'
+, 'all funds nav 2021-03-31.txt'
+, 'all funds cash ledger 2021-03-31.txt'
+, 'all funds purchase sales 2021-03-31.txt'
+]
+
+
+
+class TestWatcher(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestWatcher, self).__init__(*args, **kwargs)
+
+
+
+	def testCompleteDate(self):
+		complete = _getCompleteDates(snapshotOf(reportFiles))
+		self.assertEqual(['2021-03-31'], list(complete.keys()))
+		self.assertEqual(5, len(complete['2021-03-31']))
+
+
+
+	def testIncompleteDate(self):
+		self.assertEqual({}, _getCompleteDates(snapshotOf(reportFiles[1:])))
+		self.assertEqual({}, _getCompleteDates(snapshotOf(
+			reportFiles + ['all funds tax lot 2021-03-31 (2).txt'])))
+
+
+
+	def testCacheAndCompressedFiles(self):
+		complete = _getCompleteDates(snapshotOf(
+			reportFiles + [ 'all funds tax lot 2021-03-31.txt.cache'
+						  , 'all funds nav 2021-03-31.txt.gz']))
+		self.assertEqual(['2021-03-31'], list(complete.keys()))
+
+		# a cache next to its report is not part of the file set
+		self.assertEqual( _getCompleteDates(snapshotOf(
+							reportFiles + ['all funds nav 2021-03-31.txt.gz']))
+						, complete)
+
+
+
+	def testCacheOnly(self):
+		files = [ 'all funds tax lot 2021-03-31.txt.cache'
+				, 'all funds dividend receivable 2021-03-31.txt.gz'
+				] + reportFiles[2:]
+		complete = _getCompleteDates(snapshotOf(files))
+		self.assertEqual( sorted(files)
+						, list(map(lambda t: t[0], complete['2021-03-31'])))
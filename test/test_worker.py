@@ -0,0 +1,67 @@
+# coding=utf-8
+#
+
+import unittest2
+from unittest.mock import patch, Mock
+from factset.worker import _doIncrementalOutput, _loadInputManifest
+from os import remove
+from os.path import join
+import tempfile
+
+
+
+class TestWorker(unittest2.TestCase):
+
+	def __init__(self, *args, **kwargs):
+		super(TestWorker, self).__init__(*args, **kwargs)
+
+
+
+	def setUp(self):
+		self.inputs = {'tax lot.txt': [100, 1]}
+		self.patches = \
+		[ patch( 'factset.worker.getInputFingerprints'
+			   , side_effect=lambda t, d: dict(self.inputs))
+		, patch('factset.worker.getOutputCompression', return_value='')
+		, patch('factset.worker.checkInputDates')
+		]
+		self.checkInputDates = list(map(lambda p: p.start(), self.patches))[-1]
+
+
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+
+
+
+	def testIncrementalOutput(self):
+		def write(outputDir, date, portfolio):
+			with open(join(outputDir, 'factset_position_20210331_12307.csv'), 'w') as f:
+				f.write('x')
+
+		writerFunc = Mock(side_effect=write)
+		run = lambda outputDir: _doIncrementalOutput( writerFunc, 'factset_position', ('tax lot', )
+													, outputDir, '2021-03-31', '12307')
+		with tempfile.TemporaryDirectory() as directory:
+			outputFile = join(directory, 'factset_position_20210331_12307.csv')
+			self.assertEqual(outputFile, run(directory))
+			self.assertEqual({outputFile: self.inputs}, _loadInputManifest(directory))
+
+			# unchanged inputs: skipped, dates not checked again
+			run(directory)
+			self.assertEqual(1, writerFunc.call_count)
+			self.checkInputDates.assert_called_once_with('2021-03-31', ('tax lot', ))
+
+			# changed inputs: rebuilt
+			self.inputs = {'tax lot.txt': [120, 2]}
+			run(directory)
+			self.assertEqual(2, writerFunc.call_count)
+			self.assertEqual({outputFile: self.inputs}, _loadInputManifest(directory))
+
+			# output removed: rebuilt
+			run(directory)
+			self.assertEqual(2, writerFunc.call_count)
+			remove(outputFile)
+			run(directory)
+			self.assertEqual(3, writerFunc.call_count)
@@ -3,7 +3,9 @@
 # Load configurations
 # 
 
-import configparser
+import configparser, logging
+from functools import lru_cache
+from os.path import join
 
 
 def _loadConfig():
@@ -27,4 +29,52 @@ def getDataDirectory():
 
 def getOutputDirectory():
 	global config
-	return config['Data']['outputDirectory']
\ No newline at end of file
+	return config['Data']['outputDirectory']
+
+
+def getStoreDirectory():
+	global config
+	return config['Data'].get( 'storeDirectory'
+							 , join(config['Data']['outputDirectory'], 'store'))
+
+
+
+def getFloatFormat():
+	"""
+	[String] format spec for floats in csv output (e.g. '.6f'), or None
+	for the default (repr, same as str()).
+	"""
+	global config
+	return config.get('Output', 'floatFormat', fallback='') or None
+
+
+
+def getOutputCompression():
+	"""
+	[String] compression of csv output ('gz', 'zst'), '' for none.
+	"""
+	global config
+	return config.get('Output', 'compression', fallback='')
+
+
+
+@lru_cache(maxsize=1)
+def getDebugSampleRate():
+	"""
+	[Int] in debug mode, per row messages are logged for every Nth
+	row only. Default 1, every row. Read from the config once.
+	"""
+	global config
+	return max(1, config.getint('Logging', 'debugSampleRate', fallback=1))
+
+
+
+def isSampledDebugRow(logger, counter):
+	"""
+	[Logger] logger, [Iterator] counter (itertools.count)
+		=> [Bool] whether to log the current row
+
+	Cheap when debug is off: no counting and no message formatting.
+	"""
+	return logger.isEnabledFor(logging.DEBUG) \
+			and next(counter) % getDebugSampleRate() == 0
@@ -0,0 +1,324 @@
+# coding=utf-8
+#
+# Pre-flight checks on Geneva report files, done before the expensive
+# parsing starts.
+#
+# The dates check keeps only the parameter block of each section of
+# a multipart report (ParameterName / ParameterValue lines), data rows
+# are counted without being split or converted. The parameter blocks
+# come after the data rows, so the whole file is still decoded: it is
+# one UTF-16 decode pass, cheaper than parsing but not free (about
+# 20ms for a 3MB report). The dates are compared with the dates in the
+# file name, which is what the rest of the code relies on.
+#
+# preflight() validates all the report files of a date in parallel,
+# one process per report type: the file exists, decodes as UTF-16,
+# has the columns the worker needs, its dates agree with its name and
+# all its portfolios are known. Results go into one report.
+#
+from factset.data import _getGenevaReportFile, _GENEVA_REPORT_PREFIXES \
+						, getPortfolioNames
+from factset.compression import openInput
+from factset.report_cache import isReportCacheFile, readReportCacheHeader
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from os.path import basename
+import json, logging, re
+logger = logging.getLogger(__name__)
+
+
+
+def _toDate(s):
+	"""
+	[String] s (mm/dd/yyyy hh:mm) => [String] date (yyyy-mm-dd), or ''
+	"""
+	try:
+		return datetime.strptime(s.split(' ')[0], '%m/%d/%Y').strftime('%Y-%m-%d')
+	except ValueError:
+		return ''
+
+
+
+def scanSections(encoding, delimiter, file):
+	"""
+	[String] encoding,
+	[String] delimiter,
+	[String] file, may be compressed (.gz, .zst) or a report cache
+		=> [List] ([Dictionary]) one entry per section, with the column
+			headers ('headers'), the number of data rows ('rows') and the
+			parameters ('parameters': [Dictionary] name -> value)
+
+	Data rows are counted, not parsed, but every line of the file is
+	decoded. A report cache has the sections of its source in the
+	header.
+	"""
+	if isReportCacheFile(file):
+		return readReportCacheHeader(file)['sections']
+
+	sections = []
+	section = None
+	inParameters = False
+	with openInput(file, encoding, newline='') as f:
+		for line in f:
+			line = line.rstrip('\r\n')
+			if section == None or line.startswith('\ufeff'):
+				section = {'headers': line.lstrip('\ufeff').split(delimiter), 'rows': 0
+						  , 'parameters': {}}
+				sections.append(section)
+				inDataRows, inParameters = True, False
+			elif line.strip(delimiter + ' ') == '':
+				inDataRows, inParameters = False, False
+			elif line.startswith('ParameterName' + delimiter):
+				inParameters = True
+			elif inParameters:
+				fields = line.split(delimiter, 2)
+				section['parameters'][fields[0]] = fields[1] if len(fields) > 1 else ''
+			elif inDataRows:
+				section['rows'] = section['rows'] + 1
+
+	return sections
+
+
+
+def _getDatesFromFilename(file):
+	"""
+	[String] file => [List] ([String]) dates (yyyy-mm-dd) in the file name
+	"""
+	return re.findall(r'\d{4}-\d{2}-\d{2}', basename(file))
+
+
+
+def validateReportDates(file, encoding='utf-16', delimiter='\t'):
+	"""
+	[String] file, [String] encoding, [String] delimiter
+		=> [List] ([String]) errors, empty if the file is good
+
+	Every section must have a PeriodEndDate equal to the last date in
+	the file name, and a KnowledgeDate not before it. If the file name
+	has two dates, the first must equal PeriodStartDate.
+	"""
+	return _getDateErrors(file, scanSections(encoding, delimiter, file))
+
+
+
+def _hasData(section):
+	"""
+	[Dictionary] section => [Bool]
+
+	Geneva gives sections without data rows a short parameter block
+	with no PeriodEndDate, those sections are not checked.
+	"""
+	return section['rows'] > 0 or 'PeriodEndDate' in section['parameters']
+
+
+
+def _getDateErrors(file, sections):
+	"""
+	[String] file, [List] sections => [List] ([String]) errors
+	"""
+	dates = _getDatesFromFilename(file)
+	if len(dates) == 0:
+		return ['{0}: no date in file name'.format(basename(file))]
+
+	def sectionErrors(n, section):
+		parameters = section['parameters']
+		portfolio = parameters.get('Portfolio', 'section {0}'.format(n))
+		periodEnd = _toDate(parameters.get('PeriodEndDate', ''))
+		knowledge = _toDate(parameters.get('KnowledgeDate', ''))
+		errors = []
+		if periodEnd != dates[-1]:
+			errors.append('{0}, {1}: PeriodEndDate {2} != {3}'.format(
+						basename(file), portfolio, periodEnd or 'missing', dates[-1]))
+		if knowledge == '' or knowledge < periodEnd:
+			errors.append('{0}, {1}: KnowledgeDate {2} before PeriodEndDate {3}'.format(
+						basename(file), portfolio, knowledge or 'missing', periodEnd))
+		if len(dates) > 1 and _toDate(parameters.get('PeriodStartDate', '')) != dates[0]:
+			errors.append('{0}, {1}: PeriodStartDate {2} != {3}'.format(
+						basename(file), portfolio, parameters.get('PeriodStartDate', 'missing')
+					  , dates[0]))
+		return errors
+
+
+	if len(sections) == 0:
+		return ['{0}: empty report'.format(basename(file))]
+
+	return [ e for n, section in enumerate(sections) if _hasData(section)
+			 for e in sectionErrors(n, section)]
+
+
+
+def checkInputDates(date, reportTypes=tuple(_GENEVA_REPORT_PREFIXES)):
+	"""
+	[String] date (yyyy-mm-dd),
+	[Tuple] ([String]) report types
+		=> [String] date
+
+	Raise ValueError if the report file of any type does not agree with
+	the dates in its file name.
+	"""
+	errors = [e for t in reportTypes
+				for e in validateReportDates(_getGenevaReportFile(t, date))]
+	if len(errors) > 0:
+		for e in errors:
+			logger.error('checkInputDates(): %s', e)
+		raise ValueError
+
+	return date
+
+
+
+"""
+	Fields the readers add to each position, not columns of the report.
+"""
+_ADDED_FIELDS = ( 'Portfolio', 'PeriodStartDate', 'PeriodEndDate', 'KnowledgeDate'
+				, 'BookCurrency', 'InvestID')
+
+
+
+def _getExpectedHeaders(reportType):
+	"""
+	[String] report type => [List] ([String]) columns the report must have
+
+	The columns written by the worker, less those added by the readers.
+	"""
+	from factset.worker import _getTaxlotCsvHeaders, _getDividendReceivableCsvHeaders \
+							, _getCashLedgerCsvHeaders, _getPurchaseSalesCsvHeaders
+
+	headers = \
+	{ 'tax lot': _getTaxlotCsvHeaders
+	, 'dividend receivable': _getDividendReceivableCsvHeaders
+	, 'cash ledger': _getCashLedgerCsvHeaders
+	, 'purchase sales': _getPurchaseSalesCsvHeaders
+	, 'nav': lambda: ('SumBal1', )
+	}[reportType]()
+
+	return list(filter(lambda h: not h in _ADDED_FIELDS, headers))
+
+
+
+def _getEmptyResult(reportType):
+	"""
+	[String] report type => [Dictionary] result with nothing found
+	"""
+	return { 'reportType': reportType, 'file': None, 'sections': 0, 'rows': 0
+		   , 'portfolios': [], 'errors': []}
+
+
+
+def _getPreflightResult(reportType, future):
+	"""
+	[String] report type, [Future] future of _preflightReport()
+		=> [Dictionary] result of the report type
+
+	Any other failure of the report (a bad file, a worker process that
+	died) becomes an error of that report, the others are still
+	reported.
+	"""
+	try:
+		return future.result()
+	except Exception as e:
+		logger.exception('_getPreflightResult(): {0}'.format(reportType))
+		return dict( _getEmptyResult(reportType)
+				   , errors=['{0}: check failed, {1}: {2}'.format(
+				   				reportType, type(e).__name__, e)])
+
+
+
+def _preflightReport(reportType, date, knownPortfolios):
+	"""
+	[String] report type,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) known portfolio codes
+		=> [Dictionary] result of the report type
+
+	Runs in a worker process.
+	"""
+	result = _getEmptyResult(reportType)
+	try:
+		file = _getGenevaReportFile(reportType, date)
+	except ValueError:
+		return dict(result, errors=['{0}: no file, or more than one file'.format(reportType)])
+
+	try:
+		sections = scanSections('utf-16', '\t', file)
+	except UnicodeError as e:
+		return dict(result, file=file, errors=['{0}: not UTF-16, {1}'.format(basename(file), e)])
+
+	dataSections = list(filter(_hasData, sections))
+	portfolios = sorted(set(map(lambda s: s['parameters'].get('Portfolio', ''), dataSections)))
+	expected = _getExpectedHeaders(reportType)
+
+	def headerErrors(section):
+		missing = list(filter(lambda h: not h in section['headers'], expected))
+		return [] if len(missing) == 0 else \
+				['{0}, {1}: missing columns {2}'.format(
+					basename(file), section['parameters'].get('Portfolio', ''), missing)]
+
+
+	return dict( result
+			   , file=file
+			   , sections=len(sections)
+			   , rows=sum(map(lambda s: s['rows'], sections))
+			   , portfolios=portfolios
+			   , errors=[e for s in dataSections for e in headerErrors(s)] \
+			   			+ _getDateErrors(file, sections) \
+			   			+ list(map( lambda p: '{0}: unknown portfolio {1}'.format(basename(file), p)
+			   					  , filter(lambda p: not p in knownPortfolios, portfolios)))
+			   )
+
+
+
+def preflight(date, maxWorkers=5):
+	"""
+	[String] date (yyyy-mm-dd), [Int] number of processes
+		=> [Dictionary] report: 'date', 'ok', 'errors' (all errors) and
+			'reports' ([String] report type -> [Dictionary] result)
+
+	Besides the checks on each file, every portfolio in the tax lot
+	report must have a NAV.
+	"""
+	knownPortfolios = list(getPortfolioNames())
+	reportTypes = list(_GENEVA_REPORT_PREFIXES)
+	with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+		futures = list(map( lambda t: executor.submit(_preflightReport, t, date, knownPortfolios)
+						  , reportTypes))
+		results = list(map(_getPreflightResult, reportTypes, futures))
+
+	reports = {r['reportType']: r for r in results}
+	if reports['tax lot']['file'] and reports['nav']['file']:
+		coverageErrors = list(map(
+			lambda p: 'portfolio {0} has tax lots but no NAV'.format(p)
+		  , filter( lambda p: not p in reports['nav']['portfolios']
+		  		  , reports['tax lot']['portfolios'])
+		))
+	else:
+		coverageErrors = []
+
+	errors = [e for r in results for e in r['errors']] + coverageErrors
+	return {'date': date, 'ok': len(errors) == 0, 'errors': errors, 'reports': reports}
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse, sys
+	parser = argparse.ArgumentParser(description='validate the Geneva report files of a date')
+	parser.add_argument('date', metavar='date', type=str, help="report date (yyyy-mm-dd)")
+	parser.add_argument('--output', type=str, help="write the report as json")
+	args = parser.parse_args()
+
+	report = preflight(args.date)
+	for reportType, r in report['reports'].items():
+		print('{0:<20} {1} sections, {2} rows, {3} errors'.format(
+				reportType, r['sections'], r['rows'], len(r['errors'])))
+	for e in report['errors']:
+		print(e)
+
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(report, f, indent=2)
+
+	sys.exit(0 if report['ok'] else 1)
@@ -0,0 +1,207 @@
+# coding=utf-8
+#
+# Watch the data directory and produce FactSet csv files as soon as
+# the complete set of Geneva reports for a date has landed.
+#
+# Uses inotify (through the inotify_simple package) when available,
+# otherwise polls the directory. The process stays up, so security
+# and portfolio names stay loaded between runs.
+#
+from factset.data import getSecurityIdAndType, getPortfolioNames, getPortfolioCodes \
+						, clearReportCaches, _getEndDateFromFilename \
+						, _getGenevaReportType, _GENEVA_REPORT_PREFIXES
+from factset.pipeline import writeDate
+from factset.factset_transaction import reset_unknown_transaction_types
+from factset.compression import stripCompression
+from factset.report_cache import isReportCacheFile, stripReportCache
+from factset.utility import getDataDirectory, getOutputDirectory
+from toolz.functoolz import compose
+from toolz.itertoolz import groupby as groupbyToolz, concat
+from toolz.dicttoolz import valfilter
+from functools import partial
+from os import scandir
+from time import sleep, perf_counter
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+	from inotify_simple import INotify, flags
+except ImportError:
+	INotify = None
+
+
+
+def _scanDirectory(directory):
+	"""
+	[String] directory
+		=> [Dictionary] ([String] file name -> ([Int] size, [Int] mtime))
+
+	Only Geneva report files with a date in the name are included.
+	"""
+	def hasDate(fn):
+		try:
+			_getEndDateFromFilename(fn)
+			return True
+		except ValueError:
+			return False
+
+
+	return { entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+			 for entry in scandir(directory)
+			 if entry.is_file() and _getGenevaReportType(entry.name) != None \
+			 	and hasDate(entry.name)
+		   }
+
+
+
+def _getReportFiles(fileNames):
+	"""
+	[List] ([String]) file names => [List] ([String]) file names
+
+	A report may be there as a plain, compressed (x.txt.gz) or report
+	cache (x.txt.cache) file. Group the forms of each report, and keep
+	the report files of a group, or its cache files when there is
+	nothing else. So writing a cache for a processed date does not
+	change the file set of that date.
+	"""
+	def pick(L):
+		others = list(filter(lambda fn: not isReportCacheFile(fn), L))
+		return others if len(others) > 0 else L
+
+
+	return compose(
+		list
+	  , concat
+	  , partial(map, pick)
+	  , lambda d: d.values()
+	  , partial(groupbyToolz, compose(stripCompression, stripReportCache))
+	)(fileNames)
+
+
+
+def _getCompleteDates(snapshot):
+	"""
+	[Dictionary] snapshot
+		=> [Dictionary] ([String] date -> [Tuple] fingerprint of the file set)
+
+	A date is complete when there is exactly one report for each report
+	type, in whatever forms (plain, compressed, report cache) it is
+	there.
+	"""
+	def isComplete(fileNames):
+		types = list(map( _getGenevaReportType
+						, set(map(compose(stripCompression, stripReportCache), fileNames))))
+		return sorted(types) == sorted(_GENEVA_REPORT_PREFIXES)
+
+
+	return {
+		date: tuple(sorted(map(lambda fn: (fn, snapshot[fn]), _getReportFiles(fileNames))))
+		for date, fileNames in valfilter(
+			isComplete
+		  , groupbyToolz(_getEndDateFromFilename, snapshot)
+		).items()
+	}
+
+
+
+def _processDate(outputDir, date, portfolios, consolidated=False):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios, empty means all portfolios in the
+		tax lot report,
+	[Bool] one output file for all portfolios
+		=> [List] ([String]) output files
+	"""
+	start = perf_counter()
+	clearReportCaches()
+	reset_unknown_transaction_types()
+	files = writeDate( outputDir, date
+					 , portfolios if portfolios else getPortfolioCodes(date)
+					 , consolidated)
+	logger.info('_processDate(): {0} done in {1:.1f}s, {2} files'.format(
+				date, perf_counter() - start, len(files)))
+	return files
+
+
+
+def _waitForChange(inotify, interval):
+	"""
+	[INotify] inotify (or None), [Float] seconds
+
+	Return when something changed in the directory, or after the
+	interval at the latest.
+	"""
+	if inotify == None:
+		sleep(interval)
+	else:
+		inotify.read(timeout=int(interval*1000))
+
+
+
+def watch( dataDir, outputDir, portfolios, interval=5.0, processExisting=False
+		 , consolidated=False):
+	"""
+	[String] data directory,
+	[String] output directory,
+	[List] ([String]) portfolios,
+	[Float] seconds between checks,
+	[Bool] process the dates already complete when starting,
+	[Bool] one output file for all portfolios
+
+	Runs forever. A date is processed when its file set is complete
+	and has not changed between two checks (so files still being
+	copied are not read). When any file of a processed date changes,
+	the date is processed again.
+	"""
+	inotify = None
+	if INotify != None:
+		inotify = INotify()
+		inotify.add_watch(dataDir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+	else:
+		logger.warning('watch(): inotify not available, polling {0}'.format(dataDir))
+
+	logger.debug('watch(): loading security and portfolio names')
+	getSecurityIdAndType()
+	getPortfolioNames()
+
+	previous = {}
+	processed = {} if processExisting else _getCompleteDates(_scanDirectory(dataDir))
+	while True:
+		current = _getCompleteDates(_scanDirectory(dataDir))
+		for date, fingerprint in sorted(current.items()):
+			if previous.get(date) != fingerprint or processed.get(date) == fingerprint:
+				continue
+
+			try:
+				_processDate(outputDir, date, portfolios, consolidated)
+			except Exception:
+				logger.exception('watch(): failed to process {0}'.format(date))
+
+			processed[date] = fingerprint
+
+		# a complete but not yet stable file set is checked again soon
+		pending = any(map( lambda t: processed.get(t[0]) != t[1]
+						 , current.items()))
+		previous = current
+		_waitForChange(inotify, min(interval, 1.0) if pending else interval)
+
+
+
+
+if __name__ == "__main__":
+	import logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	import argparse
+	parser = argparse.ArgumentParser(description='watch for Geneva files and process them')
+	parser.add_argument('portfolios', metavar='portfolio', type=str, nargs='*'
+					   , help="portfolio ids, default all portfolios in the tax lot report")
+	parser.add_argument('--interval', type=float, default=5.0, help="seconds between checks")
+	parser.add_argument('--existing', action='store_true', help="also process dates already there")
+	parser.add_argument( '--consolidated', action='store_true'
+					   , help="one position and one transaction file for all portfolios")
+	args = parser.parse_args()
+
+	watch( getDataDirectory(), getOutputDirectory(), args.portfolios
+		 , args.interval, args.existing, args.consolidated)
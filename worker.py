@@ -5,21 +5,37 @@
 from factset.data import getGenevaPositions, getGenevaDividendReceivable \
 						, getGenevaCashLedger, getSecurityIdAndType \
 						, getPortfolioNames, getFxTable, getGenevaNav \
-						, getGenevaPurchaseSales
-from factset.factset_position import getPositions
+						, getGenevaPurchaseSales \
+						, _GENEVA_REPORT_PREFIXES, getPortfolioCodes, shareReports \
+						, attachSharedReports, getInputFingerprints
+from factset.shared_report import releaseRows
+from factset.factset_position import getPositions, getPositionColumns
 from factset.factset_transaction import get_transactions
-from factset.utility import getOutputDirectory
-from steven_utils.utility import writeCsv, dictToValues
+from factset.result_store import computeAndSave
+from factset.validation import checkInputDates
+from factset.utility import getOutputDirectory, getOutputCompression
+from factset.compression import addCompression, stripCompression
+from factset.instrument import timed, timedIterable, isEnabled, writeSummary
+from factset.output import writeColumns, getExtension, getFormats, rowsToColumns \
+						, readColumns, writeDicts, openAtomic, writeManifest \
+						, writeConsolidated, _lockFile
 from toolz.functoolz import compose
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from itertools import chain, count
-from os.path import join
+from os.path import join, exists
 from datetime import datetime, timedelta
-import logging
+import cProfile, json, logging, pstats, tracemalloc
 logger = logging.getLogger(__name__)
 
 
 
+_writeDicts = timed('csv write')(writeDicts)
+_writeColumns = timed('columnar write')(writeColumns)
+_writeConsolidated = timed('consolidated write')(writeConsolidated)
+
+
+
 def processMultipartCashLedgerReport(outputDir, date, portfolio):
 	"""
 	[String] output directory,
@@ -34,12 +50,11 @@ def processMultipartCashLedgerReport(outputDir, date, portfolio):
 
 	return \
 	compose(
-		partial( writeCsv
+		partial( _writeDicts
 			   , _getOutputFilename( outputDir, 'cash_ledger'
 			   					   , date, portfolio)
+			   , _getCashLedgerCsvHeaders()
 			   )
-	  , partial(chain, [_getCashLedgerCsvHeaders()])
-	  , partial(map, partial(dictToValues, _getCashLedgerCsvHeaders()))
 	  , getGenevaCashLedger
 	)(date, portfolio)
 
@@ -54,11 +69,10 @@ def writeFxTableCsv(outputDir, date):
 	Side effect: create a csv file in the output directory.
 	"""
 	return compose(
-		partial( writeCsv
+		partial( _writeDicts
 			   , _getOutputFilename(outputDir, 'fx_table', date, '')
+			   , _getFxTableCsvHeaders()
 			   )
-	  , partial(chain, [_getFxTableCsvHeaders()])
-	  , partial(map, partial(dictToValues, _getFxTableCsvHeaders()))
 	  , getFxTable
 	)(date)
 
@@ -80,16 +94,146 @@ def _doCsvOutput( positionGetterFunc, csvHeaders, filePrefix
 	logger.debug('_doCsvOutput(): {0}, {1}, {2}'.format(filePrefix, date, portfolio))
 
 	return compose(
-		partial( writeCsv
+		partial( _writeDicts
 			   , _getOutputFilename(outputDir, filePrefix, date, portfolio)
+			   , csvHeaders
 			   )
-	  , partial(chain, [csvHeaders])
-	  , partial(map, partial(dictToValues, csvHeaders))
+	  , partial(timedIterable, 'csv rows')
 	  , positionGetterFunc
 	)(date, portfolio)
 
 
 
+def _doConsolidatedCsvOutput( positionGetterFunc, csvHeaders, filePrefix
+							 , outputDir, date, portfolios):
+	"""
+	[Function] (([String] date, [String] portfolio) -> [Iterable] positions),
+	[Tuple] csv headers,
+	[String] csv file prefix
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios
+		=> [String] output csv
+
+	Side effect: create one csv file of all the portfolios ('all' in
+	place of the portfolio in its name), in portfolio order, and its
+	index file. The file is never compressed.
+	"""
+	logger.debug('_doConsolidatedCsvOutput(): {0}, {1}'.format(filePrefix, date))
+
+	return _writeConsolidated(
+		stripCompression(_getOutputFilename(outputDir, filePrefix, date, 'all'))
+	  , csvHeaders
+	  , map( lambda p: (p, timedIterable('csv rows', positionGetterFunc(date, p)))
+	  	   , sorted(portfolios))
+	)
+
+
+
+def _doColumnarOutput( outputFormat, columnGetterFunc, csvHeaders, filePrefix
+					 , outputDir, date, portfolio):
+	"""
+	[String] output format ('csv' or 'parquet'),
+	[Function] (([String] date, [String] portfolio) -> [Dictionary] columns),
+	[Tuple] csv headers,
+	[String] file prefix
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio
+		=> [String] output file
+
+	Same as _doCsvOutput(), but the data comes as columns ([String] field
+	-> [List] values), written in the order of the csv headers. For csv,
+	rows are made here as the file is written.
+	"""
+	logger.debug('_doColumnarOutput(): %s, %s, %s, %s', outputFormat, filePrefix, date, portfolio)
+
+	return _writeColumns( outputFormat
+						, _getOutputFilename( outputDir, filePrefix, date, portfolio
+											, getExtension(outputFormat))
+						, csvHeaders
+						, columnGetterFunc(date, portfolio)
+						)
+
+
+
+def _rowGetterToColumns(rowGetterFunc, csvHeaders):
+	"""
+	[Function] (([String] date, [String] portfolio) -> [Iterable] rows),
+	[Tuple] csv headers
+		=> [Function] (([String] date, [String] portfolio) -> [Dictionary] columns)
+	"""
+	return compose(partial(rowsToColumns, csvHeaders), rowGetterFunc)
+
+
+
+def _getInputManifestFile(outputDir):
+	return join(outputDir, 'input_manifest.json')
+
+
+
+def _loadInputManifest(outputDir):
+	"""
+	[String] output directory
+		=> [Dictionary] ([String] output file -> [Dictionary] input fingerprints)
+	"""
+	file = _getInputManifestFile(outputDir)
+	if not exists(file):
+		return {}
+
+	with open(file, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+
+def _updateInputManifest(outputDir, outputFile, fingerprints):
+	"""
+	[String] output directory,
+	[String] output file,
+	[Dictionary] input fingerprints of the output file
+
+	Side effect: input manifest file updated. Runs of other portfolios
+	may update it too, so it is done under a lock.
+	"""
+	with _lockFile(_getInputManifestFile(outputDir)):
+		manifest = _loadInputManifest(outputDir)
+		manifest[outputFile] = fingerprints
+		with openAtomic(_getInputManifestFile(outputDir), 'w', encoding='utf-8') as f:
+			json.dump(manifest, f, indent=1)
+
+
+
+def _doIncrementalOutput( writerFunc, filePrefix, reportTypes
+						, outputDir, date, portfolio):
+	"""
+	[Function] ([String] output directory, [String] date, [String] portfolio
+					-> [String] output file),
+	[String] file prefix of the output,
+	[Tuple] ([String]) report types the output depends on,
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio
+		=> [String] output csv
+
+	Write the output only if it does not exist, or any of the Geneva
+	files it depends on changed since it was written. The dates in
+	those files are checked (see validation.checkInputDates()) only
+	when the output is written, a skip only needs the file stats.
+	"""
+	outputFile = _getOutputFilename(outputDir, filePrefix, date, portfolio)
+	fingerprints = getInputFingerprints(reportTypes, date)
+	if exists(outputFile) and \
+		_loadInputManifest(outputDir).get(outputFile) == fingerprints:
+		logger.debug('_doIncrementalOutput(): {0} unchanged'.format(outputFile))
+		return outputFile
+
+	checkInputDates(date, reportTypes)
+	writerFunc(outputDir, date, portfolio)
+	_updateInputManifest(outputDir, outputFile, fingerprints)
+	return outputFile
+
+
+
 def _changeDateFormat(s):
 	"""
 	[String] s (yyyy-mm-dd) => [String] s (yyyymmdd)
@@ -110,17 +254,21 @@ def _changeDateHourFormat(s):
 
 
 
-def _getOutputFilename(outputDir, prefix, date, portfolio):
+def _getOutputFilename(outputDir, prefix, date, portfolio, extension='.csv'):
 	"""
 	[String] output directory,
 	[String] prefix, 
 	[String] date (yyyy-mm-dd)
-	[String] portfolio
-		=> [String] output csv file name
+	[String] portfolio,
+	[String] file extension
+		=> [String] output file name
+
+	csv files get the suffix of the configured compression, if any.
 	"""
 	return join( outputDir
 			   , prefix + '_' + _changeDateFormat(date) + '_' \
-			   		+ portfolio + '.csv'
+			   		+ portfolio + (addCompression(extension, getOutputCompression()) \
+			   					   if extension == '.csv' else extension)
 			   )
 
 
@@ -250,11 +398,12 @@ def _dates_from_month_beginning(date):
 	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
 		=> [String] output csv
 
-	Side effect: create a csv file in the output directory.
+	Side effect: create a csv file in the output directory, results
+	also saved to the result store.
 """
 _writeFactPositionToCsv = partial(
 	_doCsvOutput
-  , getPositions
+  , partial(computeAndSave, 'factset_position', getPositions)
   , _getFactsetPositionCsvHeaders()
   , 'factset_position'
 )
@@ -265,11 +414,78 @@ _writeFactPositionToCsv = partial(
 	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
 		=> [String] output csv
 
-	Side effect: create a csv file in the output directory.
+	Same output as _writeFactPositionToCsv, built by the batch (columnar)
+	position builder. Results are not saved to the result store.
+"""
+_writeFactPositionToCsvBatch = partial(
+	_doColumnarOutput
+  , 'csv'
+  , getPositionColumns
+  , _getFactsetPositionCsvHeaders()
+  , 'factset_position'
+)
+
+
+
+def _getFormatWriters(outputFormat):
+	"""
+	[String] output format
+		=> [List] ([Function] ([String] output directory, [String] date,
+				[String] portfolio) -> [String] output file)
+
+	FactSet positions, transactions, cash ledger and FX table, written
+	in the format from columns. Positions come from the batch builder.
+	"""
+	doOutput = partial(_doColumnarOutput, outputFormat)
+	return \
+	[ partial( doOutput, getPositionColumns
+			 , _getFactsetPositionCsvHeaders(), 'factset_position')
+	, partial( doOutput
+			 , _rowGetterToColumns(get_transactions, _get_factset_transaction_csv_headers())
+			 , _get_factset_transaction_csv_headers(), 'factset_transaction')
+	, partial( doOutput
+			 , _rowGetterToColumns(getGenevaCashLedger, _getCashLedgerCsvHeaders())
+			 , _getCashLedgerCsvHeaders(), 'cash_ledger')
+	, lambda outputDir, date, portfolio: doOutput(
+			_rowGetterToColumns(lambda d, p: getFxTable(d), _getFxTableCsvHeaders())
+		  , _getFxTableCsvHeaders(), 'fx_table', outputDir, date, '')
+	]
+
+
+
+def readOutputMonth(outputDir, filePrefix, date, portfolio):
+	"""
+	[String] output directory,
+	[String] file prefix,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio
+		=> [Dictionary] columns of all parquet files of the portfolio
+			from month beginning to date
+
+	Dates without a file are skipped.
+	"""
+	return compose(
+		readColumns
+	  , partial(filter, exists)
+	  , partial( map
+	  		   , lambda d: _getOutputFilename( outputDir, filePrefix, d, portfolio
+	  		   								 , getExtension('parquet'))
+	  		   )
+	  , _dates_from_month_beginning
+	)(date)
+
+
+
+"""
+	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
+		=> [String] output csv
+
+	Side effect: create a csv file in the output directory, results
+	also saved to the result store.
 """
 _write_factset_transaction_to_csv = partial(
 	_doCsvOutput
-  , get_transactions
+  , partial(computeAndSave, 'factset_transaction', get_transactions)
   , _get_factset_transaction_csv_headers()
   , 'factset_transaction'
 )
@@ -306,6 +522,38 @@ _write_factset_position_month_to_csv = partial(
 
 
 
+"""
+	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
+		=> [String] output csv
+
+	Same as _writeFactPositionToCsv, but skipped when tax lot, dividend
+	receivable and NAV files are unchanged since the last write.
+"""
+_writeFactPositionToCsvIncremental = partial(
+	_doIncrementalOutput
+  , _writeFactPositionToCsv
+  , 'factset_position'
+  , ('tax lot', 'dividend receivable', 'nav')
+)
+
+
+
+"""
+	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
+		=> [String] output csv
+
+	Same as _write_factset_transaction_to_csv, but skipped when cash
+	ledger and purchase sales files are unchanged since the last write.
+"""
+_write_factset_transaction_to_csv_incremental = partial(
+	_doIncrementalOutput
+  , _write_factset_transaction_to_csv
+  , 'factset_transaction'
+  , ('cash ledger', 'purchase sales')
+)
+
+
+
 """
 	[String] output directory, [String] date (yyyy-mm-dd), [String] portfolio
 		=> [String] output csv
@@ -365,6 +613,137 @@ _writeDividendReceivableCsv = partial(
 )
 
 
+def _run(outputDir, date, portfolio, incremental, batch=False, outputFormat='csv'):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Bool] incremental,
+	[Bool] use the batch position builder,
+	[String] output format, other than csv, positions, transactions,
+		cash ledger and FX table are written in the format
+		=> [List] ([String]) output files
+
+	The dates in the Geneva files are checked first, except for
+	incremental runs, where only the outputs rebuilt check them.
+	"""
+	if outputFormat != 'csv':
+		checkInputDates(date, tuple(_GENEVA_REPORT_PREFIXES))
+		return list(map( lambda func: func(outputDir, date, portfolio)
+					   , _getFormatWriters(outputFormat)))
+	elif batch:
+		checkInputDates(date, ('tax lot', 'dividend receivable', 'nav'))
+		return [_writeFactPositionToCsvBatch(outputDir, date, portfolio)]
+	elif incremental:
+		return list(map( lambda func: func(outputDir, date, portfolio)
+					   , ( _writeFactPositionToCsvIncremental
+						 , _write_factset_transaction_to_csv_incremental)
+					   ))
+	else:
+		checkInputDates(date, ('tax lot', 'dividend receivable', 'nav'))
+		return [_writeFactPositionToCsv(outputDir, date, portfolio)]
+
+
+
+def writePositionsShared(outputDir, date, portfolios, maxWorkers=4, batch=False):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[List] ([String]) portfolios,
+	[Int] number of processes,
+	[Bool] use the batch position builder
+		=> [List] ([String]) output csv files
+
+	Side effect: create a FactSet position csv file per portfolio, in
+	child processes. The tax lot, dividend receivable and NAV reports
+	are read once here and put in shared memory, the child processes
+	attach to them instead of reading the files again.
+	"""
+	checkInputDates(date, ('tax lot', 'dividend receivable', 'nav'))
+	blocks, handles = shareReports(date, ('tax lot', 'dividend receivable', 'nav'))
+	try:
+		with ProcessPoolExecutor( max_workers=maxWorkers, initializer=attachSharedReports
+								, initargs=(date, handles)) as executor:
+			return list(executor.map(
+				partial( _writeFactPositionToCsvBatch if batch else _writeFactPositionToCsv
+					   , outputDir, date)
+			  , portfolios))
+	finally:
+		for block in blocks:
+			releaseRows(block)
+
+
+
+def _profileCpu(outputDir, date, portfolio, func, topN=50):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Function] () -> result,
+	[Int] number of functions in the text report
+		=> ( result
+		   , [List] ([String]) profile files (pstats and text report)
+		   )
+	"""
+	profiler = cProfile.Profile()
+	result = profiler.runcall(func)
+
+	statsFile = _getOutputFilename(outputDir, 'profile_cpu', date, portfolio, '.pstats')
+	reportFile = _getOutputFilename(outputDir, 'profile_cpu', date, portfolio, '.txt')
+	profiler.dump_stats(statsFile)
+	with open(reportFile, 'w') as f:
+		pstats.Stats(statsFile, stream=f).sort_stats('cumulative').print_stats(topN)
+
+	return result, [statsFile, reportFile]
+
+
+
+def _profileMemory(outputDir, date, portfolio, func, topN=50):
+	"""
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Function] () -> result,
+	[Int] number of allocation sites in the report
+		=> (result, [List] ([String]) profile files (text report))
+	"""
+	tracemalloc.start(10)
+	try:
+		result = func()
+		snapshot = tracemalloc.take_snapshot()
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	reportFile = _getOutputFilename(outputDir, 'profile_mem', date, portfolio, '.txt')
+	with open(reportFile, 'w') as f:
+		f.write('current {0:.1f} MB, peak {1:.1f} MB\n\n'.format(
+				current/1024/1024, peak/1024/1024))
+		for stat in snapshot.statistics('lineno')[:topN]:
+			f.write(str(stat) + '\n')
+
+	return result, [reportFile]
+
+
+
+def _profileRun(mode, outputDir, date, portfolio, func):
+	"""
+	[String] mode ('cpu' or 'mem'),
+	[String] output directory,
+	[String] date (yyyy-mm-dd),
+	[String] portfolio,
+	[Function] () -> result
+		=> (result, [List] ([String]) profile files)
+	"""
+	if mode == 'cpu':
+		return _profileCpu(outputDir, date, portfolio, func)
+	elif mode == 'mem':
+		return _profileMemory(outputDir, date, portfolio, func)
+	else:
+		logger.error('_profileRun(): {0} not supported'.format(mode))
+		raise ValueError
+
+
 
 
 if __name__ == "__main__":
@@ -376,7 +755,18 @@ if __name__ == "__main__":
 	import argparse
 	parser = argparse.ArgumentParser(description='handle fact positions')
 	parser.add_argument('date', metavar='date', type=str, help="position date (yyyy-mm-dd)")
-	parser.add_argument('portfolio', metavar='portfolio', type=str, help="portfolio id")
+	parser.add_argument( 'portfolio', metavar='portfolio', type=str
+					   , help="portfolio id, with --processes a comma separated list or 'all'")
+	parser.add_argument( '--incremental', action='store_true'
+					   , help="write positions and transactions, skip those whose inputs are unchanged")
+	parser.add_argument( '--batch', action='store_true'
+					   , help="write positions with the batch (columnar) builder")
+	parser.add_argument( '--format', choices=getFormats(), default='csv'
+					   , help="output format, parquet needs pyarrow")
+	parser.add_argument( '--profile', choices=['cpu', 'mem']
+					   , help="profile the run, results go to the output directory")
+	parser.add_argument( '--processes', type=int
+					   , help="write positions of the portfolios in this many processes, sharing the reports")
 
 	# print(_writeGenevaPositionCsv(getOutputDirectory(), parser.parse_args().date, parser.parse_args().portfolio))
 	# print(_writeDividendReceivableCsv(getOutputDirectory(), parser.parse_args().date, parser.parse_args().portfolio))
@@ -398,13 +788,38 @@ if __name__ == "__main__":
 	#   , parser.parse_args().portfolio
 	# )
 
-	print(
-		_writeFactPositionToCsv(
-			getOutputDirectory()
-		  , parser.parse_args().date
-		  , parser.parse_args().portfolio
+	args = parser.parse_args()
+	if args.incremental and (args.batch or args.format != 'csv'):
+		parser.error('--incremental cannot be used with --batch or --format')
+	if args.processes and (args.profile or args.incremental or args.format != 'csv'):
+		parser.error('--processes cannot be used with --profile, --incremental or --format')
+
+	run = partial( _run, getOutputDirectory(), args.date, args.portfolio
+				, args.incremental, args.batch, args.format)
+	if args.processes:
+		files, profileFiles = writePositionsShared(
+			getOutputDirectory(), args.date
+		  , getPortfolioCodes(args.date) if args.portfolio == 'all' else args.portfolio.split(',')
+		  , args.processes, args.batch), []
+	elif args.profile:
+		files, profileFiles = _profileRun( args.profile, getOutputDirectory()
+										 , args.date, args.portfolio, run)
+	else:
+		files, profileFiles = run(), []
+
+	for file in files + profileFiles:
+		print(file)
+
+	print(writeManifest(getOutputDirectory(), args.date, files))
+
+	if isEnabled():
+		print(
+			writeSummary(
+				_getOutputFilename( getOutputDirectory(), 'run_stats'
+								  , parser.parse_args().date
+								  , parser.parse_args().portfolio, '.json')
+			)
 		)
-	)
 
 	# _write_factset_position_month_to_csv(
 	# 	getOutputDirectory()